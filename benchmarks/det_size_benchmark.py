@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark kích thước input của model detection
+Đo độ trễ detection và recall so với detection ở kích thước lớn nhất (tham chiếu)
+cho từng kích thước, cùng độ tương đồng embedding (căn chỉnh luôn trên ảnh gốc)
+
+    python -m benchmarks.det_size_benchmark --images data/test_images --sizes 320 480 640
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_core.detector import FaceDetector
+from face_core.det_size import DetSizeSelector
+from face_core.enrollment import IMAGE_EXTENSIONS
+from face_core.tracker import iou_matrix
+
+IOU_MATCH = 0.5
+
+
+def list_images(root):
+    paths = []
+    for folder, _, filenames in os.walk(root):
+        paths.extend(os.path.join(folder, name) for name in sorted(filenames)
+                     if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+    return sorted(paths)
+
+
+def run_size(detector, images, size, repeat):
+    """Detect + embed mọi ảnh ở `size`, trả về (faces theo ảnh, ms detection mỗi ảnh)"""
+    results, times = [], []
+    for image in images:
+        faces = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            model_image, faces = detector.detect_faces(image, embed=False, det_size=(size, size))
+            times.append((time.perf_counter() - t0) * 1000.0)
+        detector.embed_faces(model_image, faces)
+        results.append(faces)
+    return results, times
+
+
+def match_reference(reference, faces):
+    """Số khuôn mặt tham chiếu được tìm lại (IoU >= 0.5) và cosine embedding của các cặp khớp"""
+    found, sims = 0, []
+    for ref_faces, cand_faces in zip(reference, faces):
+        if not ref_faces or not cand_faces:
+            continue
+        iou = iou_matrix([f.bbox for f in ref_faces], [f.bbox for f in cand_faces])
+        best = iou.argmax(axis=1)
+        for i, j in enumerate(best):
+            if iou[i, j] >= IOU_MATCH:
+                found += 1
+                sims.append(float(np.dot(ref_faces[i].normed_embedding, cand_faces[j].normed_embedding)))
+    return found, sims
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detection input size latency/recall benchmark')
+    parser.add_argument('--images', required=True, help='Thư mục ảnh (quét đệ quy)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[320, 480, 640])
+    parser.add_argument('--repeat', type=int, default=3, help='Số lần detect mỗi ảnh để đo độ trễ')
+    parser.add_argument('--limit', type=int, default=200)
+    args = parser.parse_args()
+
+    paths = list_images(args.images)[:args.limit]
+    images = [image for image in (cv2.imread(path) for path in paths) if image is not None]
+    if not images:
+        print(f"❌ Không có ảnh hợp lệ trong {args.images}")
+        return
+
+    detector = FaceDetector()
+    sizes = sorted(args.sizes)
+    runs = {size: run_size(detector, images, size, args.repeat) for size in sizes}
+    reference = runs[sizes[-1]][0]
+    total = sum(len(faces) for faces in reference)
+    print(f"{len(images)} images, {total} reference faces (detected at {sizes[-1]})\n")
+
+    print(f"{'size':>6} {'avg ms':>8} {'p50 ms':>8} {'recall':>8} {'emb cos':>8}")
+    for size in sizes:
+        faces, times = runs[size]
+        found, sims = match_reference(reference, faces)
+        recall = found / total if total else 0.0
+        cos = float(np.mean(sims)) if sims else 0.0
+        print(f"{size:>6} {np.mean(times):>8.1f} {np.median(times):>8.1f} {recall:>8.3f} {cos:>8.4f}")
+
+    # Kích thước chế độ "auto" sẽ chọn cho từng ảnh (dựa trên khuôn mặt nhỏ nhất của ảnh đó)
+    selector = DetSizeSelector(mode='auto', choices=sizes, window=1, full_sweep_interval=0)
+    for image, faces in zip(images, reference):
+        selector.observe(faces)
+        selector.select(image.shape)
+    usage = ", ".join(f"{size}px={count}" for size, count in selector.summary().items())
+    print(f"\nauto selection: {usage}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Benchmark cấp phát bộ nhớ của vòng lặp realtime (tracemalloc)
+Chạy đúng đường code của webcam demo: FaceDetector.detect_faces (to_model_order),
+get_face_embeddings, FaceTracker và draw_overlay; so sánh cách cũ (frame.copy,
+ảnh màu model và ma trận embedding cấp phát mỗi frame) với buffer tái sử dụng
+(out=), và đo số frame buffer mà RealtimePipeline / VideoProcessor cấp phát.
+Mặc định model insightface được thay bằng model giả trả về bbox / embedding cố
+định để chỉ đo phần cấp phát của pipeline (--real-model dùng model thật).
+
+    python -m benchmarks.frame_alloc_benchmark --frames 300 --width 1080 --height 720
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import face_core.detector as detector_module
+import face_core.video as video_module
+from config import MODEL_COLOR_ORDER
+from face_core.detector import FaceDetector
+from face_core.pipeline import RealtimePipeline
+from face_core.tracker import FaceTracker
+from face_core.video import VideoProcessor
+from demos.webcam_realtime_demo import draw_overlay
+
+EMBEDDING_DIM = 512
+RESULT = {'result': 'person', 'score': 0.8, 'top_matches': [('person', 0.8)]}
+
+
+class StubDetModel:
+    """Model detection giả: `faces` khuôn mặt cố định xếp hàng ngang trong frame"""
+
+    def __init__(self, shape, faces):
+        height, width = shape[:2]
+        side = min(height // 3, width // (2 * faces + 1))
+        boxes, kps = [], []
+        for i in range(faces):
+            x1, y1 = (2 * i + 1) * side, height // 3
+            boxes.append([x1, y1, x1 + side, y1 + side, 0.99])
+            kps.append([[x1 + side * fx, y1 + side * fy]
+                        for fx, fy in ((0.3, 0.4), (0.7, 0.4), (0.5, 0.6), (0.35, 0.8), (0.65, 0.8))])
+        self.bboxes = np.array(boxes, dtype=np.float32)
+        self.kpss = np.array(kps, dtype=np.float32)
+
+    def detect(self, image, input_size=None, max_num=0, metric='default'):
+        return self.bboxes, self.kpss
+
+
+class _StubInput:
+    shape = ['None', 3, 112, 112]  # batch động
+
+
+class _StubSession:
+    def get_inputs(self):
+        return [_StubInput()]
+
+
+class StubRecModel:
+    """Model recognition giả: gán embedding cố định, không chạy inference"""
+
+    input_size = (112, 112)
+
+    def __init__(self, faces, seed=0):
+        self.embeddings = np.random.default_rng(seed).standard_normal((faces, EMBEDDING_DIM)).astype(np.float32)
+        self.session = _StubSession()
+
+    def get(self, image, face):
+        face.embedding = self.embeddings[int(face.bbox[0]) % len(self.embeddings)]
+        return face.embedding
+
+    def get_feat(self, crops):
+        return self.embeddings[np.arange(len(crops)) % len(self.embeddings)]
+
+
+class StubFaceAnalysis:
+    def __init__(self, shape, faces):
+        self.det_model = StubDetModel(shape, faces)
+        self.models = {'detection': self.det_model, 'recognition': StubRecModel(faces)}
+
+
+def create_detector(shape, faces, real_model):
+    """FaceDetector thật; model được thay bằng model giả nếu không dùng --real-model"""
+    if real_model:
+        detector = FaceDetector()
+    else:
+        original = detector_module.get_face_analysis
+        detector_module.get_face_analysis = lambda *args, **kwargs: StubFaceAnalysis(shape, faces)
+        try:
+            detector = FaceDetector()
+        finally:
+            detector_module.get_face_analysis = original
+    detector.use_cache = False
+    return detector
+
+
+class SyntheticCapture:
+    """Giả lập cv2.VideoCapture: read(image) ghi frame vào buffer nếu được truyền"""
+
+    def __init__(self, width, height, frames, fps=0):
+        self.shape = (height, width, 3)
+        self.remaining = frames
+        self.interval = 1.0 / fps if fps else 0
+        self.value = 0
+
+    def isOpened(self):
+        return True
+
+    def get(self, prop):
+        return 30.0 if prop == cv2.CAP_PROP_FPS else 0
+
+    def grab(self):
+        ok, _ = self.read()
+        return ok
+
+    def read(self, image=None):
+        if self.remaining <= 0:
+            return False, None
+        self.remaining -= 1
+        if self.interval:
+            time.sleep(self.interval)
+        if image is None or image.shape != self.shape:
+            image = np.empty(self.shape, dtype=np.uint8)
+        self.value = (self.value + 1) % 256
+        image.fill(self.value)
+        return True, image
+
+    def release(self):
+        pass
+
+
+def recognize_tracks(detector, tracker, model_image, faces, timestamp, embeddings_out=None):
+    """Phần inference của webcam demo: track, embed khuôn mặt cần nhận diện, gán kết quả"""
+    tracks = tracker.update([face.bbox for face in faces or []], timestamp)
+    pending = [(face, track) for face, track in zip(faces or [], tracks)
+               if tracker.needs_recognition(track, timestamp)]
+    if not pending:
+        return None
+    pending_faces = [face for face, _ in pending]
+    detector.embed_faces(model_image, pending_faces)
+    embeddings = detector.get_face_embeddings(pending_faces, out=embeddings_out)
+    for _, track in pending:
+        tracker.set_result(track, RESULT, timestamp)
+    return embeddings
+
+
+def legacy_step(detector, tracker, frame, timestamp, buffers):
+    """Cách cũ: mỗi frame cấp phát bản copy hiển thị, ảnh màu của model và ma trận embedding"""
+    display = frame.copy()
+    model_image, faces = detector.detect_faces(frame, embed=False)
+    recognize_tracks(detector, tracker, model_image, faces, timestamp)
+    draw_overlay(display, tracker.snapshot(timestamp), 30.0, "Latency: 0 ms")
+    return display
+
+
+def buffered_step(detector, tracker, frame, timestamp, buffers):
+    """Buffer tái sử dụng: copyto vào frame hiển thị, detect_faces(out=), get_face_embeddings(out=)"""
+    display, image, embeddings = buffers
+    np.copyto(display, frame)
+    model_image, faces = detector.detect_faces(frame, embed=False, out=image)
+    recognize_tracks(detector, tracker, model_image, faces, timestamp, embeddings_out=embeddings)
+    draw_overlay(display, tracker.snapshot(timestamp), 30.0, "Latency: 0 ms")
+    return display
+
+
+def measure_steps(step, detector, frames, buffers, revalidate):
+    """Trung bình số byte cấp phát tạm thời (peak - hiện tại) mỗi frame"""
+    tracker = FaceTracker(revalidate_interval=revalidate)
+    step(detector, tracker, frames[0], 0.0, buffers)  # warmup
+    tracemalloc.start()
+    transient = []
+    for i, frame in enumerate(frames, 1):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step(detector, tracker, frame, i / 30.0, buffers)
+        _, peak = tracemalloc.get_traced_memory()
+        transient.append(peak - current)
+    tracemalloc.stop()
+    return float(np.mean(transient))
+
+
+def measure_pipeline(detector, width, height, frames, revalidate):
+    """Webcam demo với capture giả lập: buffer frame cấp phát và peak bộ nhớ"""
+    capture = SyntheticCapture(width, height, frames, fps=120)
+    tracker = FaceTracker(revalidate_interval=revalidate)
+    worker_buffers = threading.local()
+
+    def process_fn(frame):
+        timestamp = time.perf_counter()
+        model_image, faces = detector.detect_faces(frame, embed=False, out=getattr(worker_buffers, 'image', None))
+        if model_image is not frame:
+            worker_buffers.image = model_image
+        if getattr(worker_buffers, 'embeddings', None) is None:
+            worker_buffers.embeddings = np.empty((8, EMBEDDING_DIM), dtype=np.float32)
+        recognize_tracks(detector, tracker, model_image, faces, timestamp, worker_buffers.embeddings)
+        return []
+
+    pipeline = RealtimePipeline(capture, process_fn)
+    tracemalloc.start()
+    pipeline.start()
+    display, last_id, rendered = None, -1, 0
+    while True:
+        packet = pipeline.next_frame(last_id, timeout=0.5, out=display)
+        if packet is None:
+            if not pipeline.running:
+                break
+            continue
+        last_id, display, _ = packet
+        draw_overlay(display, tracker.snapshot(time.perf_counter()), 30.0, "Latency: 0 ms")
+        rendered += 1
+    pipeline.stop()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rendered, pipeline.frame_pool.allocated, peak
+
+
+def measure_video(detector, width, height, frames):
+    """VideoProcessor trên video giả lập (mọi frame được lấy mẫu): số buffer frame cấp phát"""
+
+    class Recognizer:
+        def recognize_batch(self, embeddings):
+            return [RESULT] * len(embeddings)
+
+    original = video_module.cv2.VideoCapture
+    video_module.cv2.VideoCapture = lambda path: SyntheticCapture(width, height, frames)
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            report = VideoProcessor(detector, Recognizer(), sample_fps=0).process(
+                'synthetic', os.path.join(folder, 'timeline.jsonl'))
+    finally:
+        video_module.cv2.VideoCapture = original
+    return report['sampled_frames'], report['frame_buffers']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Realtime loop allocation benchmark')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=1080)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--faces', type=int, default=3)
+    parser.add_argument('--revalidate', type=float, default=0.5,
+                        help='Số giây giữa hai lần nhận diện lại một track (nhỏ = embed nhiều hơn)')
+    parser.add_argument('--real-model', action='store_true', help='Dùng model insightface thật thay cho model giả')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    shape = (args.height, args.width, 3)
+    frame_bytes = int(np.prod(shape))
+    frames = [rng.integers(0, 256, shape, dtype=np.uint8) for _ in range(4)] * (args.frames // 4 + 1)
+    frames = frames[:args.frames]
+    detector = create_detector(shape, args.faces, args.real_model)
+    buffers = (np.empty(shape, dtype=np.uint8), np.empty(shape, dtype=np.uint8),
+               np.empty((8, EMBEDDING_DIM), dtype=np.float32))
+
+    print(f"model={'real' if args.real_model else 'stub'}, MODEL_COLOR_ORDER={MODEL_COLOR_ORDER}"
+          f"{' (frame BGR được đưa thẳng vào model)' if MODEL_COLOR_ORDER == 'bgr' else ''}")
+    print(f"{'loop':>10} {'bytes/frame':>14} {'frames':>8} {'MB/s @30fps':>12}")
+    for name, step in (('legacy', legacy_step), ('buffered', buffered_step)):
+        per_frame = measure_steps(step, detector, frames, buffers, args.revalidate)
+        print(f"{name:>10} {per_frame:>14.0f} {per_frame / frame_bytes:>8.2f} {per_frame * 30 / 1e6:>12.1f}")
+
+    rendered, allocated, peak = measure_pipeline(detector, args.width, args.height, args.frames, args.revalidate)
+    print(f"\npipeline: {rendered} frames rendered, {allocated} frame buffers allocated, "
+          f"peak traced {peak / 1e6:.1f} MB")
+    sampled, allocated = measure_video(detector, args.width, args.height, args.frames)
+    print(f"video: {sampled} frames processed, {allocated} frame buffers allocated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark search backend của gallery
+So sánh recall@1 và độ trễ của IVF với tìm kiếm chính xác trên gallery giả lập
+
+    python -m benchmarks.search_benchmark --sizes 1000 10000 100000 1000000
+"""
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_core.index import GalleryIndex
+from face_core.search import ExactSearchBackend, IVFSearchBackend
+
+EMBEDDING_DIM = 512
+NOISE_STD = 0.045  # Cosine ~0.7 giữa các ảnh của cùng một người
+
+
+def make_gallery(size, per_person, rng, chunk_size=100000):
+    """Tạo index giả lập với `size` embedding, mỗi người `per_person` embedding"""
+    people = max(1, size // per_person)
+    centers = rng.standard_normal((people, EMBEDDING_DIM), dtype=np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    counts = np.full(people, per_person, dtype=np.int64)
+    counts[: size - people * per_person] += 1
+    labels = np.repeat(np.arange(people), counts)
+
+    matrix = np.empty((len(labels), EMBEDDING_DIM), dtype=np.float32)
+    for start in range(0, len(labels), chunk_size):
+        block = centers[labels[start:start + chunk_size]]
+        block += NOISE_STD * rng.standard_normal(block.shape, dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        matrix[start:start + chunk_size] = block
+
+    index = GalleryIndex(EMBEDDING_DIM)
+    index.set_arrays([f"person_{i}" for i in range(people)], matrix, counts)
+    return index, centers
+
+
+def make_queries(centers, count, rng):
+    """Tạo query là ảnh mới (có nhiễu) của các người ngẫu nhiên"""
+    queries = centers[rng.integers(0, len(centers), count)]
+    queries = queries + NOISE_STD * rng.standard_normal(queries.shape, dtype=np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def run_queries(backend, index, queries):
+    """Chạy từng query một (như luồng nhận diện), trả về top-1 và ms/query"""
+    top1 = []
+    t0 = time.perf_counter()
+    for query in queries:
+        ids, _ = backend.search(index, query[np.newaxis], 1)
+        top1.append(ids[0][0])
+    elapsed_ms = (time.perf_counter() - t0) * 1000.0
+    return np.array(top1), elapsed_ms / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gallery search benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help='Số embedding trong gallery giả lập')
+    parser.add_argument('--per-person', type=int, default=5, help='Số embedding mỗi người')
+    parser.add_argument('--queries', type=int, default=200, help='Số query mỗi cấu hình')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32],
+                        help='Các giá trị nprobe cần đo')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'size':>9} {'backend':>12} {'ms/query':>10} {'recall@1':>9} {'build (s)':>10}")
+
+    for size in args.sizes:
+        index, centers = make_gallery(size, args.per_person, rng)
+        queries = make_queries(centers, args.queries, rng)
+
+        exact_top1, exact_ms = run_queries(ExactSearchBackend(), index, queries)
+        print(f"{size:>9} {'exact':>12} {exact_ms:>10.3f} {1.0:>9.3f} {'-':>10}")
+
+        ivf = IVFSearchBackend(min_size=0, seed=args.seed)
+        t0 = time.perf_counter()
+        ivf.build(index)
+        build_s = time.perf_counter() - t0
+
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            ivf_top1, ivf_ms = run_queries(ivf, index, queries)
+            recall = float(np.mean(ivf_top1 == exact_top1))
+            print(f"{size:>9} {f'ivf/{nprobe}':>12} {ivf_ms:>10.3f} {recall:>9.3f} {build_s:>10.2f}")
+
+        del index, ivf
+
+
+if __name__ == "__main__":
+    main()
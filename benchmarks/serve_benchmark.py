@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark throughput của recognition service (main.py --mode serve)
+Gửi cùng một ảnh với nhiều mức đồng thời, so sánh request/s và thời gian
+chờ hàng đợi / tính toán mà service báo về
+
+    python main.py --mode serve
+    python -m benchmarks.serve_benchmark --image test.jpg --requests 200 --concurrency 1 4 16
+"""
+
+import json
+import time
+import argparse
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+
+def post_image(url, data):
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/octet-stream'})
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+
+def run_level(url, data, requests, concurrency):
+    """Gửi `requests` request với `concurrency` client song song"""
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: post_image(url, data), range(requests)))
+    elapsed = time.perf_counter() - t0
+    timings = [r['timing'] for r in results if 'timing' in r]
+    return {
+        'rps': requests / elapsed,
+        'batch': float(np.mean([r.get('batch_size', 1) for r in results])),
+        'queue_ms': float(np.mean([t['queue_ms'] for t in timings])) if timings else 0.0,
+        'compute_ms': float(np.mean([t['compute_ms'] for t in timings])) if timings else 0.0,
+        'total_ms': float(np.mean([t['total_ms'] for t in timings])) if timings else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Recognition service throughput benchmark')
+    parser.add_argument('--image', required=True)
+    parser.add_argument('--url', default='http://127.0.0.1:8000/recognize')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        data = f.read()
+    post_image(args.url, data)  # warmup
+
+    print(f"{'clients':>8} {'req/s':>8} {'batch':>6} {'queue ms':>9} {'compute ms':>11} {'total ms':>9}")
+    for concurrency in args.concurrency:
+        r = run_level(args.url, data, args.requests, concurrency)
+        print(f"{concurrency:>8} {r['rps']:>8.1f} {r['batch']:>6.1f} {r['queue_ms']:>9.1f} "
+              f"{r['compute_ms']:>11.1f} {r['total_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
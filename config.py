@@ -4,16 +4,56 @@ CAMERA_WIDTH = 1080  # Độ rộng camera
 CAMERA_HEIGHT = 720  # Độ cao camera
 
 # Face Detection & Recognition
-RECOGNITION_INTERVAL = 0.3  # Nhận dạng mỗi 0.3 giây (ưu tiên accuracy)
+PIPELINE_WORKERS = 1  # Số inference worker trong pipeline realtime (webcam chạy nhanh nhất model cho phép)
+MOTION_GATE = False  # Bỏ qua detection khi khung cảnh đứng yên (camera giám sát qua đêm)
+MOTION_METHOD = "diff"  # "diff" (so với frame lần detect trước) hoặc "mog2" (background subtractor của OpenCV)
+MOTION_DOWNSCALE_WIDTH = 160  # Độ rộng ảnh xám dùng để đo chuyển động
+MOTION_PIXEL_THRESHOLD = 25  # Chênh lệch mức xám để một pixel được tính là thay đổi (method "diff")
+MOTION_MIN_AREA = 0.002  # Tỉ lệ pixel thay đổi tối thiểu để coi là có chuyển động
+MOTION_MAX_SKIP = 2.0  # Số giây tối đa giữa hai lần detect khi không có chuyển động
 RECOGNITION_THRESHOLD = 0.5  # Threshold cho nhận dạng
+TRACK_IOU_THRESHOLD = 0.3  # IoU tối thiểu để ghép bbox mới với track đang theo dõi
+TRACK_MAX_AGE = 1.0  # Số giây track được giữ lại khi không còn được detect
+TRACK_REVALIDATE_INTERVAL = 5.0  # Số giây trước khi nhận dạng lại một track đã chốt danh tính
+TRACK_VOTE_DECAY = 0.6  # Trọng số EMA của score cũ khi bỏ phiếu danh tính theo track (0 = chỉ dùng lần mới nhất)
+TRACK_COMMIT_SCORE = 0.6  # EMA score tối thiểu để chốt danh tính của track
+TRACK_COMMIT_HITS = 3  # Số lần liên tiếp cùng người dẫn đầu trước khi chốt danh tính
 DEFAULT_THRESHOLD = 0.5  # Default threshold cho face recognition
 DEFAULT_TOP_K = 3  # Số lượng kết quả top matches trả về
 SIMILARITY_THRESHOLD = 0.95  # Threshold cho việc kiểm tra ảnh trùng lặp
+DUPLICATE_CHUNK_SIZE = 2048  # Số embedding mỗi khối khi tìm duplicate (giới hạn bộ nhớ ma trận Gram)
+
+# Gallery Search
+SEARCH_BACKEND = "exact"  # Backend tìm kiếm: "exact" (brute-force) hoặc "ivf" (xấp xỉ)
+IVF_NLIST = 0  # Số cụm k-means cho IVF (0 = tự chọn ~sqrt(số embedding))
+IVF_NPROBE = 8  # Số cụm quét mỗi query (lớn hơn = recall cao hơn, chậm hơn)
+IVF_MIN_GALLERY_SIZE = 50000  # Dưới số embedding này IVF quét toàn bộ như exact
 
 # Model Settings
 MODEL_NAME = "buffalo_l"  # Tên model face detection
 CTX_ID = 0  # Context ID cho model
 DET_SIZE = (640, 640)  # Kích thước detection
+DET_INPUT_SIZE = 640  # Kích thước detection của webcam: 320 / 480 / 640 hoặc "auto" (chọn theo khuôn mặt nhỏ nhất gần đây)
+DET_SIZE_CHOICES = (320, 480, 640)  # Các kích thước detection chế độ "auto" được chọn
+DET_MIN_FACE_PIXELS = 32  # Cạnh khuôn mặt nhỏ nhất (pixel ở input detection) để vẫn detect ổn định
+DET_ADAPTIVE_WINDOW = 30  # Số lần detect gần nhất dùng để ước lượng khuôn mặt nhỏ nhất
+DET_FULL_SWEEP_INTERVAL = 15  # Chế độ "auto": cứ N lần detect chạy một lần ở kích thước lớn nhất để bắt khuôn mặt nhỏ mới xuất hiện
+ROI_DETECTION = False  # Webcam: chỉ detect quanh các khuôn mặt đang được track (ghép thành một ảnh mosaic)
+ROI_EXPAND = 0.75  # Mở rộng mỗi bbox thêm tỉ lệ này theo mỗi cạnh để bắt chuyển động giữa hai lần detect
+ROI_TILE_SIZE = 192  # Cạnh mỗi ô của mosaic (bội số của 32)
+ROI_MAX_COVERAGE = 0.5  # Vùng ROI chiếm quá tỉ lệ này của frame thì detect toàn frame
+ROI_FULL_SWEEP_INTERVAL = 10  # Cứ N lần detect chạy một lần toàn frame để bắt người mới xuất hiện
+DETECTION_MODULES = ['detection', 'recognition']  # Module buffalo_l được load (thêm 'landmark_2d_106', 'landmark_3d_68', 'genderage' nếu cần)
+MODEL_COLOR_ORDER = "rgb"  # Thứ tự màu ảnh đưa vào model: "rgb" khớp gallery cũ (luôn chuyển BGR->RGB), "bgr" là thứ tự gốc của insightface (frame OpenCV không cần chuyển màu, phải enroll lại gallery)
+
+# ONNX Runtime Settings
+ORT_PROVIDERS = None  # Danh sách provider, vd ['CPUExecutionProvider'] (None = CUDA nếu CTX_ID >= 0 và có GPU, ngược lại CPU)
+ORT_INTRA_OP_THREADS = 0  # Số thread trong một operator (0 = mặc định, dùng toàn bộ core)
+ORT_INTER_OP_THREADS = 0  # Số thread chạy song song các operator khi ORT_EXECUTION_MODE = "parallel" (0 = mặc định)
+ORT_GRAPH_OPTIMIZATION = "all"  # Mức tối ưu graph: "disable", "basic", "extended", "all"
+ORT_EXECUTION_MODE = "sequential"  # "sequential" hoặc "parallel"
+ORT_ENABLE_CPU_MEM_ARENA = True  # Dùng memory arena của ORT trên CPU (tắt để giảm RAM khi chạy nhiều process)
+ORT_ENABLE_MEM_PATTERN = True  # Cấp phát trước bộ nhớ theo pattern (cần input shape cố định)
 
 # Add Person Camera Settings
 CAPTURE_INTERVAL = 3  # Chụp mỗi 3 giây
@@ -21,8 +61,39 @@ MAX_FACES_ALLOWED = 1  # Chỉ cho phép 1 khuôn mặt
 WAIT_TIME_AFTER_INPUT = 2  # Đợi 2 giây sau khi nhập tên
 
 # File Settings
-GALLERY_PATH = 'face_gallery.pkl'  # Đường dẫn mặc định cho face gallery
+GALLERY_PATH = 'face_gallery'  # Thư mục store của face gallery (tự chuyển từ face_gallery.pkl nếu có)
+GALLERY_JOURNAL = True  # Ghi thay đổi gallery vào write-ahead log, gộp vào snapshot ở nền
+GALLERY_COMPACT_INTERVAL = 30  # Số giây giữa các lần compact journal
 SUPPORTED_IMAGE_EXT = "*.jpg *.jpeg *.png *.bmp *.gif"  # Định dạng ảnh hỗ trợ
+EMBEDDING_CACHE = True  # Cache kết quả detect/embed theo nội dung file/URL ảnh (gửi lại cùng ảnh không chạy lại model)
+EMBEDDING_CACHE_PATH = 'embedding_cache.sqlite'  # File SQLite của cache
+EMBEDDING_CACHE_MAX_ENTRIES = 10000  # Số ảnh tối đa trong cache (xóa ảnh lâu không dùng nhất)
+ENROLL_WORKERS = 8  # Số thread đọc/giải mã ảnh khi enroll hàng loạt
+ENROLL_BATCH_SIZE = 32  # Số khuôn mặt mỗi batch chạy model recognition khi enroll hàng loạt
+WORKER_PROCESSES = 0  # Số process worker (mỗi process một FaceAnalysis) cho enroll/nhận dạng hàng loạt (0 = chạy trong process chính)
+WORKER_INTRA_OP_THREADS = 0  # Số thread ONNX Runtime mỗi worker (0 = mặc định); nên ~ số core / WORKER_PROCESSES
+
+# Recognition Service (main.py --mode serve)
+SERVE_HOST = "127.0.0.1"  # Địa chỉ lắng nghe của HTTP server
+SERVE_PORT = 8000  # Cổng HTTP server
+SERVE_MAX_BATCH_SIZE = 16  # Số request tối đa gom vào một batch inference
+SERVE_MAX_WAIT_MS = 10  # Thời gian tối đa (ms) chờ thêm request sau request đầu tiên của batch
+SERVE_DECODE_WORKERS = 4  # Số thread giải mã ảnh
+SERVE_MAX_BODY_MB = 10  # Kích thước ảnh tối đa mỗi request
+SERVE_REQUEST_TIMEOUT = 30  # Số giây tối đa chờ kết quả của một request (quá hạn trả về 504)
+
+# Video Processing (main.py --mode video)
+VIDEO_SAMPLE_FPS = 5  # Số frame lấy mẫu mỗi giây video (0 = mọi frame)
+VIDEO_BATCH_SIZE = 16  # Số frame mỗi batch detection/recognition
+VIDEO_PREFETCH = 4  # Số frame đã giải mã tối đa chờ detect (mỗi frame giữ một buffer của FramePool)
+VIDEO_WORKERS = 2  # Số thread detect song song trong một batch
+
+# URL Image Loading
+URL_CONNECT_TIMEOUT = 3.05  # Timeout kết nối (giây) khi tải ảnh từ URL
+URL_READ_TIMEOUT = 10  # Timeout đọc (giây) giữa hai lần nhận dữ liệu
+URL_TOTAL_TIMEOUT = 30  # Thời gian tối đa (giây) cho cả một lần tải, kể cả khi server gửi nhỏ giọt
+URL_MAX_BYTES = 20 * 1024 * 1024  # Kích thước ảnh tối đa được tải (byte)
+URL_MAX_PARALLEL = 8  # Số URL tải song song tối đa (cũng là kích thước pool kết nối)
 
 # Sample Images
 SAMPLE_IMAGES = [
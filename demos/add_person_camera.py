@@ -10,18 +10,19 @@ from config import (
     MAX_FACES_ALLOWED, WAIT_TIME_AFTER_INPUT
 )
 
-def smart_add_person_camera():
+def smart_add_person_camera(detector=None, gallery_manager=None, recognizer=None):
     """Thêm người thông minh - tự động nhận diện và trả về summary.
 
     Thu thập trong suốt phiên:
       - existing_adds: dict name -> count (ảnh đã thêm cho người có sẵn)
       - unknown_groups: list of groups, mỗi group {'embs': [...], 'images': [...]} (chưa gán tên)
 
+    Có thể truyền detector/gallery_manager/recognizer sẵn có để tránh khởi tạo lại.
     Trả về một dict summary khi người dùng nhấn 'q'.
     """
-    detector = FaceDetector()
-    gallery_manager = FaceGalleryManager(detector)
-    recognizer = FaceRecognizer(detector, gallery_manager, threshold=RECOGNITION_THRESHOLD)
+    detector = detector or FaceDetector()
+    gallery_manager = gallery_manager or FaceGalleryManager(detector)
+    recognizer = recognizer or FaceRecognizer(detector, gallery_manager, threshold=RECOGNITION_THRESHOLD)
 
     cap = cv2.VideoCapture(0)
     if not cap.isOpened():
@@ -168,7 +169,7 @@ def _process_auto_capture(frame, detector, gallery_manager, recognizer):
       - {'status':'unknown', 'embedding':..., 'image':..., 'message':...}
       - {'status':'no_face'|'multiple'|'error', 'message':...}
     """
-    img_rgb, faces = detector.detect_faces(frame)
+    img_rgb, faces = detector.detect_faces(frame, return_rgb=True)
 
     if not faces or len(faces) == 0:
         return {"status": "no_face", "message": "Không tìm thấy khuôn mặt"}
@@ -176,17 +177,17 @@ def _process_auto_capture(frame, detector, gallery_manager, recognizer):
     if len(faces) > MAX_FACES_ALLOWED:
         return {"status": "multiple", "message": f"Tìm thấy {len(faces)} khuôn mặt - Chỉ được {MAX_FACES_ALLOWED} người"}
 
-    face = faces[0]
-    embedding = detector.get_face_embedding(img_rgb, face)
-    if embedding is None:
+    embeddings = detector.get_face_embeddings(faces)
+    if len(embeddings) == 0:
         return {"status": "error", "message": "Không thể trích xuất embedding"}
 
-    result = recognizer.recognize(embedding)
+    embedding = embeddings[0]
+    result = recognizer.recognize_batch(embeddings)[0]
     person_name = result.get("result")
     score = result.get("score", 0)
 
     if person_name and person_name != "Unknown":
-        success, msg = gallery_manager.add_person(person_name, image=img_rgb)
+        success, msg = gallery_manager.add_person(person_name, image=img_rgb, color_order='rgb')
         if success:
             return {"status": "existing", "name": person_name, "message": f"Thêm ảnh cho {person_name} (score: {score:.3f})"}
         else:
@@ -194,9 +195,9 @@ def _process_auto_capture(frame, detector, gallery_manager, recognizer):
     else:
         return {"status": "unknown", "embedding": embedding, "image": img_rgb, "message": f"Người mới phát hiện (score: {score:.3f})"}
 
-def add_person_camera():
+def add_person_camera(detector=None, gallery_manager=None, recognizer=None):
     """Thêm người bằng camera - chế độ thông minh"""
-    return smart_add_person_camera()
+    return smart_add_person_camera(detector, gallery_manager, recognizer)
 
 if __name__ == "__main__":
     add_person_camera()
\ No newline at end of file
@@ -1,10 +1,9 @@
 import os
-import cv2
 import time
 from face_core.detector import FaceDetector
 from face_core.gallery import FaceGalleryManager
 from face_core.recognizer import FaceRecognizer
-from utils.image_utils import load_image_from_url
+from utils.image_utils import load_images_from_urls, load_bytes_from_url
 from utils.visualization import draw_faces, show_image
 from config import (
     SAMPLE_IMAGES, DEFAULT_TEST_IMAGE,
@@ -18,8 +17,7 @@ def init_sample_gallery(gallery_manager):
         return
     
     print("Khởi tạo gallery mẫu...")
-    for i, url in enumerate(SAMPLE_IMAGES):
-        img = load_image_from_url(url)
+    for i, img in enumerate(load_images_from_urls(SAMPLE_IMAGES)):
         if img is not None:
             success, msg = gallery_manager.add_person(f"Sample_Person_{i+1}", image=img)
             if success:
@@ -29,13 +27,13 @@ def init_sample_gallery(gallery_manager):
 
 def recognize_from_file(image_path, detector, recognizer):
     """Nhận diện khuôn mặt từ file ảnh và hiển thị kết quả"""
-    img = cv2.imread(image_path)
+    # Ảnh đã gửi trước đó lấy kết quả từ cache embedding (chỉ giải mã để hiển thị)
+    t0 = time.perf_counter()
+    img, faces = detector.detect_file(image_path, decode=True)
     if img is None:
         print(f"Không thể đọc ảnh từ {image_path}")
         return None
-    
-    t0 = time.perf_counter()
-    img_rgb, faces = detector.detect_faces(img)
+    img_rgb = detector.to_rgb(img, 'bgr')
     if faces is None or len(faces) == 0:
         print("Không phát hiện khuôn mặt nào")
         t1 = time.perf_counter()
@@ -43,17 +41,14 @@ def recognize_from_file(image_path, detector, recognizer):
         print(f"No faces - {elapsed_ms:.1f} ms")
         return None
     
-    results = []
-    for i, face in enumerate(faces):
-        embedding = detector.get_face_embedding(img_rgb, face)
-        if embedding is not None:
-            result = recognizer.recognize(embedding)
-            results.append(result)
-            print(f"Khuôn mặt {i+1}: {result['result']} (Score: {result.get('score', 0):.3f})")
-            if result.get('top_matches'):
-                print("Top matches:")
-                for name, score in result['top_matches'][:3]:
-                    print(f"  - {name}: {score:.3f}")
+    embeddings = detector.get_face_embeddings(faces)
+    results = recognizer.recognize_batch(embeddings)
+    for i, result in enumerate(results):
+        print(f"Khuôn mặt {i+1}: {result['result']} (Score: {result.get('score', 0):.3f})")
+        if result.get('top_matches'):
+            print("Top matches:")
+            for name, score in result['top_matches'][:3]:
+                print(f"  - {name}: {score:.3f}")
     
     # Vẽ kết quả (không hiển thị) và tính thời gian inference-only
     t1 = time.perf_counter()
@@ -101,17 +96,20 @@ def recognize_from_source(source, detector, recognizer):
 def recognize_from_url(url, detector, recognizer):
     """Nhận diện khuôn mặt từ URL và hiển thị kết quả"""
     print(f"Đang tải ảnh từ: {url}")
-    img = load_image_from_url(url)
-    if img is None:
+    data = load_bytes_from_url(url)
+    if not data:
         print("Không thể tải ảnh từ URL")
         return None
     
-    # Chuyển đổi ảnh sang RGB
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    
-    # Phát hiện khuôn mặt
+    # Phát hiện khuôn mặt (URL đã gửi trước đó lấy kết quả từ cache embedding)
     t0 = time.perf_counter()
-    _, faces = detector.detect_faces(img)
+    img, faces = detector.detect_encoded(data, decode=True)
+    if img is None:
+        print("Không thể giải mã ảnh từ URL")
+        return None
+    
+    # Chuyển đổi ảnh sang RGB
+    img_rgb = detector.to_rgb(img, 'bgr')
     if faces is None or len(faces) == 0:
         print("Không phát hiện khuôn mặt nào")
         t1 = time.perf_counter()
@@ -120,17 +118,14 @@ def recognize_from_url(url, detector, recognizer):
         return None
     
     # Nhận diện khuôn mặt
-    results = []
-    for i, face in enumerate(faces):
-        embedding = detector.get_face_embedding(img_rgb, face)
-        if embedding is not None:
-            result = recognizer.recognize(embedding)
-            results.append(result)
-            print(f"Khuôn mặt {i+1}: {result['result']} (Score: {result.get('score', 0):.3f})")
-            if result.get('top_matches'):
-                print("Top matches:")
-                for name, score in result['top_matches'][:3]:
-                    print(f"  - {name}: {score:.3f}")
+    embeddings = detector.get_face_embeddings(faces)
+    results = recognizer.recognize_batch(embeddings)
+    for i, result in enumerate(results):
+        print(f"Khuôn mặt {i+1}: {result['result']} (Score: {result.get('score', 0):.3f})")
+        if result.get('top_matches'):
+            print("Top matches:")
+            for name, score in result['top_matches'][:3]:
+                print(f"  - {name}: {score:.3f}")
     
     # Vẽ kết quả (không hiển thị) và tính thời gian inference-only
     t1 = time.perf_counter()
@@ -164,11 +159,11 @@ def recognize_from_url(url, detector, recognizer):
 
     return results
 
-def image_recognition_demo():
-    # Khởi tạo các đối tượng
-    detector = FaceDetector()
-    gallery_manager = FaceGalleryManager(detector)
-    recognizer = FaceRecognizer(detector, gallery_manager)
+def image_recognition_demo(detector=None, gallery_manager=None, recognizer=None):
+    # Khởi tạo các đối tượng (hoặc dùng lại đối tượng được truyền vào)
+    detector = detector or FaceDetector()
+    gallery_manager = gallery_manager or FaceGalleryManager(detector)
+    recognizer = recognizer or FaceRecognizer(detector, gallery_manager)
     
     # Khởi tạo gallery mẫu nếu cần
     if not gallery_manager.gallery:
@@ -0,0 +1,164 @@
+import os
+import cv2
+import time
+import threading
+from face_core.detector import FaceDetector
+from face_core.gallery import FaceGalleryManager
+from face_core.recognizer import FaceRecognizer
+from face_core.pipeline import MultiSourcePipeline
+from face_core.tracker import FaceTracker
+from config import (
+    RECOGNITION_THRESHOLD, PIPELINE_WORKERS,
+    CAMERA_FPS, CAMERA_WIDTH, CAMERA_HEIGHT
+)
+
+
+class PacedCapture:
+    """Đọc file video theo đúng FPS của file (giống camera) thay vì nhanh nhất có thể"""
+
+    def __init__(self, capture):
+        self.capture = capture
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        self.interval = 1.0 / fps if fps and fps > 0 else 1.0 / CAMERA_FPS
+        self.next_time = None
+
+    def read(self, image=None):
+        now = time.perf_counter()
+        if self.next_time is not None and now < self.next_time:
+            time.sleep(self.next_time - now)
+        self.next_time = max(now, self.next_time or now) + self.interval
+        return self.capture.read(image) if image is not None else self.capture.read()
+
+    def release(self):
+        self.capture.release()
+
+
+def open_source(source):
+    """Mở camera index ("0"), URL (rtsp/http) hoặc file video; trả về capture hoặc None"""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        return None
+    if isinstance(source, int):
+        cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_WIDTH)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_HEIGHT)
+    elif os.path.isfile(source):
+        return PacedCapture(cap)
+    return cap
+
+
+def multi_camera_demo(sources, detector=None, gallery_manager=None, recognizer=None):
+    """Nhận dạng realtime trên nhiều camera/URL/file với một bản model dùng chung
+
+    Mỗi nguồn có thread capture và tracker riêng; inference worker
+    (PIPELINE_WORKERS) phục vụ các nguồn xoay vòng.
+    """
+    detector = detector or FaceDetector()
+    gallery_manager = gallery_manager or FaceGalleryManager(detector)
+    recognizer = recognizer or FaceRecognizer(detector, gallery_manager, threshold=RECOGNITION_THRESHOLD)
+
+    if not gallery_manager.gallery:
+        print("⚠️ [GALLERY] Gallery trống!")
+        print("📝 Hãy thêm người vào gallery trước khi sử dụng chức năng này.")
+        return
+
+    captures, names = [], []
+    for source in sources:
+        cap = open_source(source)
+        if cap is None:
+            print(f"❌ [CAMERA] Không thể mở nguồn: {source}")
+            continue
+        captures.append(cap)
+        names.append(str(source))
+    if not captures:
+        return
+
+    print(f"🎥 Đang chạy {len(captures)} nguồn: {', '.join(names)}")
+    print("👆 Nhấn 'q' để thoát")
+
+    # Tracker riêng cho từng nguồn (bbox của các camera không liên quan nhau)
+    trackers = [FaceTracker(threshold=recognizer.threshold) for _ in captures]
+    worker_buffers = threading.local()
+
+    def process_frame(index, frame):
+        """Chạy trong inference worker dùng chung: detect, chỉ nhận diện track cần thiết"""
+        timestamp = time.perf_counter()
+        tracker = trackers[index]
+        model_image, faces = detector.detect_faces(frame, embed=False, out=getattr(worker_buffers, 'image', None))
+        if model_image is not frame:
+            worker_buffers.image = model_image
+        tracks = tracker.update([face.bbox for face in faces or []], timestamp)
+        pending = [(face, track) for face, track in zip(faces or [], tracks)
+                   if tracker.needs_recognition(track, timestamp)]
+        if not pending:
+            return []
+        pending_faces = [face for face, _ in pending]
+        detector.embed_faces(model_image, pending_faces)
+        results = recognizer.recognize_batch(detector.get_face_embeddings(pending_faces))
+        for (_, track), result in zip(pending, results):
+            tracker.set_result(track, result, timestamp)
+        return [(track.track_id, track.result) for _, track in pending]
+
+    def on_results(index, results, elapsed_ms):
+        for track_id, voted in results:
+            status = "committed" if voted.get('committed') else "voting"
+            print(f"👤 [{names[index]}] track #{track_id}: {voted['result']} "
+                  f"({voted['score']:.3f}, {status}) - {elapsed_ms:.1f} ms")
+
+    pipeline = MultiSourcePipeline(captures, process_frame, workers=PIPELINE_WORKERS,
+                                   on_results=on_results, names=names)
+    pipeline.start()
+    last_ids = [-1] * len(captures)
+    display_frames = [None] * len(captures)
+    start_time = time.time()
+
+    try:
+        while pipeline.active:
+            shown = False
+            for index in range(len(captures)):
+                packet = pipeline.next_frame(index, last_ids[index], timeout=0, out=display_frames[index])
+                if packet is None:
+                    continue
+                last_ids[index], display_frames[index], _ = packet
+                frame = display_frames[index]
+                for _, bbox, result in trackers[index].snapshot(time.perf_counter()):
+                    if result is None:
+                        continue
+                    x1, y1, x2, y2 = bbox.astype(int)
+                    name = result['result']
+                    color = (0, 0, 255) if name == "Unknown" else (0, 255, 0)
+                    thickness = 2 if result.get('committed') else 1
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, thickness)
+                    cv2.putText(frame, f"{name} ({result.get('score', 0):.2f})", (x1, y1 - 10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+                cv2.imshow(f"Face Recognition - {names[index]}", frame)
+                shown = True
+            if not shown:
+                time.sleep(0.005)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+    except KeyboardInterrupt:
+        print("\n⏹️ Dừng bởi người dùng")
+    except Exception as e:
+        print(f"❌ [ERROR] Lỗi trong quá trình chạy: {e}")
+
+    finally:
+        pipeline.stop()
+        for cap in captures:
+            cap.release()
+        cv2.destroyAllWindows()
+
+        print(f"\n📊 Thống kê ({time.time() - start_time:.1f}s, {len(captures)} nguồn, "
+              f"{pipeline.workers} inference worker, {pipeline.frame_pool.allocated} frame buffers):")
+        for name, stats in pipeline.stats_summary().items():
+            print(f"   📹 {name}: capture {stats['capture_fps']:.1f} FPS, processed {stats['processed_fps']:.1f} FPS, "
+                  f"dropped {stats['dropped']}/{stats['put']}")
+            print(f"      inference avg={stats['inference']['avg_ms']:.1f} ms, "
+                  f"queue wait avg={stats['queue_wait']['avg_ms']:.1f} ms, "
+                  f"end-to-end p50={stats['end_to_end']['p50_ms']:.1f} ms")
+            if stats['error']:
+                print(f"      ⚠️  {stats['error']}")
+        print("✅ Đã thoát multi-camera demo")
@@ -1,20 +1,68 @@
 import cv2
 import time
+import itertools
+import threading
 import statistics
+import numpy as np
 from face_core.detector import FaceDetector
 from face_core.gallery import FaceGalleryManager
 from face_core.recognizer import FaceRecognizer
+from face_core.pipeline import RealtimePipeline
+from face_core.tracker import FaceTracker
+from face_core.det_size import DetSizeSelector
+from face_core.motion import MotionGate
 from config import (
-    RECOGNITION_INTERVAL, RECOGNITION_THRESHOLD,
+    RECOGNITION_THRESHOLD, PIPELINE_WORKERS, ROI_DETECTION, ROI_FULL_SWEEP_INTERVAL, MOTION_GATE,
     CAMERA_FPS, CAMERA_WIDTH, CAMERA_HEIGHT
 )
 
-def webcam_realtime_demo():
-    """Demo webcam với nhận dạng realtime - chỉ hiển thị FPS"""
+def draw_overlay(display_frame, snapshot, fps, latency_text):
+    """Vẽ bbox + nhãn của các track (`FaceTracker.snapshot`) và FPS/latency tại chỗ lên frame hiển thị"""
+    for _, bbox, result in snapshot:
+        if result is None:
+            continue
+        
+        x1, y1, x2, y2 = bbox.astype(int)
+        name = result['result']
+        score = result.get('score', 0)
+        
+        # Chọn màu theo kết quả
+        if name == "Unknown":
+            color = (0, 0, 255)  # Đỏ
+        elif score > 0.7:
+            color = (0, 255, 0)  # Xanh lá
+        elif score > 0.5:
+            color = (0, 255, 255)  # Vàng
+        else:
+            color = (255, 165, 0)  # Cam
+        
+        # Vẽ bbox và label (viền mảnh khi danh tính của track chưa được chốt)
+        thickness = 2 if result.get('committed') else 1
+        cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, thickness)
+        label = f"{name} ({score:.2f})"
+        cv2.putText(display_frame, label, (x1, y1-10), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    
+    # Hiển thị FPS và latency
+    cv2.putText(display_frame, f"FPS: {fps:.1f}", (10, 30), 
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    cv2.putText(display_frame, latency_text, (10, 60),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+    
+    # Hiển thị hướng dẫn
+    cv2.putText(display_frame, "Press 'q' to quit", 
+               (10, display_frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    return display_frame
+
+def webcam_realtime_demo(detector=None, gallery_manager=None, recognizer=None):
+    """Demo webcam với nhận dạng realtime - chỉ hiển thị FPS
+
+    Có thể truyền detector/gallery_manager/recognizer sẵn có để tránh khởi tạo lại.
+    """
     # Khởi tạo
-    detector = FaceDetector()
-    gallery_manager = FaceGalleryManager(detector)
-    recognizer = FaceRecognizer(detector, gallery_manager, threshold=RECOGNITION_THRESHOLD)
+    detector = detector or FaceDetector()
+    gallery_manager = gallery_manager or FaceGalleryManager(detector)
+    recognizer = recognizer or FaceRecognizer(detector, gallery_manager, threshold=RECOGNITION_THRESHOLD)
     
     # Kiểm tra gallery
     if not gallery_manager.gallery:
@@ -39,97 +87,114 @@ def webcam_realtime_demo():
     
     frame_count = 0
     start_time = time.time()
-    last_recognition_time = time.time()
     
-    # Cache kết quả để tránh flickering
-    cached_results = []
     # Per-person score history for session summary
     per_person_scores = {}
+    # Inference time samples for session summary
+    proc_samples = []
+    
+    # Track khuôn mặt giữa các frame; danh tính được bỏ phiếu theo track và
+    # khi đã chốt thì không phải embed lại người đó nữa
+    tracker = FaceTracker(threshold=recognizer.threshold)
+    
+    # Kích thước input detection (cố định hoặc tự chọn theo khuôn mặt nhỏ nhất gần đây);
+    # bbox/keypoints luôn ở độ phân giải gốc nên căn chỉnh vẫn dùng frame đầy đủ
+    det_sizes = DetSizeSelector()
+    # ROI_DETECTION: chỉ detect quanh bbox dự đoán của các track, định kỳ quét toàn frame
+    detect_calls = itertools.count()
+    # MOTION_GATE: khung cảnh đứng yên và không có track nào thì bỏ qua detection
+    motion_gate = MotionGate() if MOTION_GATE else None
+    
+    # Buffer ảnh đã chuyển màu/embedding riêng cho từng inference worker, tái sử dụng giữa các frame
+    worker_buffers = threading.local()
+    
+    def process_frame(frame):
+        """Chạy trong inference worker: detect mọi khuôn mặt, chỉ nhận diện track cần thiết"""
+        timestamp = time.perf_counter()
+        if motion_gate is not None and not motion_gate.check(frame, timestamp, active=bool(tracker.tracks)):
+            return None
+        # Frame camera là BGR: chỉ chuyển màu (vào buffer của worker) nếu model cần RGB
+        rois = None
+        if ROI_DETECTION and next(detect_calls) % ROI_FULL_SWEEP_INTERVAL:
+            rois = [bbox for _, bbox, _ in tracker.snapshot(timestamp)]
+        # Luôn chọn det_size: detector quay về detect toàn frame khi các ROI phủ quá nhiều
+        model_image, faces = detector.detect_faces(frame, embed=False, out=getattr(worker_buffers, 'image', None),
+                                                   det_size=det_sizes.select(frame.shape), rois=rois)
+        det_sizes.observe(faces)
+        if model_image is not frame:
+            worker_buffers.image = model_image
+        tracks = tracker.update([face.bbox for face in faces or []], timestamp)
+        pending = [(face, track) for face, track in zip(faces or [], tracks)
+                   if tracker.needs_recognition(track, timestamp)]
+        if not pending:
+            return []
+        
+        # Nhận diện các track mới / score thấp / quá hạn bằng một lần so khớp
+        pending_faces = [face for face, _ in pending]
+        detector.embed_faces(model_image, pending_faces)
+        if getattr(worker_buffers, 'embeddings', None) is None or len(worker_buffers.embeddings) < len(pending_faces):
+            worker_buffers.embeddings = np.empty((max(8, len(pending_faces)), 512), dtype=np.float32)
+        embeddings = detector.get_face_embeddings(pending_faces, out=worker_buffers.embeddings)
+        results = recognizer.recognize_batch(embeddings)
+        recognized = []
+        for (face, track), result in zip(pending, results):
+            tracker.set_result(track, result, timestamp)
+            recognized.append({'track_id': track.track_id, 'bbox': face.bbox.astype(int),
+                               'result': result, 'voted': track.result})
+        return recognized
+    
+    def on_results(results, elapsed_ms):
+        """Ghi nhận kết quả mỗi lần inference (chạy trong inference worker)"""
+        if results is None:  # Frame bị motion gate bỏ qua
+            return
+        proc_samples.append(elapsed_ms)
+        
+        # Print recognition results (chỉ các track vừa được nhận diện lại)
+        for result_info in results:
+            name = result_info['result']['result']
+            score = result_info['result'].get('score', 0)
+            voted = result_info['voted']
+            status = "committed" if voted.get('committed') else "voting"
+            print(f"👤 Detected: {name} (Score: {score:.3f}) -> track #{result_info['track_id']}: "
+                  f"{voted['result']} ({voted['score']:.3f}, {status}) - {elapsed_ms:.1f} ms")
+            # record per-person score for session summary
+            try:
+                per_person_scores.setdefault(name, []).append(float(score))
+            except Exception:
+                pass
+    
+    # Capture, inference và render chạy song song; inference luôn lấy frame mới nhất
+    pipeline = RealtimePipeline(cap, process_frame, workers=PIPELINE_WORKERS, on_results=on_results)
+    pipeline.start()
+    last_frame_id = -1
+    # Buffer hiển thị: frame mới nhất được copy vào đây rồi vẽ overlay tại chỗ
+    display_frame = None
+    # Chuỗi latency hiển thị, chỉ tính lại (median của cửa sổ mẫu) khoảng mỗi giây
+    latency_text = "Latency: -- ms"
+    latency_refresh = 0.0
     
     try:
         while True:
-            ret, frame = cap.read()
-            if not ret:
-                print("❌ [CAMERA] Không thể đọc frame từ webcam")
-                break
+            packet = pipeline.next_frame(last_frame_id, out=display_frame)
+            if packet is None:
+                if not pipeline.running:
+                    print(f"❌ [CAMERA] {pipeline.error or 'Không thể đọc frame từ webcam'}")
+                    break
+                continue
+            last_frame_id, display_frame, _ = packet
             
             frame_count += 1
             current_time = time.time()
             
-            # Nhận dạng với interval để ưu tiên accuracy
-            if current_time - last_recognition_time >= RECOGNITION_INTERVAL:
-                t0 = time.perf_counter()
-                img_rgb, faces = detector.detect_faces(frame)
-
-                if faces is not None and len(faces) > 0:
-                    cached_results = []
-                    for face in faces:
-                        embedding = detector.get_face_embedding(img_rgb, face)
-                        if embedding is not None:
-                            result = recognizer.recognize(embedding)
-                            cached_results.append({
-                                'bbox': face.bbox.astype(int),
-                                'result': result
-                            })
-                else:
-                    cached_results = []
-
-                t1 = time.perf_counter()
-                elapsed_ms = (t1 - t0) * 1000.0
-                # record sample for session-average
-                if 'proc_samples' not in locals():
-                    proc_samples = []
-                proc_samples.append(elapsed_ms)
-
-                # Print detection results with inference time on same line
-                if cached_results:
-                    for result_info in cached_results:
-                        name = result_info['result']['result']
-                        score = result_info['result'].get('score', 0)
-                        print(f"👤 Detected: {name} (Score: {score:.3f}) - {elapsed_ms:.1f} ms")
-                        # record per-person score for session summary
-                        try:
-                            per_person_scores.setdefault(name, []).append(float(score))
-                        except Exception:
-                            pass
-
-                last_recognition_time = current_time
-            
-            # Vẽ kết quả lên frame
-            display_frame = frame.copy()
-            for result_info in cached_results:
-                bbox = result_info['bbox']
-                result = result_info['result']
-                
-                x1, y1, x2, y2 = bbox
-                name = result['result']
-                score = result.get('score', 0)
-                
-                # Chọn màu theo kết quả
-                if name == "Unknown":
-                    color = (0, 0, 255)  # Đỏ
-                elif score > 0.7:
-                    color = (0, 255, 0)  # Xanh lá
-                elif score > 0.5:
-                    color = (0, 255, 255)  # Vàng
-                else:
-                    color = (255, 165, 0)  # Cam
-                
-                # Vẽ bbox và label
-                cv2.rectangle(display_frame, (x1, y1), (x2, y2), color, 2)
-                label = f"{name} ({score:.2f})"
-                cv2.putText(display_frame, label, (x1, y1-10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-            
-            # Hiển thị FPS
+            # Vẽ kết quả lên frame: bbox được dự đoán theo chuyển động của track
+            # nên overlay vẫn bám theo khuôn mặt giữa hai lần detect
             elapsed = current_time - start_time
             fps = frame_count / elapsed if elapsed > 0 else 0
-            cv2.putText(display_frame, f"FPS: {fps:.1f}", (10, 30), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            
-            # Hiển thị hướng dẫn
-            cv2.putText(display_frame, "Press 'q' to quit", 
-                       (10, display_frame.shape[0] - 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            if current_time >= latency_refresh:
+                latency = pipeline.stats['end_to_end'].summary()
+                latency_text = f"Latency: {latency['avg_ms']:.0f} ms"
+                latency_refresh = current_time + 1.0
+            draw_overlay(display_frame, tracker.snapshot(time.perf_counter()), fps, latency_text)
             
             # Hiển thị frame
             cv2.imshow('Face Recognition - Realtime', display_frame)
@@ -146,6 +211,7 @@ def webcam_realtime_demo():
         
     finally:
         # Giải phóng tài nguyên
+        pipeline.stop()
         cap.release()
         cv2.destroyAllWindows()
         
@@ -158,7 +224,7 @@ def webcam_realtime_demo():
         print(f"   📈 FPS trung bình: {avg_fps:.1f}")
 
         # If we recorded inference samples during the session, print summary
-        if 'proc_samples' in locals() and proc_samples:
+        if proc_samples:
             count = len(proc_samples)
             avg_ms = sum(proc_samples) / count
             try:
@@ -172,6 +238,34 @@ def webcam_realtime_demo():
         else:
             print("\n🧾 No inference samples recorded during session.")
 
+        # Bộ đếm của từng stage trong pipeline
+        pipeline_summary = pipeline.stats_summary()
+        queue_stats = pipeline_summary.pop('inference_queue')
+        print("\n🔀 Pipeline stages:")
+        for stage, stats in pipeline_summary.items():
+            print(f"   - {stage}: count={stats['count']}, avg={stats['avg_ms']:.1f} ms, "
+                  f"p50={stats['p50_ms']:.1f} ms, max={stats['max_ms']:.1f} ms")
+        print(f"   - inference queue: depth={queue_stats['depth']}, "
+              f"frames={queue_stats['put']}, dropped={queue_stats['dropped']}, "
+              f"frame buffers={queue_stats['frame_buffers']}")
+
+        # Số lần nhận diện lại và số lần dùng lại identity của track
+        print(f"\n🎯 Tracking: recognized={tracker.recognitions}, reused={tracker.reused}")
+        usage = ", ".join(f"{size}px={count}" for size, count in det_sizes.summary().items())
+        print(f"🔍 Detection size ({det_sizes.mode}): {usage or 'n/a'}")
+        if motion_gate is not None:
+            gate = motion_gate.summary()
+            print(f"🚦 Motion gate ({motion_gate.method}): motion={gate['motion']}, forced={gate['forced']}, "
+                  f"skipped={gate['skipped']} ({gate['skip_ratio']:.0%} detections saved)")
+
+        # Thời gian theo từng module của model
+        module_summary = detector.module_timing_summary()
+        if module_summary:
+            print("\n🧩 Per-module inference time:")
+            for module, stats in module_summary.items():
+                print(f"   - {module}: avg={stats['avg_ms']:.1f} ms/frame, "
+                      f"{stats['ms_per_face']:.1f} ms/face ({stats['calls']} calls)")
+
         # Per-person average score summary (session)
         if per_person_scores:
             print("\n📋 Per-person score summary:")
@@ -0,0 +1,61 @@
+import threading
+from collections import Counter, deque
+from config import (
+    DET_INPUT_SIZE, DET_SIZE_CHOICES, DET_MIN_FACE_PIXELS,
+    DET_ADAPTIVE_WINDOW, DET_FULL_SWEEP_INTERVAL
+)
+
+
+class DetSizeSelector:
+    """Chọn kích thước input của model detection cho từng frame.
+
+    `mode` là một kích thước cố định (320 / 480 / 640) hoặc "auto". Ở chế độ
+    "auto", kích thước nhỏ nhất được chọn sao cho khuôn mặt nhỏ nhất thấy được
+    trong `window` lần detect gần nhất vẫn còn >= `min_face_pixels` pixel ở
+    input detection (ảnh được letterbox với tỉ lệ size / max(h, w)). Khi chưa
+    thấy khuôn mặt nào, và cứ mỗi `full_sweep_interval` lần detect, dùng kích
+    thước lớn nhất để không bỏ sót khuôn mặt nhỏ mới xuất hiện.
+    """
+
+    def __init__(self, mode=DET_INPUT_SIZE, choices=DET_SIZE_CHOICES, min_face_pixels=DET_MIN_FACE_PIXELS,
+                 window=DET_ADAPTIVE_WINDOW, full_sweep_interval=DET_FULL_SWEEP_INTERVAL):
+        self.mode = mode
+        self.choices = sorted(choices)
+        self.min_face_pixels = min_face_pixels
+        self.full_sweep_interval = full_sweep_interval
+        self.recent = deque(maxlen=max(1, window))  # Cạnh khuôn mặt nhỏ nhất (pixel gốc) mỗi lần detect
+        self.calls = 0
+        self.usage = Counter()
+        self.lock = threading.Lock()
+
+    def select(self, frame_shape):
+        """Kích thước detection (w, h) cho frame có shape `frame_shape`"""
+        with self.lock:
+            self.calls += 1
+            size = self._select(frame_shape)
+            self.usage[size] += 1
+        return (size, size)
+
+    def _select(self, frame_shape):
+        if self.mode != 'auto':
+            return int(self.mode)
+        largest = self.choices[-1]
+        smallest_face = min((side for side in self.recent if side is not None), default=None)
+        if smallest_face is None or (self.full_sweep_interval and self.calls % self.full_sweep_interval == 0):
+            return largest
+        frame_side = max(frame_shape[:2])
+        for size in self.choices:
+            if smallest_face * size / frame_side >= self.min_face_pixels:
+                return size
+        return largest
+
+    def observe(self, faces):
+        """Ghi nhận kết quả detect (bbox ở tọa độ ảnh gốc) của một frame"""
+        sides = [min(face.bbox[2] - face.bbox[0], face.bbox[3] - face.bbox[1]) for face in faces or []]
+        with self.lock:
+            self.recent.append(float(min(sides)) if sides else None)
+
+    def summary(self):
+        """Số lần dùng mỗi kích thước detection"""
+        with self.lock:
+            return dict(sorted(self.usage.items()))
@@ -1,29 +1,276 @@
 import cv2
+import math
+import time
 import numpy as np
-from insightface.app import FaceAnalysis
-from config import MODEL_NAME, CTX_ID, DET_SIZE
+from insightface.app.common import Face
+from insightface.utils import face_align
+from config import (
+    MODEL_NAME, CTX_ID, DET_SIZE, DETECTION_MODULES, MODEL_COLOR_ORDER,
+    ROI_EXPAND, ROI_TILE_SIZE, ROI_MAX_COVERAGE, EMBEDDING_CACHE
+)
+from face_core.model_registry import get_face_analysis
+from face_core.embedding_cache import EmbeddingCache
 
 class FaceDetector:
     """Phát hiện và xử lý khuôn mặt"""
     
-    def __init__(self, model_name=MODEL_NAME, ctx_id=CTX_ID, det_size=DET_SIZE):
-        self.detector = FaceAnalysis(name=model_name)
-        self.detector.prepare(ctx_id=ctx_id, det_size=det_size)
+    def __init__(self, model_name=MODEL_NAME, ctx_id=CTX_ID, det_size=DET_SIZE, allowed_modules=DETECTION_MODULES,
+                 session_options=None):
+        # Giữ cấu hình để worker process có thể tạo detector giống hệt
+        self.config = {
+            'model_name': model_name, 'ctx_id': ctx_id, 'det_size': tuple(det_size),
+            'allowed_modules': allowed_modules, 'session_options': session_options,
+        }
+        # Model được cache trong process: tạo FaceDetector lần hai không load lại ONNX.
+        # session_options ghi đè cấu hình ORT_* (providers, threads, ...) trong config
+        self.detector = get_face_analysis(model_name, ctx_id, det_size, allowed_modules, session_options)
+        # Thời gian inference cộng dồn theo module: {module: [tổng ms, số lần chạy, số khuôn mặt]}
+        self.module_times = {}
+        # Cache theo nội dung ảnh cho detect_encoded / detect_file (mở khi dùng lần đầu)
+        self.use_cache = EMBEDDING_CACHE
+        self._cache = None
     
-    def detect_faces(self, image):
-        """Phát hiện khuôn mặt từ ảnh"""
+    @property
+    def cache_signature(self):
+        """Định danh cấu hình model: kết quả cache chỉ dùng lại khi trùng signature"""
+        modules = ','.join(sorted(self.config['allowed_modules'] or []))
+        det_w, det_h = self.config['det_size']
+        return f"{self.config['model_name']}|{det_w}x{det_h}|{modules}|{MODEL_COLOR_ORDER}"
+    
+    @property
+    def embedding_cache(self):
+        """EmbeddingCache dùng chung của detector, None nếu cache bị tắt"""
+        if self.use_cache and self._cache is None:
+            self._cache = EmbeddingCache(self.cache_signature)
+        return self._cache if self.use_cache else None
+    
+    def detect_encoded(self, data, decode=False):
+        """Detect + embed từ ảnh đã mã hóa (bytes jpg/png của file hoặc URL)
+
+        Kết quả được cache theo hash nội dung: cache hit không giải mã ảnh và
+        không chạy model (ảnh trả về là None, trừ khi decode=True). Embedding
+        của faces lấy từ cache đã được chuẩn hóa. Trả về (ảnh BGR, faces),
+        faces là None nếu không giải mã được ảnh.
+        """
+        cache = self.embedding_cache
+        key = EmbeddingCache.content_key(data) if cache is not None else None
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            bboxes, scores, kpss, embeddings = cached
+            faces = [Face(bbox=bboxes[i], kps=kpss[i] if kpss is not None else None, det_score=scores[i],
+                          embedding=embeddings[i]) for i in range(len(bboxes))]
+            return (self._decode(data) if decode else None), faces
+        
+        image = self._decode(data)
+        if image is None:
+            return None, None
+        _, faces = self.detect_faces(image)
+        if cache is not None and faces is not None:
+            kpss = np.stack([face.kps for face in faces]) if faces and faces[0].kps is not None else None
+            cache.put(key, [face.bbox for face in faces], [face.det_score for face in faces], kpss,
+                      self.get_face_embeddings(faces))
+        return image, faces
+    
+    def detect_file(self, path, decode=False):
+        """Như `detect_encoded` cho một file ảnh; (None, None) nếu không đọc được file"""
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None, None
+        return self.detect_encoded(data, decode)
+    
+    @staticmethod
+    def _decode(data):
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    
+    def detect_faces(self, image, embed=True, out=None, color_order='bgr', return_rgb=False, det_size=None,
+                     rois=None):
+        """Phát hiện khuôn mặt từ ảnh
+
+        `color_order` là thứ tự màu của `image` ('bgr' như cv2.imread / camera,
+        'rgb' như PIL). Ảnh chỉ được chuyển màu khi khác MODEL_COLOR_ORDER; khi
+        cần chuyển, `out` là buffer do caller giữ để tái sử dụng giữa các frame
+        (bỏ qua nếu khác shape).
+
+        Trả về (ảnh, faces): mặc định ảnh là ảnh đã đưa vào model (dùng tiếp cho
+        `embed_faces` / `align_face`); return_rgb=True trả về ảnh RGB để hiển thị.
+        embed=False chỉ chạy model detection. `det_size` (w, h) đổi kích thước
+        input của model detection cho lần gọi này (None = DET_SIZE); bbox và
+        keypoints luôn ở tọa độ ảnh gốc nên việc căn chỉnh vẫn dùng ảnh đầy đủ.
+        `rois` (các bbox của frame trước) chỉ detect quanh những vùng đó, xem
+        `_detect_rois`; None hoặc rỗng detect toàn ảnh. Khi các vùng phủ quá
+        ROI_MAX_COVERAGE, ảnh vẫn được detect toàn bộ với `det_size`.
+        """
         # Load ảnh nếu đường dẫn
         if isinstance(image, str):
             image = cv2.imread(image)
+            color_order = 'bgr'
         
         # Validate ảnh
         if not self._is_valid_image(image):
             return None, None
         
-        # Convert BGR to RGB
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        faces = self.detector.get(image_rgb)
-        return image_rgb, faces
+        model_image = self.to_model_order(image, color_order, out)
+        faces = self._run_models(model_image, embed, det_size, rois)
+        if return_rgb:
+            return self.to_rgb(model_image, MODEL_COLOR_ORDER), faces
+        return model_image, faces
+    
+    def to_model_order(self, image, color_order='bgr', out=None):
+        """Chuyển ảnh sang MODEL_COLOR_ORDER (không copy nếu đã đúng thứ tự)"""
+        if color_order == MODEL_COLOR_ORDER:
+            return image
+        # BGR->RGB và RGB->BGR cùng là phép đảo kênh
+        if out is not None and out.shape == image.shape and out.dtype == image.dtype:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=out)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    
+    def to_rgb(self, image, color_order='bgr'):
+        """Ảnh RGB để hiển thị (không copy nếu đã là RGB)"""
+        if color_order == 'rgb':
+            return image
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    
+    def embed_faces(self, model_image, faces):
+        """Chạy các module còn lại (recognition, ...) cho các khuôn mặt đã detect"""
+        if not faces:
+            return faces
+        for taskname, model in self.detector.models.items():
+            if taskname == 'detection':
+                continue
+            t0 = time.perf_counter()
+            for face in faces:
+                model.get(model_image, face)
+            self._record_time(taskname, t0, len(faces))
+        return faces
+    
+    def align_face(self, model_image, face):
+        """Cắt và căn chỉnh khuôn mặt theo keypoints về kích thước input của model recognition"""
+        rec_model = self.detector.models['recognition']
+        return face_align.norm_crop(model_image, landmark=face.kps, image_size=rec_model.input_size[0])
+    
+    def embed_crops(self, crops):
+        """Embedding đã chuẩn hóa (N, 512) cho nhiều ảnh đã căn chỉnh, chạy model theo batch"""
+        if not crops:
+            return np.empty((0, 512), dtype=np.float32)
+        rec_model = self.detector.models['recognition']
+        t0 = time.perf_counter()
+        if isinstance(rec_model.session.get_inputs()[0].shape[0], int):
+            # Model xuất với batch cố định -> chạy từng ảnh
+            embeddings = np.concatenate([rec_model.get_feat(crop) for crop in crops])
+        else:
+            embeddings = rec_model.get_feat(list(crops))
+        self._record_time('recognition', t0, len(crops))
+        embeddings = embeddings.astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings
+    
+    def _run_models(self, image, embed=True, det_size=None, rois=None):
+        """Tương đương FaceAnalysis.get nhưng đo thời gian từng module"""
+        t0 = time.perf_counter()
+        regions = self._roi_regions(rois, image.shape) if rois is not None and len(rois) else None
+        if regions:
+            bboxes, kpss = self._detect_rois(image, regions)
+            self._record_time('detection_roi', t0, len(bboxes))
+        else:
+            det_size = tuple(det_size) if det_size is not None else None
+            bboxes, kpss = self.detector.det_model.detect(image, input_size=det_size, max_num=0, metric='default')
+            self._record_time('detection', t0, len(bboxes))
+        
+        faces = []
+        for i in range(bboxes.shape[0]):
+            kps = kpss[i] if kpss is not None else None
+            faces.append(Face(bbox=bboxes[i, 0:4], kps=kps, det_score=bboxes[i, 4]))
+        if not embed:
+            return faces
+        return self.embed_faces(image, faces)
+    
+    def _roi_regions(self, rois, shape):
+        """Mở rộng các bbox thành vùng detect (x1, y1, x2, y2) nguyên, gộp các vùng chồng nhau
+
+        Trả về None nếu tổng diện tích vượt ROI_MAX_COVERAGE của frame (detect toàn frame rẻ hơn).
+        """
+        height, width = shape[:2]
+        boxes = np.asarray(rois, dtype=np.float32).reshape(-1, 4)
+        pad = np.maximum(boxes[:, 2:] - boxes[:, :2], 1.0) * ROI_EXPAND
+        boxes = np.concatenate([boxes[:, :2] - pad, boxes[:, 2:] + pad], axis=1)
+        regions = np.clip(np.round(boxes), 0, [width, height, width, height]).astype(int).tolist()
+
+        # Gộp vùng chồng nhau để một khuôn mặt không bị detect hai lần
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(regions)):
+                for j in range(i + 1, len(regions)):
+                    a, b = regions[i], regions[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                        del regions[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+
+        regions = [r for r in regions if r[2] > r[0] and r[3] > r[1]]
+        area = sum((r[2] - r[0]) * (r[3] - r[1]) for r in regions)
+        if not regions or area > ROI_MAX_COVERAGE * width * height:
+            return None
+        return regions
+
+    def _detect_rois(self, image, regions):
+        """Detect trên các vùng ROI bằng một lần chạy model.
+
+        Mỗi vùng được resize vào một ô ROI_TILE_SIZE của ảnh mosaic, mosaic được
+        detect ở đúng kích thước của nó, rồi bbox/keypoints được đổi về tọa độ
+        frame gốc theo ô chứa tâm bbox.
+        """
+        tile = ROI_TILE_SIZE
+        cols = math.ceil(math.sqrt(len(regions)))
+        rows = math.ceil(len(regions) / cols)
+        mosaic = np.zeros((rows * tile, cols * tile, 3), dtype=np.uint8)
+        placements = np.empty((len(regions), 5), dtype=np.float32)  # ox, oy, scale, x1, y1
+        for k, (x1, y1, x2, y2) in enumerate(regions):
+            scale = tile / max(x2 - x1, y2 - y1)
+            size = (max(1, min(tile, round((x2 - x1) * scale))), max(1, min(tile, round((y2 - y1) * scale))))
+            ox, oy = (k % cols) * tile, (k // cols) * tile
+            mosaic[oy:oy + size[1], ox:ox + size[0]] = cv2.resize(image[y1:y2, x1:x2], size)
+            placements[k] = (ox, oy, scale, x1, y1)
+
+        bboxes, kpss = self.detector.det_model.detect(mosaic, input_size=(cols * tile, rows * tile),
+                                                      max_num=0, metric='default')
+        if len(bboxes) == 0:
+            return bboxes, kpss
+        centers = (bboxes[:, 0:2] + bboxes[:, 2:4]) / 2
+        cells = (np.clip(centers[:, 1] // tile, 0, rows - 1) * cols
+                 + np.clip(centers[:, 0] // tile, 0, cols - 1)).astype(int)
+        keep = cells < len(regions)
+        bboxes, cells = bboxes[keep].copy(), cells[keep]
+        ox, oy, scale, x1, y1 = placements[cells].T
+        bboxes[:, [0, 2]] = (bboxes[:, [0, 2]] - ox[:, None]) / scale[:, None] + x1[:, None]
+        bboxes[:, [1, 3]] = (bboxes[:, [1, 3]] - oy[:, None]) / scale[:, None] + y1[:, None]
+        if kpss is not None:
+            kpss = kpss[keep].copy()
+            kpss[..., 0] = (kpss[..., 0] - ox[:, None]) / scale[:, None] + x1[:, None]
+            kpss[..., 1] = (kpss[..., 1] - oy[:, None]) / scale[:, None] + y1[:, None]
+        return bboxes, kpss
+
+    def _record_time(self, module, t0, face_count):
+        stats = self.module_times.setdefault(module, [0.0, 0, 0])
+        stats[0] += (time.perf_counter() - t0) * 1000.0
+        stats[1] += 1
+        stats[2] += face_count
+    
+    def module_timing_summary(self):
+        """Thời gian trung bình theo module: {module: {'calls', 'avg_ms', 'ms_per_face'}}"""
+        summary = {}
+        for module, (total_ms, calls, faces) in self.module_times.items():
+            summary[module] = {
+                'calls': calls,
+                'avg_ms': total_ms / calls if calls else 0.0,
+                'ms_per_face': total_ms / faces if faces else 0.0,
+            }
+        return summary
     
     def _is_valid_image(self, image):
         """Kiểm tra ảnh hợp lệ"""
@@ -32,15 +279,33 @@ class FaceDetector:
                 len(image.shape) == 3 and 
                 image.shape[2] == 3)
     
-    def get_face_embedding(self, image, face=None):
-        """Trích xuất embedding từ khuôn mặt"""
+    def get_face_embedding(self, image, face=None, out=None, color_order='bgr'):
+        """Trích xuất embedding từ khuôn mặt (ghi vào `out` (512,) nếu có)"""
         if face is None:
-            _, faces = self.detect_faces(image)
+            _, faces = self.detect_faces(image, color_order=color_order)
             if not faces or len(faces) == 0:
                 return None
             face = max(faces, key=lambda x: x.det_score)
         
         embedding = face.embedding
         # Chuẩn hóa embedding
+        if out is not None:
+            return np.divide(embedding, np.linalg.norm(embedding), out=out)
         embedding = embedding / np.linalg.norm(embedding)
-        return embedding
\ No newline at end of file
+        return embedding
+    
+    def get_face_embeddings(self, faces, out=None):
+        """Ghép embedding đã chuẩn hóa của nhiều khuôn mặt thành ma trận (N, 512)
+
+        Nếu có `out` (M, 512) float32 với M >= N, kết quả được ghi vào `out[:N]`.
+        """
+        if not faces:
+            return np.empty((0, 512), dtype=np.float32)
+        if out is not None and len(out) >= len(faces):
+            embeddings = out[:len(faces)]
+            for row, face in zip(embeddings, faces):
+                row[:] = face.embedding
+        else:
+            embeddings = np.stack([face.embedding for face in faces]).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings
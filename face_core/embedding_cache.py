@@ -0,0 +1,118 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+
+EMBEDDING_DIM = 512
+
+
+class EmbeddingCache:
+    """Cache bền vững (SQLite) kết quả detect + embed theo nội dung ảnh.
+
+    Khóa là SHA-256 của bytes ảnh đã mã hóa cùng `signature` của model
+    (tên model, det_size, module, thứ tự màu), giá trị là bbox, det_score,
+    keypoints và embedding đã chuẩn hóa của mọi khuôn mặt trong ảnh. Khi mở,
+    mọi entry của signature khác bị xóa (đổi model => cache cũ vô hiệu).
+    Số entry bị giới hạn bởi `max_entries`, entry lâu không dùng nhất bị xóa
+    trước (LRU).
+    """
+
+    def __init__(self, signature, path=EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.signature = signature
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS faces ("
+                " key TEXT NOT NULL, signature TEXT NOT NULL, count INTEGER NOT NULL,"
+                " bboxes BLOB, scores BLOB, kps BLOB, embeddings BLOB, last_used INTEGER NOT NULL,"
+                " PRIMARY KEY (key, signature))")
+            self._db.execute("CREATE INDEX IF NOT EXISTS faces_lru ON faces(last_used)")
+            self.invalidated = self._db.execute("DELETE FROM faces WHERE signature != ?", (signature,)).rowcount
+        self._entries = self._db.execute("SELECT COUNT(*) FROM faces").fetchone()[0]
+        self._clock = self._db.execute("SELECT COALESCE(MAX(last_used), 0) FROM faces").fetchone()[0]
+
+    @staticmethod
+    def content_key(data):
+        """Khóa nội dung của ảnh đã mã hóa (bytes)"""
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, key):
+        """(bboxes (K, 4), scores (K,), kps (K, 5, 2) hoặc None, embeddings (K, 512)) hoặc None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT count, bboxes, scores, kps, embeddings FROM faces WHERE key = ? AND signature = ?",
+                (key, self.signature)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._clock += 1
+            with self._db:
+                self._db.execute("UPDATE faces SET last_used = ? WHERE key = ? AND signature = ?",
+                                 (self._clock, key, self.signature))
+        count, bboxes, scores, kps, embeddings = row
+        return (
+            np.frombuffer(bboxes, dtype=np.float32).reshape(count, 4),
+            np.frombuffer(scores, dtype=np.float32),
+            np.frombuffer(kps, dtype=np.float32).reshape(count, 5, 2) if kps is not None else None,
+            np.frombuffer(embeddings, dtype=np.float32).reshape(count, EMBEDDING_DIM),
+        )
+
+    def put(self, key, bboxes, scores, kps, embeddings):
+        """Lưu kết quả của một ảnh (K có thể bằng 0: ảnh không có khuôn mặt)"""
+        bboxes = np.ascontiguousarray(bboxes, dtype=np.float32).reshape(-1, 4)
+        scores = np.ascontiguousarray(scores, dtype=np.float32).reshape(-1)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        kps = np.ascontiguousarray(kps, dtype=np.float32).tobytes() if kps is not None else None
+        with self._lock:
+            self._clock += 1
+            with self._db:
+                replaced = self._db.execute("SELECT 1 FROM faces WHERE key = ? AND signature = ?",
+                                             (key, self.signature)).fetchone() is not None
+                self._db.execute(
+                    "INSERT OR REPLACE INTO faces VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, self.signature, len(bboxes), bboxes.tobytes(), scores.tobytes(), kps,
+                     embeddings.tobytes(), self._clock))
+                self.stores += 1
+                if not replaced:
+                    self._entries += 1
+                if self._entries > self.max_entries:
+                    excess = self._entries - self.max_entries
+                    self._db.execute(
+                        "DELETE FROM faces WHERE rowid IN (SELECT rowid FROM faces ORDER BY last_used LIMIT ?)",
+                        (excess,))
+                    self._entries -= excess
+                    self.evictions += excess
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM faces")
+            self._entries = 0
+
+    def summary(self):
+        """Thống kê cache: {'entries', 'hits', 'misses', 'hit_rate', 'stores', 'evictions', 'invalidated'}"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': self._entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'invalidated': self.invalidated,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,143 @@
+import os
+import time
+import cv2
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    SUPPORTED_IMAGE_EXT, ENROLL_WORKERS, ENROLL_BATCH_SIZE, SIMILARITY_THRESHOLD,
+    WORKER_PROCESSES, WORKER_INTRA_OP_THREADS
+)
+from face_core.workers import ProcessEmbedder
+
+IMAGE_EXTENSIONS = {ext.lstrip('*').lower() for ext in SUPPORTED_IMAGE_EXT.split()}
+
+
+def scan_enroll_folder(root):
+    """Danh sách (person, path) từ cây thư mục <root>/<person>/<ảnh>"""
+    items = []
+    for person in sorted(os.listdir(root)):
+        person_dir = os.path.join(root, person)
+        if not os.path.isdir(person_dir):
+            continue
+        for filename in sorted(os.listdir(person_dir)):
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                items.append((person, os.path.join(person_dir, filename)))
+    return items
+
+
+def _decode(path):
+    return cv2.imread(path)
+
+
+class BulkEnroller:
+    """Enroll hàng loạt một thư mục ảnh vào gallery.
+
+    Ảnh được giải mã song song bằng thread pool (giới hạn số ảnh đọc trước để
+    không giữ cả thư mục trong RAM), detection chạy từng ảnh, khuôn mặt đã căn
+    chỉnh được gom thành batch cho model recognition, và gallery chỉ được ghi
+    một lần ở cuối. Với `processes` > 0, đọc ảnh và inference chạy trong pool
+    process (ProcessEmbedder) thay cho detector của process chính.
+    """
+
+    def __init__(self, detector, gallery_manager, workers=ENROLL_WORKERS,
+                 batch_size=ENROLL_BATCH_SIZE, similarity_threshold=SIMILARITY_THRESHOLD,
+                 processes=WORKER_PROCESSES, intra_op_threads=WORKER_INTRA_OP_THREADS):
+        self.detector = detector
+        self.gallery_manager = gallery_manager
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.similarity_threshold = similarity_threshold
+        self.processes = processes
+        self.intra_op_threads = intra_op_threads
+
+    def enroll_folder(self, root, progress=None):
+        """Enroll toàn bộ <root>/<person>/*.jpg, trả về dict báo cáo
+
+        `progress(done, total)` (nếu có) được gọi sau mỗi ảnh.
+        """
+        start = time.perf_counter()
+        items = scan_enroll_folder(root)
+        skipped = []  # (path, lý do)
+        groups = {}
+        if self.processes > 0:
+            self._embed_with_processes(items, groups, skipped, progress)
+        else:
+            self._embed_in_process(items, groups, skipped, progress)
+
+        added = self.gallery_manager.add_embeddings_many(groups, self.similarity_threshold)
+        duplicates = sum(dup for _, dup in added.values())
+        elapsed = time.perf_counter() - start
+
+        reasons = Counter(reason for _, reason in skipped)
+        if duplicates:
+            reasons['duplicate'] = duplicates
+        return {
+            'images': len(items),
+            'people': len([name for name, (count, _) in added.items() if count]),
+            'enrolled': sum(count for count, _ in added.values()),
+            'skipped': dict(reasons),
+            'skipped_files': skipped,
+            'seconds': elapsed,
+            'images_per_s': len(items) / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def _embed_with_processes(self, items, groups, skipped, progress):
+        """Detect/embed trong pool process, gom embedding theo người vào `groups`"""
+        people = {path: person for person, path in items}
+        with ProcessEmbedder(self.detector.config, self.processes, self.intra_op_threads,
+                             chunk_size=self.batch_size) as embedder:
+            results = embedder.embed_paths([path for _, path in items], best_only=True)
+            for done, (path, _, embeddings, reason) in enumerate(results, 1):
+                if progress is not None:
+                    progress(done, len(items))
+                if reason is not None:
+                    skipped.append((path, reason))
+                    continue
+                groups.setdefault(people[path], []).extend(embeddings)
+
+    def _embed_in_process(self, items, groups, skipped, progress):
+        """Đọc ảnh bằng thread pool, detect/embed bằng detector của process chính"""
+        pending_people, pending_crops = [], []
+
+        def flush():
+            embeddings = self.detector.embed_crops(pending_crops)
+            for person, embedding in zip(pending_people, embeddings):
+                groups.setdefault(person, []).append(embedding)
+            pending_people.clear()
+            pending_crops.clear()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = deque()
+            queue = iter(items)
+            prefetch = self.workers * 4
+            for person, path in queue:
+                futures.append((person, path, executor.submit(_decode, path)))
+                if len(futures) >= prefetch:
+                    break
+
+            done = 0
+            while futures:
+                person, path, future = futures.popleft()
+                next_item = next(queue, None)
+                if next_item is not None:
+                    futures.append((*next_item, executor.submit(_decode, next_item[1])))
+
+                image = future.result()
+                done += 1
+                if progress is not None:
+                    progress(done, len(items))
+                if image is None:
+                    skipped.append((path, 'decode_failed'))
+                    continue
+
+                model_image, faces = self.detector.detect_faces(image, embed=False)
+                if not faces:
+                    skipped.append((path, 'no_face'))
+                    continue
+                # Giống add_person: lấy khuôn mặt có det_score cao nhất
+                face = max(faces, key=lambda x: x.det_score)
+                pending_people.append(person)
+                pending_crops.append(self.detector.align_face(model_image, face))
+                if len(pending_crops) >= self.batch_size:
+                    flush()
+        flush()
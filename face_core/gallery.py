@@ -1,88 +1,310 @@
 import os
+import atexit
 import pickle
+import weakref
+import threading
+import contextlib
 import numpy as np
 from datetime import datetime
-from config import GALLERY_PATH, SIMILARITY_THRESHOLD
+from config import (
+    GALLERY_PATH, SIMILARITY_THRESHOLD, DUPLICATE_CHUNK_SIZE,
+    GALLERY_JOURNAL, GALLERY_COMPACT_INTERVAL
+)
+from face_core.index import GalleryIndex, similar_pairs
+from face_core.gallery_store import GalleryStore
+from face_core.gallery_journal import GalleryJournal, apply_records
 
 class FaceGalleryManager:
     """Quản lý thư viện khuôn mặt"""
     
-    def __init__(self, detector, gallery_path=None):
+    def __init__(self, detector, gallery_path=None, journal=GALLERY_JOURNAL):
         self.detector = detector
-        self.gallery_path = gallery_path or GALLERY_PATH
-        self.gallery = self._load_gallery() if os.path.exists(self.gallery_path) else {}
+        gallery_path = gallery_path or GALLERY_PATH
+        # Chấp nhận đường dẫn file pickle cũ: store nằm ở thư mục cùng tên
+        root, ext = os.path.splitext(gallery_path)
+        if ext == '.pkl':
+            self.legacy_path, self.gallery_path = gallery_path, root
+        else:
+            self.legacy_path, self.gallery_path = gallery_path + '.pkl', gallery_path
+        self.store = GalleryStore(self.gallery_path)
+        # Chế độ journal: thay đổi được ghi vào WAL, snapshot được gộp định kỳ ở nền
+        self.journal = GalleryJournal(self.gallery_path) if journal else None
+        self._dirty = False
+        self._compactor = None
+        self.index = GalleryIndex()
+        self.gallery = {}
+        self.reload_gallery()
         
         if not self.gallery:
             print("Cảnh báo: Gallery trống. Sử dụng phương thức add_person để thêm người.")
         
+    def _compaction_lock(self):
+        return self.journal.compaction_lock if self.journal else contextlib.nullcontext()
+    
     def _load_gallery(self):
-        """Tải gallery từ file"""
-        with open(self.gallery_path, 'rb') as f:
-            return pickle.load(f)
+        """Tải snapshot vào index và replay journal (nếu có) lên trên"""
+        with self._compaction_lock():
+            if not self.store.exists() and os.path.exists(self.legacy_path):
+                self._migrate_pickle()
+            self._read_snapshot(self.index)
+            if self.journal:
+                records = self.journal.records(self.store.journal_generation())
+                self._replay(self.index, records)
+    
+    def _read_snapshot(self, index):
+        """Nạp snapshot trên đĩa vào index (embedding được mmap, không copy nếu đã gom theo người)"""
+        if not self.store.exists():
+            index.rebuild({})
+            return
+        
+        names, embeddings, labels = self.store.load()
+        counts = np.bincount(labels, minlength=len(names))
+        if np.all(labels[1:] >= labels[:-1]):
+            matrix = embeddings
+        else:
+            # Có embedding được append cho người cũ -> gom lại theo người (copy vào RAM)
+            matrix = embeddings[np.argsort(labels, kind='stable')]
+        index.set_arrays(names, matrix, counts)
+    
+    def _replay(self, index, records):
+        """Áp dụng các record journal lên index"""
+        gallery = index.as_dict()
+        if apply_records(gallery, records):
+            index.rebuild(gallery)
+    
+    def _migrate_pickle(self):
+        """Chuyển một lần gallery pickle cũ sang store dạng cột"""
+        with open(self.legacy_path, 'rb') as f:
+            legacy_gallery = pickle.load(f)
+        index = GalleryIndex()
+        index.rebuild(legacy_gallery)
+        self.store.write(index.names, index.matrix, index.row_labels())
+        print(f"🔄 Đã chuyển gallery từ {self.legacy_path} sang {self.gallery_path}")
+    
+    def _sync_gallery(self):
+        """Cập nhật dict gallery (view theo người vào ma trận của index)"""
+        self.gallery = self.index.as_dict()
+    
+    def _persist(self, op, name, embeddings=None, index=None):
+        """Ghi một thay đổi xuống đĩa: vào journal (O(thay đổi)) hoặc trực tiếp store"""
+        if self.journal is None:
+            if op == 'add':
+                self.store.append(name, embeddings)
+            else:
+                self.save_gallery()
+            return
+        
+        self.journal.append(op, name, embeddings=embeddings, index=index)
+        self._dirty = True
+        self._start_compactor()
+    
+    def _start_compactor(self):
+        """Khởi động thread compact nền (chỉ khi instance có thay đổi)"""
+        if self._compactor is not None:
+            return
+        stop_event = threading.Event()
+        manager_ref = weakref.ref(self)
+        thread = threading.Thread(target=_compaction_loop, args=(manager_ref, stop_event), daemon=True)
+        self._compactor = (thread, stop_event)
+        thread.start()
+        atexit.register(_close_manager, manager_ref)
+    
+    def compact(self):
+        """Gộp journal vào snapshot mới; an toàn nếu bị gián đoạn giữa chừng"""
+        if self.journal is None:
+            return
+        with self.journal.compaction_lock:
+            # Xóa cờ trước khi rotate: append chen vào giữa lúc compact sẽ bật lại
+            self._dirty = False
+            try:
+                # Append sau thời điểm này đi vào thế hệ journal mới
+                generation = self.journal.rotate()
+                # Dựng trạng thái từ đĩa để gộp cả thay đổi của instance khác
+                index = GalleryIndex(self.index.dim)
+                self._read_snapshot(index)
+                records = self.journal.records(self.store.journal_generation(), stop_generation=generation)
+                self._replay(index, records)
+                self.store.write(index.names, index.matrix, index.row_labels(), journal_generation=generation)
+                self.journal.remove_before(generation)
+            except BaseException:
+                # Compact dở dang: journal vẫn còn thay đổi chưa gộp, lần sau phải thử lại
+                self._dirty = True
+                raise
+    
+    def close(self):
+        """Dừng thread compact và gộp các thay đổi còn lại"""
+        if self._compactor is not None:
+            self._compactor[1].set()
+            self._compactor = None
+        if self._dirty:
+            self.compact()
+    
+    def reload_gallery(self):
+        """Tải lại gallery từ đĩa và xây lại index"""
+        self._load_gallery()
+        self._sync_gallery()
     
     def save_gallery(self):
-        """Lưu gallery hiện tại"""
-        with open(self.gallery_path, 'wb') as f:
-            pickle.dump(self.gallery, f)
+        """Ghi lại toàn bộ gallery hiện tại xuống store"""
+        if self.journal is not None:
+            self.compact()
+            return
+        index = self.index.snapshot()
+        self.store.write(index.names, index.matrix, index.row_labels())
     
-    def add_person(self, name, image_path=None, image=None, similarity_threshold=SIMILARITY_THRESHOLD):
-        """Thêm người vào gallery"""
+    def add_person(self, name, image_path=None, image=None, similarity_threshold=SIMILARITY_THRESHOLD,
+                   color_order='bgr', image_data=None):
+        """Thêm người vào gallery (`color_order` là thứ tự màu của `image`)
+
+        `image_path` và `image_data` (bytes ảnh đã mã hóa, vd tải từ URL) đi qua
+        cache embedding theo nội dung: thêm lại cùng một ảnh không chạy lại model.
+        """
         # Trích xuất embedding
-        embedding = self.detector.get_face_embedding(image_path if image is None else image)
+        if image is None:
+            if image_data is not None:
+                _, faces = self.detector.detect_encoded(image_data)
+            else:
+                _, faces = self.detector.detect_file(image_path)
+            if faces is None:
+                return False, "Không thể đọc ảnh"
+            face = max(faces, key=lambda x: x.det_score) if faces else None
+            embedding = self.detector.get_face_embedding(None, face=face) if face is not None else None
+        else:
+            embedding = self.detector.get_face_embedding(image, color_order=color_order)
         if embedding is None:
             return False, "Không tìm thấy khuôn mặt"
         
         # Kiểm tra người đã tồn tại
         is_new_person = name not in self.gallery
-        if is_new_person:
-            self.gallery[name] = []
         
-        # Kiểm tra duplicate (chỉ với người đã có)
-        if not is_new_person:
-            for existing_embedding in self.gallery[name]:
-                similarity = np.dot(embedding, existing_embedding)
-                if similarity >= similarity_threshold:
-                    return False, f"Ảnh tương tự đã tồn tại cho {name} (similarity: {similarity:.3f})"
+        # Kiểm tra duplicate (chỉ với người đã có): so với cả block của người đó một lần
+        if not is_new_person and len(self.gallery[name]):
+            similarity = float(np.max(self.gallery[name] @ embedding))
+            if similarity >= similarity_threshold:
+                return False, f"Ảnh tương tự đã tồn tại cho {name} (similarity: {similarity:.3f})"
         
         # Thêm embedding
-        self.gallery[name].append(embedding)
-        self.save_gallery()
+        self.index.add(name, embedding)
+        self._persist('add', name, embeddings=embedding)
+        self._sync_gallery()
         
         # Thông báo phù hợp
         action = "Đã tạo mới" if is_new_person else "Đã thêm ảnh cho"
         total_count = len(self.gallery[name])
         return True, f"{action} {name} (tổng: {total_count} ảnh)"
     
+    def add_embeddings(self, name, embeddings, similarity_threshold=SIMILARITY_THRESHOLD):
+        """Thêm nhiều embedding (N, 512) đã chuẩn hóa cho một người trong một lần ghi
+
+        Embedding trùng với ảnh đã lưu hoặc với ảnh đứng trước trong cùng batch
+        (similarity >= threshold) bị bỏ qua.
+        """
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if len(embeddings) == 0:
+            return False, "Không có embedding nào"
+        
+        is_new_person = name not in self.gallery
+        keep = self._dedup_mask(name, embeddings, similarity_threshold)
+        added = embeddings[keep]
+        skipped = len(embeddings) - len(added)
+        if len(added) == 0:
+            return False, f"Tất cả {skipped} ảnh đã tồn tại cho {name}"
+        
+        self.index.add(name, added)
+        self._persist('add', name, embeddings=added)
+        self._sync_gallery()
+        
+        action = "Đã tạo mới" if is_new_person else "Đã thêm ảnh cho"
+        total_count = len(self.gallery[name])
+        return True, f"{action} {name}: +{len(added)} ảnh, bỏ qua {skipped} ảnh trùng (tổng: {total_count} ảnh)"
+    
+    def add_embeddings_many(self, groups, similarity_threshold=SIMILARITY_THRESHOLD):
+        """Thêm embedding cho nhiều người {name: (N, 512)} với một lần dựng index và một lần ghi đĩa
+
+        Trả về {name: (số ảnh đã thêm, số ảnh trùng bị bỏ qua)}.
+        """
+        gallery = self.index.as_dict()
+        changes = []
+        report = {}
+        for name, embeddings in groups.items():
+            embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+            keep = self._dedup_mask(name, embeddings, similarity_threshold)
+            added = embeddings[keep]
+            report[name] = (len(added), len(embeddings) - len(added))
+            if len(added):
+                stored = gallery.get(name)
+                gallery[name] = added if stored is None else np.concatenate([stored, added])
+                changes.append(('add', name, added, None))
+        
+        if changes:
+            self.index.rebuild(gallery)
+            if self.journal is None:
+                self.save_gallery()
+            else:
+                self.journal.append_many(changes)
+                self._dirty = True
+                self._start_compactor()
+            self._sync_gallery()
+        return report
+    
+    def _dedup_mask(self, name, embeddings, similarity_threshold):
+        """Mask các embedding không trùng với gallery của người đó và với nhau"""
+        keep = np.ones(len(embeddings), dtype=bool)
+        stored = self.gallery.get(name)
+        if stored is not None and len(stored):
+            keep &= np.max(embeddings @ stored.T, axis=1) < similarity_threshold
+        
+        # Trong batch: giữ ảnh đầu tiên của mỗi nhóm trùng (giống thêm lần lượt từng ảnh)
+        duplicate = np.triu(embeddings @ embeddings.T >= similarity_threshold, k=1)
+        for i in np.nonzero(duplicate.any(axis=1))[0]:
+            if keep[i]:
+                keep &= ~duplicate[i]
+        return keep
+    
     def remove_person(self, name):
         """Xóa người khỏi gallery"""
         if name in self.gallery:
-            del self.gallery[name]
-            self.save_gallery()
+            self.index.remove_person(name)
+            self._persist('remove_person', name)
+            self._sync_gallery()
             return True, f"Đã xóa {name} khỏi gallery"
         return False, f"Không tìm thấy {name} trong gallery"
     
-    def find_duplicates(self, threshold=0.95):
-        """Tìm các embedding trùng lặp"""
+    def find_duplicates(self, threshold=0.95, chunk_size=DUPLICATE_CHUNK_SIZE):
+        """Tìm các embedding trùng lặp trong từng người: {name: [(i, j, similarity)]}
+
+        Mỗi người được so bằng ma trận Gram theo khối `chunk_size` dòng
+        (None = cả block một lần).
+        """
         results = {}
         
         for name, embeddings in self.gallery.items():
-            duplicates = []
-            for i in range(len(embeddings)):
-                for j in range(i+1, len(embeddings)):
-                    similarity = np.dot(embeddings[i], embeddings[j])
-                    if similarity >= threshold:
-                        duplicates.append((i, j, similarity))
-            
-            if duplicates:
-                results[name] = duplicates
+            rows_i, rows_j, sims = similar_pairs(embeddings, threshold, chunk_size)
+            if len(sims):
+                results[name] = list(zip(rows_i.tolist(), rows_j.tolist(), sims.tolist()))
         
         return results
     
+    def find_cross_duplicates(self, threshold=0.95, chunk_size=DUPLICATE_CHUNK_SIZE):
+        """Tìm embedding gần trùng nhau nhưng thuộc hai người khác nhau (nghi nhầm nhãn)
+
+        Trả về list (name_a, index_a, name_b, index_b, similarity).
+        """
+        index = self.index.snapshot()
+        labels = index.row_labels()
+        rows_i, rows_j, sims = similar_pairs(index.matrix, threshold, chunk_size, labels=labels)
+        label_i, label_j = labels[rows_i], labels[rows_j]
+        local_i = rows_i - index.offsets[label_i]
+        local_j = rows_j - index.offsets[label_j]
+        return [(index.names[a], int(i), index.names[b], int(j), float(s))
+                for a, i, b, j, s in zip(label_i, local_i, label_j, local_j, sims)]
+    
     def remove_duplicate(self, name, index):
         """Xóa một embedding trùng lặp"""
         if name in self.gallery and 0 <= index < len(self.gallery[name]):
-            self.gallery[name].pop(index)
-            self.save_gallery()
+            self.index.remove_embedding(name, index)
+            self._persist('remove_embedding', name, index=index)
+            self._sync_gallery()
             return True, f"Đã xóa embedding thứ {index} của {name}"
         return False, "Không thể xóa embedding"
     
@@ -94,4 +316,23 @@ class FaceGalleryManager:
         """Đếm số người và số embeddings"""
         counts = {name: len(embs) for name, embs in self.gallery.items()}
         return counts
-    
+
+
+def _compaction_loop(manager_ref, stop_event):
+    """Compact định kỳ; chỉ giữ weakref để manager vẫn được giải phóng"""
+    while not stop_event.wait(GALLERY_COMPACT_INTERVAL):
+        manager = manager_ref()
+        if manager is None:
+            return
+        try:
+            if manager._dirty:
+                manager.compact()
+        except Exception as e:
+            print(f"⚠️  [GALLERY] Lỗi khi compact journal: {e}")
+        del manager
+
+
+def _close_manager(manager_ref):
+    manager = manager_ref()
+    if manager is not None:
+        manager.close()
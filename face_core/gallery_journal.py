@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import zlib
+import struct
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: chỉ khóa giữa các thread trong process
+    fcntl = None
+
+JOURNAL_PATTERN = re.compile(r'^journal\.(\d+)\.wal$')
+_RECORD_HEADER = struct.Struct('<II')  # độ dài body, crc32 của body
+WRITE_LOCK_FILE = 'journal.lock'
+COMPACTION_LOCK_FILE = 'compaction.lock'
+
+# Lock dùng chung cho mọi instance cùng thư mục store trong một process
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def _shared_locks(path):
+    with _LOCKS_GUARD:
+        key = os.path.abspath(path)
+        if key not in _LOCKS:
+            _LOCKS[key] = (_ProcessLock(os.path.join(key, WRITE_LOCK_FILE)),
+                           _ProcessLock(os.path.join(key, COMPACTION_LOCK_FILE)))
+        return _LOCKS[key]
+
+
+class _ProcessLock:
+    """Lock reentrant giữa các thread, kèm advisory lock (fcntl.flock) trên
+    `lock_path` giữa các process dùng chung thư mục store.
+
+    flock chỉ được lấy ở lần acquire ngoài cùng của thread đang giữ lock.
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+                self._file = open(self.lock_path, 'a+b')
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._lock.release()
+
+
+class GalleryJournal:
+    """Write-ahead log cho các thay đổi gallery.
+
+    Mỗi thay đổi (add / remove_person / remove_embedding) là một record nhỏ được
+    append và fsync vào `journal.<gen>.wal`. Khi compact, journal được xoay sang
+    thế hệ mới trước, nên snapshot chỉ cần ghi nhớ thế hệ journal đầu tiên chưa
+    được gộp; lúc load, mọi thế hệ từ đó trở đi được replay lên snapshot.
+    Các lock cũng khóa giữa các process (file `journal.lock` / `compaction.lock`
+    trong thư mục store), nên GUI và CLI có thể mở cùng một gallery.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # write_lock: append/xoay/cắt journal; compaction_lock: load/compact snapshot
+        self.write_lock, self.compaction_lock = _shared_locks(path)
+
+    def generations(self):
+        """Các thế hệ journal đang có trên đĩa (tăng dần)"""
+        if not os.path.isdir(self.path):
+            return []
+        gens = []
+        for filename in os.listdir(self.path):
+            match = JOURNAL_PATTERN.match(filename)
+            if match:
+                gens.append(int(match.group(1)))
+        return sorted(gens)
+
+    def _file(self, generation):
+        return os.path.join(self.path, f"journal.{generation}.wal")
+
+    def append(self, op, name, embeddings=None, index=None):
+        """Ghi một record và fsync trước khi trả về"""
+        self.append_many([(op, name, embeddings, index)])
+    
+    def append_many(self, entries):
+        """Ghi nhiều record (op, name, embeddings, index) với một lần fsync"""
+        record = b''.join(_encode_record(*entry) for entry in entries)
+        with self.write_lock:
+            os.makedirs(self.path, exist_ok=True)
+            gens = self.generations()
+            with open(self._file(gens[-1] if gens else 0), 'ab') as f:
+                f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def rotate(self):
+        """Chuyển các lần append sau sang thế hệ journal mới, trả về số thế hệ đó"""
+        with self.write_lock:
+            os.makedirs(self.path, exist_ok=True)
+            gens = self.generations()
+            generation = gens[-1] + 1 if gens else 1
+            open(self._file(generation), 'ab').close()
+            return generation
+
+    def records(self, first_generation=0, stop_generation=None):
+        """Đọc các record từ thế hệ `first_generation` (tới trước `stop_generation`)"""
+        gens = [g for g in self.generations()
+                if g >= first_generation and (stop_generation is None or g < stop_generation)]
+        for generation in gens:
+            with open(self._file(generation), 'rb') as f:
+                data = f.read()
+            records, valid_size = _decode_records(data)
+            if valid_size < len(data) and generation == self.generations()[-1]:
+                with self.write_lock:
+                    # Đọc lại khi giữ lock: phần dở có thể là record process khác đang ghi
+                    with open(self._file(generation), 'r+b') as f:
+                        data = f.read()
+                        records, valid_size = _decode_records(data)
+                        if valid_size < len(data):
+                            # Record cuối bị ghi dở (crash) -> cắt bỏ để các lần append sau đọc được
+                            f.truncate(valid_size)
+            yield from records
+
+    def remove_before(self, generation):
+        """Xóa các thế hệ journal đã được gộp vào snapshot"""
+        with self.compaction_lock:
+            for gen in self.generations():
+                if gen < generation:
+                    try:
+                        os.remove(self._file(gen))
+                    except OSError:
+                        pass
+
+
+def apply_records(gallery, records):
+    """Replay các record lên dict {name: embeddings}, trả về số record đã áp dụng"""
+    applied = 0
+    for record in records:
+        op, name = record['op'], record['name']
+        if op == 'add':
+            rows = gallery.setdefault(name, [])
+            if not isinstance(rows, list):
+                rows = gallery[name] = list(rows)
+            rows.extend(record['embeddings'])
+        elif op == 'remove_person':
+            gallery.pop(name, None)
+        elif op == 'remove_embedding':
+            rows = gallery.get(name)
+            if rows is not None and 0 <= record['index'] < len(rows):
+                rows = gallery[name] = list(rows)
+                rows.pop(record['index'])
+        applied += 1
+    return applied
+
+
+def _encode_record(op, name, embeddings, index):
+    header = {'op': op, 'name': name}
+    data = b''
+    if index is not None:
+        header['index'] = int(index)
+    if embeddings is not None:
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        header['shape'] = list(embeddings.shape)
+        data = embeddings.tobytes()
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    body = struct.pack('<I', len(header_bytes)) + header_bytes + data
+    return _RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def _decode_records(data):
+    """Giải mã các record hợp lệ liên tiếp, trả về (records, số byte hợp lệ)"""
+    records = []
+    pos = 0
+    while pos + _RECORD_HEADER.size <= len(data):
+        length, crc = _RECORD_HEADER.unpack_from(data, pos)
+        body = data[pos + _RECORD_HEADER.size:pos + _RECORD_HEADER.size + length]
+        if len(body) < length or zlib.crc32(body) != crc:
+            break
+        header_len = struct.unpack_from('<I', body)[0]
+        record = json.loads(body[4:4 + header_len].decode('utf-8'))
+        if 'shape' in record:
+            record['embeddings'] = np.frombuffer(body[4 + header_len:], dtype=np.float32).reshape(record['shape'])
+        records.append(record)
+        pos += _RECORD_HEADER.size + length
+    return records, pos
@@ -0,0 +1,145 @@
+import os
+import json
+import struct
+import numpy as np
+
+META_FILE = 'gallery.json'
+NPY_HEADER_SIZE = 128  # Header .npy cố định để có thể ghi lại shape tại chỗ khi append
+
+
+class GalleryStore:
+    """Lưu gallery dạng cột trên đĩa.
+
+    - `embeddings.<gen>.npy`: ma trận float32 (N, D), đọc bằng mmap
+    - `labels.<gen>.npy`: chỉ số người (int32) của từng dòng
+    - `gallery.json`: bảng tên, số dòng đã commit, thế hệ file hiện tại và
+      thế hệ journal đầu tiên chưa được gộp (xem GalleryJournal)
+
+    Append chỉ ghi thêm vào cuối file rồi cập nhật `rows` trong meta, nên dữ liệu
+    cũ không bị ghi lại; phần ghi dở (crash trước khi cập nhật meta) bị bỏ qua.
+    Ghi lại toàn bộ (khi xóa) tạo thế hệ file mới rồi mới chuyển meta sang.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.meta_path = os.path.join(path, META_FILE)
+
+    def exists(self):
+        """Store đã được tạo trên đĩa chưa"""
+        return os.path.exists(self.meta_path)
+
+    def load(self):
+        """Trả về (names, embeddings, labels); embeddings là memmap chỉ đọc"""
+        meta = self._read_meta()
+        rows, dim = meta['rows'], meta['dim']
+        if rows == 0:
+            return meta['names'], np.empty((0, dim), dtype=np.float32), np.empty(0, dtype=np.int32)
+
+        embeddings = np.load(self._file(meta, 'embeddings'), mmap_mode='r')[:rows]
+        labels = np.array(np.load(self._file(meta, 'labels'), mmap_mode='r')[:rows])
+        return meta['names'], embeddings, labels
+
+    def append(self, name, embeddings):
+        """Ghi thêm embedding của một người vào cuối store"""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        if not self.exists():
+            labels = np.zeros(len(embeddings), dtype=np.int32)
+            self.write([name], embeddings, labels)
+            return
+
+        # Đọc lại meta từ đĩa để không ghi đè dữ liệu do instance khác append
+        meta = self._read_meta()
+        names = meta['names']
+        if name not in names:
+            names.append(name)
+        labels = np.full(len(embeddings), names.index(name), dtype=np.int32)
+
+        rows = meta['rows']
+        self._append_rows(self._file(meta, 'embeddings'), rows, embeddings)
+        self._append_rows(self._file(meta, 'labels'), rows, labels)
+        meta['rows'] = rows + len(embeddings)
+        self._write_meta(meta)
+
+    def journal_generation(self):
+        """Thế hệ journal đầu tiên chưa được gộp vào snapshot này"""
+        return self._read_meta().get('journal_generation', 0) if self.exists() else 0
+
+    def write(self, names, embeddings, labels, journal_generation=None):
+        """Ghi lại toàn bộ gallery sang thế hệ file mới"""
+        os.makedirs(self.path, exist_ok=True)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        old_meta = self._read_meta() if self.exists() else None
+        meta = {
+            'version': 1,
+            'generation': old_meta['generation'] + 1 if old_meta else 0,
+            'dim': int(embeddings.shape[1]),
+            'rows': int(len(embeddings)),
+            'names': list(names),
+            'journal_generation': journal_generation if journal_generation is not None
+                                  else (old_meta or {}).get('journal_generation', 0),
+        }
+        self._write_array(self._file(meta, 'embeddings'), embeddings)
+        self._write_array(self._file(meta, 'labels'), np.asarray(labels, dtype=np.int32))
+        self._write_meta(meta)
+        self._remove_stale_files(meta)
+
+    def _file(self, meta, kind):
+        return os.path.join(self.path, f"{kind}.{meta['generation']}.npy")
+
+    def _read_meta(self):
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self, meta):
+        """Ghi meta nguyên tử (file tạm + os.replace)"""
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path)
+
+    def _write_array(self, path, array):
+        with open(path, 'wb') as f:
+            _write_npy_header(f, array.shape, array.dtype)
+            f.write(np.ascontiguousarray(array).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _append_rows(self, path, rows, data):
+        row_bytes = data.dtype.itemsize * int(np.prod(data.shape[1:], dtype=np.int64))
+        committed = NPY_HEADER_SIZE + rows * row_bytes
+        with open(path, 'r+b') as f:
+            # Bỏ phần ghi dở của lần append bị gián đoạn trước đó
+            if os.fstat(f.fileno()).st_size > committed:
+                f.truncate(committed)
+            f.seek(committed)
+            f.write(np.ascontiguousarray(data).tobytes())
+            _write_npy_header(f, (rows + len(data),) + data.shape[1:], data.dtype)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _remove_stale_files(self, meta):
+        """Xóa file của các thế hệ cũ (bỏ qua nếu file còn đang được mmap)"""
+        current = {os.path.basename(self._file(meta, kind)) for kind in ('embeddings', 'labels')}
+        for filename in os.listdir(self.path):
+            if filename.endswith('.npy') and filename not in current:
+                try:
+                    os.remove(os.path.join(self.path, filename))
+                except OSError:
+                    pass
+
+
+def _write_npy_header(f, shape, dtype):
+    """Ghi header .npy v1.0 với kích thước cố định NPY_HEADER_SIZE byte"""
+    header = {
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        'fortran_order': False,
+        'shape': tuple(int(n) for n in shape),
+    }
+    text = repr(header).encode('latin1')
+    text = text.ljust(NPY_HEADER_SIZE - 10 - 1) + b'\n'
+    f.seek(0)
+    f.write(np.lib.format.magic(1, 0))
+    f.write(struct.pack('<H', len(text)))
+    f.write(text)
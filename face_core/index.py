@@ -0,0 +1,173 @@
+import copy
+import itertools
+import threading
+import numpy as np
+
+# Bộ đếm version dùng chung mọi index: version đủ để nhận ra một trạng thái, kể cả giữa các instance
+_VERSIONS = itertools.count(1)
+
+
+class GalleryIndex:
+    """Ma trận embedding liên tục của gallery để so khớp vector hóa.
+
+    Các embedding của cùng một người nằm liền nhau trong `matrix`;
+    `offsets[i]` là vị trí dòng đầu tiên của người `names[i]` và
+    `counts[i]` là số embedding của người đó.
+
+    Các thay đổi không sửa mảng tại chỗ mà tạo mảng mới rồi gán dưới `_lock`,
+    nên thread đọc (nhận diện) dùng `snapshot()` để có names / matrix / counts
+    nhất quán trong khi thread khác thêm hoặc xóa embedding.
+    """
+
+    def __init__(self, dim=512):
+        self.dim = dim
+        self.names = []
+        self.matrix = np.empty((0, dim), dtype=np.float32)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.offsets = np.empty(0, dtype=np.int64)
+        self._positions = {}
+        self._lock = threading.RLock()
+        # Đổi mỗi khi index thay đổi để các search backend biết cần dựng lại
+        self.version = next(_VERSIONS)
+
+    def snapshot(self):
+        """Bản sao nông, chỉ đọc của trạng thái hiện tại (không copy mảng)"""
+        with self._lock:
+            return copy.copy(self)
+
+    def rebuild(self, gallery):
+        """Xây lại toàn bộ index từ dict gallery {name: [embeddings]}"""
+        names = list(gallery.keys())
+        blocks = []
+        for name in names:
+            block = np.asarray(gallery[name], dtype=np.float32)
+            if block.size:
+                self.dim = block.shape[-1]
+            blocks.append(block)
+        blocks = [b.reshape(-1, self.dim) for b in blocks]
+
+        counts = [len(b) for b in blocks]
+        if blocks:
+            matrix = np.concatenate(blocks)
+        else:
+            matrix = np.empty((0, self.dim), dtype=np.float32)
+        self.set_arrays(names, matrix, counts)
+
+    def set_arrays(self, names, matrix, counts):
+        """Gán trực tiếp ma trận đã gom theo người (dùng cho dữ liệu lớn)"""
+        names = list(names)
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        counts = np.array(counts, dtype=np.int64)
+        with self._lock:
+            if len(matrix):
+                self.dim = matrix.shape[1]
+            self._commit(names, matrix, counts)
+
+    def _commit(self, names, matrix, counts, positions=None):
+        """Gán trạng thái mới (mảng mới, không sửa mảng cũ mà snapshot có thể đang đọc)"""
+        self.names = names
+        self._positions = positions if positions is not None else {name: i for i, name in enumerate(names)}
+        self.matrix = matrix
+        self.counts = counts
+        self.offsets = np.cumsum(counts) - counts
+        self.version = next(_VERSIONS)
+
+    def as_dict(self):
+        """Dict {name: block embedding (N_i, D)}, mỗi block là view vào `matrix`"""
+        return {name: self.matrix[start:start + count]
+                for name, start, count in zip(self.names, self.offsets, self.counts)}
+
+    def row_labels(self):
+        """Chỉ số người (theo `names`) của từng dòng trong `matrix`"""
+        return np.repeat(np.arange(len(self.names)), self.counts)
+
+    def add(self, name, embedding):
+        """Thêm một hoặc nhiều embedding (D,) / (K, D) vào cuối block của người tương ứng"""
+        rows = np.asarray(embedding, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            if name not in self._positions:
+                positions = {**self._positions, name: len(self.names)}
+                self._commit(self.names + [name], np.concatenate([self.matrix, rows]),
+                             np.append(self.counts, len(rows)), positions)
+            else:
+                pos = self._positions[name]
+                end = self.offsets[pos] + self.counts[pos]
+                counts = self.counts.copy()
+                counts[pos] += len(rows)
+                self._commit(self.names, np.insert(self.matrix, end, rows, axis=0), counts, self._positions)
+
+    def remove_person(self, name):
+        """Xóa toàn bộ block của một người"""
+        with self._lock:
+            pos = self._positions.get(name)
+            if pos is None:
+                return
+            start = self.offsets[pos]
+            self._commit(self.names[:pos] + self.names[pos + 1:],
+                         np.delete(self.matrix, slice(start, start + self.counts[pos]), axis=0),
+                         np.delete(self.counts, pos))
+
+    def remove_embedding(self, name, index):
+        """Xóa embedding thứ `index` của một người"""
+        with self._lock:
+            pos = self._positions.get(name)
+            if pos is None or not 0 <= index < self.counts[pos]:
+                return
+            counts = self.counts.copy()
+            counts[pos] -= 1
+            self._commit(self.names, np.delete(self.matrix, self.offsets[pos] + index, axis=0), counts,
+                         self._positions)
+
+    def best_scores(self, embeddings):
+        """Cosine similarity cao nhất với từng người (theo thứ tự `names`).
+
+        `embeddings` có thể là một vector (D,) hoặc ma trận (N, D); kết quả
+        tương ứng có shape (P,) hoặc (N, P).
+        """
+        queries = np.asarray(embeddings, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries)
+
+        scores = np.zeros((len(queries), len(self.names)), dtype=np.float32)
+        if len(self.matrix) and len(queries):
+            sims = queries @ self.matrix.T
+            # Người không còn embedding nào giữ score 0 như trước
+            nonempty = self.counts > 0
+            scores[:, nonempty] = np.maximum.reduceat(sims, self.offsets[nonempty], axis=1)
+        return scores[0] if single else scores
+
+
+def similar_pairs(matrix, threshold, chunk_size=None, labels=None):
+    """Các cặp dòng (i, j), i < j, có cosine similarity >= threshold.
+
+    Tính theo từng khối `chunk_size` dòng để giới hạn bộ nhớ của ma trận Gram
+    (None = một khối duy nhất). Nếu có `labels`, chỉ giữ cặp khác nhãn.
+    Trả về (rows_i, rows_j, similarities) đã sắp xếp theo (i, j).
+    """
+    n = len(matrix)
+    chunk_size = chunk_size or max(n, 1)
+    found_i, found_j, found_s = [], [], []
+    for a0 in range(0, n, chunk_size):
+        block_a = matrix[a0:a0 + chunk_size]
+        for b0 in range(a0, n, chunk_size):
+            gram = block_a @ matrix[b0:b0 + chunk_size].T
+            if b0 == a0:
+                # Khối trên đường chéo: chỉ lấy nửa trên (bỏ cặp trùng và chính nó)
+                rows, cols = np.triu_indices(len(block_a), k=1)
+                keep = gram[rows, cols] >= threshold
+                rows, cols = rows[keep], cols[keep]
+            else:
+                rows, cols = np.nonzero(gram >= threshold)
+            rows, cols = rows + a0, cols + b0
+            if labels is not None:
+                differ = labels[rows] != labels[cols]
+                rows, cols = rows[differ], cols[differ]
+            found_i.append(rows)
+            found_j.append(cols)
+            found_s.append(gram[rows - a0, cols - b0])
+
+    if not found_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    rows, cols, sims = np.concatenate(found_i), np.concatenate(found_j), np.concatenate(found_s)
+    order = np.lexsort((cols, rows))
+    return rows[order], cols[order], sims[order]
@@ -0,0 +1,134 @@
+import threading
+from insightface.app import FaceAnalysis
+from config import (
+    MODEL_NAME, CTX_ID, DET_SIZE,
+    ORT_PROVIDERS, ORT_INTRA_OP_THREADS, ORT_INTER_OP_THREADS, ORT_GRAPH_OPTIMIZATION,
+    ORT_EXECUTION_MODE, ORT_ENABLE_CPU_MEM_ARENA, ORT_ENABLE_MEM_PATTERN
+)
+
+# Cache FaceAnalysis dùng chung trong process, khóa theo cấu hình model
+_MODELS = {}
+_LOCK = threading.Lock()
+
+# Giá trị mặc định của ONNX Runtime: cấu hình trùng với các giá trị này thì
+# không cần tạo lại session
+_ORT_DEFAULTS = {
+    'intra_op_threads': 0,
+    'inter_op_threads': 0,
+    'graph_optimization': 'all',
+    'execution_mode': 'sequential',
+    'cpu_mem_arena': True,
+    'mem_pattern': True,
+}
+
+
+def session_settings(overrides=None):
+    """Cấu hình session ONNX Runtime từ config, ghi đè bởi `overrides` (dict)"""
+    settings = {
+        'providers': ORT_PROVIDERS,
+        'intra_op_threads': ORT_INTRA_OP_THREADS,
+        'inter_op_threads': ORT_INTER_OP_THREADS,
+        'graph_optimization': ORT_GRAPH_OPTIMIZATION,
+        'execution_mode': ORT_EXECUTION_MODE,
+        'cpu_mem_arena': ORT_ENABLE_CPU_MEM_ARENA,
+        'mem_pattern': ORT_ENABLE_MEM_PATTERN,
+    }
+    settings.update(overrides or {})
+    return settings
+
+
+def _model_key(model_name, ctx_id, det_size, allowed_modules, settings):
+    modules = tuple(sorted(allowed_modules)) if allowed_modules else None
+    options = tuple(sorted((k, tuple(v) if isinstance(v, list) else v) for k, v in settings.items()))
+    return model_name, ctx_id, tuple(det_size), modules, options
+
+
+def get_face_analysis(model_name=MODEL_NAME, ctx_id=CTX_ID, det_size=DET_SIZE, allowed_modules=None,
+                      session_options=None):
+    """Lấy FaceAnalysis đã prepare; chỉ load model ONNX ở lần gọi đầu tiên với cấu hình đó
+
+    `session_options` (dict) ghi đè cấu hình ORT_* trong config cho instance này,
+    ví dụ {'intra_op_threads': 4} khi nhiều process dùng chung một máy.
+    """
+    settings = session_settings(session_options)
+    key = _model_key(model_name, ctx_id, det_size, allowed_modules, settings)
+    with _LOCK:
+        app = _MODELS.get(key)
+        if app is None:
+            providers = _resolve_providers(settings['providers'], ctx_id)
+            app = FaceAnalysis(name=model_name, allowed_modules=allowed_modules, providers=providers)
+            # ctx_id < 0 để insightface không chuyển lại sang GPU khi chỉ có CPU
+            app.prepare(ctx_id=ctx_id if providers[0] != 'CPUExecutionProvider' else -1, det_size=det_size)
+            if any(settings[name] != value for name, value in _ORT_DEFAULTS.items()):
+                _recreate_sessions(app, settings, providers)
+            _log_providers(app, settings, providers)
+            _MODELS[key] = app
+        return app
+
+
+def _resolve_providers(providers, ctx_id):
+    """Danh sách provider thực sự có trên máy (None = tự chọn theo ctx_id)"""
+    import onnxruntime
+    available = onnxruntime.get_available_providers()
+    if providers:
+        missing = [p for p in providers if p not in available]
+        if missing:
+            print(f"⚠️  [ORT] Provider không khả dụng, bỏ qua: {', '.join(missing)}")
+        resolved = [p for p in providers if p in available]
+    elif ctx_id >= 0 and 'CUDAExecutionProvider' in available:
+        resolved = ['CUDAExecutionProvider']
+    else:
+        resolved = []
+    if 'CPUExecutionProvider' not in resolved:
+        resolved.append('CPUExecutionProvider')
+    return resolved
+
+
+def _build_session_options(settings):
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = settings['intra_op_threads']
+    options.inter_op_num_threads = settings['inter_op_threads']
+    options.graph_optimization_level = {
+        'disable': onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        'basic': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        'extended': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        'all': onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }[settings['graph_optimization']]
+    options.execution_mode = {
+        'sequential': onnxruntime.ExecutionMode.ORT_SEQUENTIAL,
+        'parallel': onnxruntime.ExecutionMode.ORT_PARALLEL,
+    }[settings['execution_mode']]
+    options.enable_cpu_mem_arena = settings['cpu_mem_arena']
+    options.enable_mem_pattern = settings['mem_pattern']
+    return options
+
+
+def _recreate_sessions(app, settings, providers):
+    """Tạo lại session của từng model với SessionOptions đã cấu hình
+
+    FaceAnalysis (insightface 0.7) không chuyển SessionOptions xuống model_zoo,
+    nên session được tạo lại từ cùng file ONNX.
+    """
+    import onnxruntime
+    options = _build_session_options(settings)
+    for model in app.models.values():
+        model.session = onnxruntime.InferenceSession(model.model_file, options, providers=providers)
+
+
+def _log_providers(app, settings, providers):
+    """Self-check lúc khởi động: provider nào thực sự được load cho từng model"""
+    print(f"🧠 [ORT] threads intra={settings['intra_op_threads'] or 'auto'}, "
+          f"inter={settings['inter_op_threads'] or 'auto'}, opt={settings['graph_optimization']}, "
+          f"mode={settings['execution_mode']}, arena={settings['cpu_mem_arena']}")
+    for taskname, model in app.models.items():
+        active = model.session.get_providers()
+        print(f"🧠 [ORT] {taskname}: {active[0]}")
+        if active[0] != providers[0]:
+            print(f"⚠️  [ORT] {taskname}: yêu cầu {providers[0]} nhưng đang chạy {active[0]}")
+
+
+def clear_models():
+    """Giải phóng toàn bộ model đã cache (lần gọi sau sẽ load lại)"""
+    with _LOCK:
+        _MODELS.clear()
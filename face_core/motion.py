@@ -0,0 +1,84 @@
+import cv2
+import threading
+import numpy as np
+from config import (
+    MOTION_METHOD, MOTION_DOWNSCALE_WIDTH, MOTION_PIXEL_THRESHOLD,
+    MOTION_MIN_AREA, MOTION_MAX_SKIP
+)
+
+
+class MotionGate:
+    """Bỏ qua detection khi khung cảnh đứng yên.
+
+    Frame được thu nhỏ về `downscale_width` và chuyển xám; "diff" so sánh với
+    frame của lần detect gần nhất (bắt được cả chuyển động chậm), "mog2" dùng
+    background subtractor MOG2 của OpenCV. Có chuyển động khi tỉ lệ pixel thay
+    đổi >= `min_area`. Detection vẫn chạy khi còn track đang sống (người đứng
+    yên trước camera) và ít nhất mỗi `max_skip` giây.
+    """
+
+    def __init__(self, method=MOTION_METHOD, downscale_width=MOTION_DOWNSCALE_WIDTH,
+                 pixel_threshold=MOTION_PIXEL_THRESHOLD, min_area=MOTION_MIN_AREA, max_skip=MOTION_MAX_SKIP):
+        if method not in ('diff', 'mog2'):
+            raise ValueError(f"MOTION_METHOD không hợp lệ: {method}")
+        self.method = method
+        self.downscale_width = downscale_width
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.max_skip = max_skip
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if method == 'mog2' else None
+        self.small = None      # Buffer frame thu nhỏ
+        self.gray = None       # Buffer ảnh xám của frame hiện tại
+        self.reference = None  # Ảnh xám của lần detect gần nhất (method "diff")
+        self.last_run = None
+        self.motion = 0   # Số frame chạy detection vì có chuyển động
+        self.forced = 0   # Số frame chạy detection vì còn track hoặc quá max_skip
+        self.skipped = 0  # Số frame bỏ qua detection
+        self.lock = threading.Lock()
+
+    def check(self, frame, timestamp, active=False):
+        """True nếu nên chạy detection cho `frame`; `active` = đang có khuôn mặt được track"""
+        with self.lock:
+            moved = self._measure(frame)
+            if moved:
+                self.motion += 1
+            elif active or self.last_run is None or timestamp - self.last_run >= self.max_skip:
+                self.forced += 1
+            else:
+                self.skipped += 1
+                return False
+            self.last_run = timestamp
+            if self.reference is None:
+                self.reference = self.gray.copy()
+            else:
+                np.copyto(self.reference, self.gray)
+            return True
+
+    def _measure(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.downscale_width, max(1, round(height * self.downscale_width / width)))
+        if self.small is None or self.small.shape[:2] != size[::-1]:
+            self.small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+            self.gray = np.empty(size[::-1], dtype=np.uint8)
+            self.reference = None
+        cv2.resize(frame, size, dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+
+        if self.subtractor is not None:
+            changed = np.count_nonzero(self.subtractor.apply(self.gray))
+        elif self.reference is None:
+            return True
+        else:
+            changed = np.count_nonzero(cv2.absdiff(self.gray, self.reference) > self.pixel_threshold)
+        return changed >= self.min_area * self.gray.size
+
+    def summary(self):
+        """Bộ đếm của gate: {'motion', 'forced', 'skipped', 'skip_ratio'}"""
+        with self.lock:
+            total = self.motion + self.forced + self.skipped
+            return {
+                'motion': self.motion,
+                'forced': self.forced,
+                'skipped': self.skipped,
+                'skip_ratio': self.skipped / total if total else 0.0,
+            }
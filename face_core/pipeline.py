@@ -0,0 +1,512 @@
+import time
+import threading
+import statistics
+import numpy as np
+from collections import deque
+
+
+class FramePool:
+    """Pool buffer frame tái sử dụng có đếm tham chiếu.
+
+    Buffer quay về pool khi tham chiếu cuối cùng được `release`, nên ở trạng
+    thái ổn định capture không cấp phát frame mới.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._free = []
+        self._refs = {}
+        self.allocated = 0  # Số buffer đã cấp phát
+
+    def acquire(self, shape, dtype):
+        """Lấy một buffer (shape, dtype) với 1 tham chiếu"""
+        with self._lock:
+            for i, buf in enumerate(self._free):
+                if buf.shape == shape and buf.dtype == dtype:
+                    del self._free[i]
+                    break
+            else:
+                buf = np.empty(shape, dtype=dtype)
+                self.allocated += 1
+            self._refs[id(buf)] = 1
+            return buf
+
+    def adopt(self, buf):
+        """Đưa một buffer cấp phát bên ngoài (vd cap.read đổi kích thước) vào pool"""
+        with self._lock:
+            self._refs[id(buf)] = 1
+            self.allocated += 1
+            return buf
+
+    def retain(self, buf):
+        with self._lock:
+            self._refs[id(buf)] += 1
+
+    def release(self, buf):
+        with self._lock:
+            key = id(buf)
+            self._refs[key] -= 1
+            if self._refs[key] == 0:
+                del self._refs[key]
+                self._free.append(buf)
+
+
+class LatestFrameQueue:
+    """Hàng đợi độ sâu 1: item mới thay thế item cũ chưa được lấy (drop-oldest)
+
+    `on_drop(item)` (nếu có) được gọi cho item bị thay thế.
+    """
+
+    def __init__(self, on_drop=None):
+        self._cond = threading.Condition()
+        self._item = None
+        self._closed = False
+        self.on_drop = on_drop
+        self.put_count = 0
+        self.drop_count = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._item is not None:
+                self.drop_count += 1
+                if self.on_drop is not None:
+                    self.on_drop(self._item)
+            self._item = item
+            self.put_count += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Lấy item mới nhất, trả về None nếu hết timeout hoặc queue đã đóng"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._item is not None or self._closed, timeout)
+            item, self._item = self._item, None
+            return item
+
+    def depth(self):
+        return 0 if self._item is None else 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """Bộ đếm và độ trễ (ms) của một stage, giữ cửa sổ mẫu gần nhất"""
+
+    def __init__(self, window=1000):
+        self.count = 0
+        self.samples = deque(maxlen=window)
+
+    def add(self, ms):
+        self.count += 1
+        self.samples.append(ms)
+
+    def summary(self):
+        samples = list(self.samples)
+        if not samples:
+            return {'count': self.count, 'avg_ms': 0.0, 'p50_ms': 0.0, 'max_ms': 0.0}
+        return {
+            'count': self.count,
+            'avg_ms': sum(samples) / len(samples),
+            'p50_ms': statistics.median(samples),
+            'max_ms': max(samples),
+        }
+
+
+class RealtimePipeline:
+    """Pipeline realtime nhiều luồng: capture -> inference -> render.
+
+    - Thread capture đọc camera liên tục và luôn giữ frame mới nhất cho render.
+    - Frame được đẩy vào LatestFrameQueue độ sâu 1 cho inference: worker bận thì
+      frame cũ bị bỏ (backpressure), nên kết quả luôn ứng với frame mới nhất có thể.
+    - Render (thread gọi `next_frame`, thường là main thread vì cv2.imshow) lấy
+      frame mới nhất cùng kết quả inference gần nhất để vẽ.
+
+    Frame được đọc vào buffer của FramePool (`cap.read(image=buf)`), nên ở trạng
+    thái ổn định pipeline không cấp phát frame mới. Vì buffer được tái sử dụng,
+    `process_fn` không được giữ tham chiếu tới frame sau khi trả về, và render
+    nên truyền `out=` cho `next_frame` để nhận bản copy vào buffer của mình.
+
+    `process_fn(frame)` chạy trong worker và trả về kết quả tùy ý;
+    `on_results(results, latency_ms)` (nếu có) được gọi sau mỗi lần inference.
+    """
+
+    def __init__(self, capture, process_fn, workers=1, on_results=None):
+        self.capture = capture
+        self.process_fn = process_fn
+        self.workers = max(1, workers)
+        self.on_results = on_results
+        self.frame_pool = FramePool()
+        self.inference_queue = LatestFrameQueue(on_drop=lambda item: self.frame_pool.release(item[2]))
+        self.running = False
+        self.error = None
+
+        self._frame_cond = threading.Condition()
+        self._frame = None  # (frame_id, t_capture, frame)
+        self._results_lock = threading.Lock()
+        self._results = None
+        self._results_frame_id = -1
+        self._threads = []
+
+        self.stats = {
+            'capture': StageStats(),      # Thời gian đọc một frame từ camera
+            'queue_wait': StageStats(),   # Từ lúc capture tới lúc worker nhận frame
+            'inference': StageStats(),    # Thời gian chạy process_fn
+            'end_to_end': StageStats(),   # Từ lúc capture tới lúc có kết quả
+        }
+
+    def start(self):
+        self.running = True
+        self._threads = [threading.Thread(target=self._capture_loop, daemon=True)]
+        for _ in range(self.workers):
+            self._threads.append(threading.Thread(target=self._inference_loop, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        self.inference_queue.close()
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
+
+    def next_frame(self, last_frame_id=-1, timeout=1.0, out=None):
+        """Chờ frame mới hơn `last_frame_id`, trả về (frame_id, frame, results) hoặc None
+
+        Nếu `out` có cùng shape, frame được copy vào `out` (không cấp phát) và
+        `out` được trả về; nếu không, trả về một bản copy mới của frame.
+        """
+        with self._frame_cond:
+            self._frame_cond.wait_for(
+                lambda: not self.running or (self._frame is not None and self._frame[0] > last_frame_id),
+                timeout)
+            if self._frame is None or self._frame[0] <= last_frame_id:
+                return None
+            frame_id, _, frame = self._frame
+            # Copy khi còn giữ lock: capture có thể trả buffer về pool ngay sau đó
+            if out is not None and out.shape == frame.shape and out.dtype == frame.dtype:
+                np.copyto(out, frame)
+                frame = out
+            else:
+                frame = frame.copy()
+        with self._results_lock:
+            results = self._results
+        return frame_id, frame, results
+
+    def _capture_loop(self):
+        frame_id = 0
+        frame_shape = None
+        while self.running:
+            t0 = time.perf_counter()
+            buf = self.frame_pool.acquire(*frame_shape) if frame_shape else None
+            ret, frame = self.capture.read(buf) if buf is not None else self.capture.read()
+            if not ret:
+                if buf is not None:
+                    self.frame_pool.release(buf)
+                self.error = "Không thể đọc frame từ camera"
+                self.running = False
+                break
+            if frame is not buf:
+                # Frame đầu tiên hoặc camera đổi kích thước: dùng buffer mới từ cap.read
+                if buf is not None:
+                    self.frame_pool.release(buf)
+                frame = self.frame_pool.adopt(frame)
+                frame_shape = (frame.shape, frame.dtype)
+            t_capture = time.perf_counter()
+            self.stats['capture'].add((t_capture - t0) * 1000.0)
+
+            frame_id += 1
+            # Một tham chiếu cho slot frame mới nhất (render), một cho hàng đợi inference
+            self.frame_pool.retain(frame)
+            with self._frame_cond:
+                previous = self._frame
+                self._frame = (frame_id, t_capture, frame)
+                if previous is not None:
+                    self.frame_pool.release(previous[2])
+                self._frame_cond.notify_all()
+            self.inference_queue.put((frame_id, t_capture, frame))
+
+        with self._frame_cond:
+            self._frame_cond.notify_all()
+
+    def _inference_loop(self):
+        while self.running:
+            item = self.inference_queue.get(timeout=0.1)
+            if item is None:
+                continue
+            frame_id, t_capture, frame = item
+            t0 = time.perf_counter()
+            try:
+                results = self.process_fn(frame)
+            except Exception as e:
+                self.error = str(e)
+                self.running = False
+                break
+            finally:
+                self.frame_pool.release(frame)
+            t1 = time.perf_counter()
+
+            self.stats['queue_wait'].add((t0 - t_capture) * 1000.0)
+            self.stats['inference'].add((t1 - t0) * 1000.0)
+            self.stats['end_to_end'].add((t1 - t_capture) * 1000.0)
+
+            # Nhiều worker có thể trả kết quả không theo thứ tự: chỉ giữ kết quả mới hơn
+            with self._results_lock:
+                if frame_id > self._results_frame_id:
+                    self._results = results
+                    self._results_frame_id = frame_id
+            if self.on_results is not None:
+                self.on_results(results, (t1 - t0) * 1000.0)
+
+    def stats_summary(self):
+        """Bộ đếm theo stage cùng độ sâu và số frame bị bỏ của hàng đợi inference"""
+        summary = {name: stats.summary() for name, stats in self.stats.items()}
+        summary['inference_queue'] = {
+            'depth': self.inference_queue.depth(),
+            'put': self.inference_queue.put_count,
+            'dropped': self.inference_queue.drop_count,
+            'frame_buffers': self.frame_pool.allocated,
+        }
+        return summary
+
+
+class RoundRobinQueue:
+    """Hàng đợi độ sâu 1 cho mỗi nguồn, lấy ra xoay vòng giữa các nguồn
+
+    Frame mới của một nguồn thay thế frame chưa xử lý của chính nguồn đó
+    (drop-oldest theo từng nguồn), nên một camera nhanh không chiếm chỗ của
+    camera khác. `on_drop(item)` được gọi cho item bị thay thế.
+    """
+
+    def __init__(self, sources, on_drop=None):
+        self._cond = threading.Condition()
+        self._items = [None] * sources
+        self._next = 0
+        self._closed = False
+        self.on_drop = on_drop
+        self.put_counts = [0] * sources
+        self.drop_counts = [0] * sources
+
+    def put(self, source, item):
+        with self._cond:
+            if self._items[source] is not None:
+                self.drop_counts[source] += 1
+                if self.on_drop is not None:
+                    self.on_drop(self._items[source])
+            self._items[source] = item
+            self.put_counts[source] += 1
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Lấy (source, item) của nguồn kế tiếp có frame, None nếu hết timeout hoặc đã đóng"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or any(item is not None for item in self._items), timeout)
+            count = len(self._items)
+            for offset in range(count):
+                source = (self._next + offset) % count
+                item = self._items[source]
+                if item is not None:
+                    self._items[source] = None
+                    self._next = (source + 1) % count
+                    return source, item
+            return None
+
+    def depth(self):
+        return sum(item is not None for item in self._items)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class _Source:
+    """Trạng thái của một nguồn video trong MultiSourcePipeline"""
+
+    def __init__(self, name, capture):
+        self.name = name
+        self.capture = capture
+        self.running = False
+        self.error = None
+        self.frame_cond = threading.Condition()
+        self.frame = None  # (frame_id, t_capture, frame)
+        self.results_lock = threading.Lock()
+        self.results = None
+        self.results_frame_id = -1
+        self.processed = 0
+        self.started_at = None
+        self.stopped_at = None
+        self.stats = {
+            'capture': StageStats(),
+            'queue_wait': StageStats(),
+            'inference': StageStats(),
+            'end_to_end': StageStats(),
+        }
+
+
+class MultiSourcePipeline:
+    """Pipeline realtime cho nhiều camera dùng chung inference worker.
+
+    Mỗi nguồn (camera index, URL, file) có thread capture riêng và slot frame
+    mới nhất cho render; các worker inference dùng chung (một bản model) lấy
+    frame từ RoundRobinQueue nên mỗi nguồn được phục vụ lần lượt. CPU/bộ nhớ
+    inference tăng theo tổng tải xử lý chứ không theo số camera: nguồn nào
+    sinh frame nhanh hơn khả năng xử lý thì frame cũ của nguồn đó bị bỏ.
+
+    `process_fn(source, frame)` và `on_results(source, results, latency_ms)`
+    nhận chỉ số nguồn; cùng quy tắc buffer với RealtimePipeline (không giữ
+    tham chiếu frame sau khi trả về, render truyền `out=` cho `next_frame`).
+    Exception của `process_fn` chỉ dừng nguồn gây lỗi (ghi vào `error` của
+    nguồn), các nguồn khác vẫn chạy.
+    """
+
+    def __init__(self, captures, process_fn, workers=1, on_results=None, names=None):
+        names = names or [str(i) for i in range(len(captures))]
+        self.sources = [_Source(name, capture) for name, capture in zip(names, captures)]
+        self.process_fn = process_fn
+        self.workers = max(1, workers)
+        self.on_results = on_results
+        self.frame_pool = FramePool()
+        self.inference_queue = RoundRobinQueue(len(self.sources),
+                                               on_drop=lambda item: self.frame_pool.release(item[2]))
+        self.running = False
+        self._threads = []
+
+    def start(self):
+        self.running = True
+        self._threads = []
+        for index, source in enumerate(self.sources):
+            source.running = True
+            source.started_at = time.perf_counter()
+            self._threads.append(threading.Thread(target=self._capture_loop, args=(index,), daemon=True))
+        for _ in range(self.workers):
+            self._threads.append(threading.Thread(target=self._inference_loop, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        self.inference_queue.close()
+        for source in self.sources:
+            source.running = False
+            with source.frame_cond:
+                source.frame_cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
+
+    @property
+    def active(self):
+        """Còn ít nhất một nguồn đang đọc frame"""
+        return self.running and any(source.running for source in self.sources)
+
+    def next_frame(self, source_index, last_frame_id=-1, timeout=1.0, out=None):
+        """Như RealtimePipeline.next_frame cho nguồn `source_index`"""
+        source = self.sources[source_index]
+        with source.frame_cond:
+            source.frame_cond.wait_for(
+                lambda: not source.running or (source.frame is not None and source.frame[0] > last_frame_id),
+                timeout)
+            if source.frame is None or source.frame[0] <= last_frame_id:
+                return None
+            frame_id, _, frame = source.frame
+            if out is not None and out.shape == frame.shape and out.dtype == frame.dtype:
+                np.copyto(out, frame)
+                frame = out
+            else:
+                frame = frame.copy()
+        with source.results_lock:
+            results = source.results
+        return frame_id, frame, results
+
+    def _capture_loop(self, index):
+        source = self.sources[index]
+        frame_id = 0
+        frame_shape = None
+        while self.running and source.running:
+            t0 = time.perf_counter()
+            buf = self.frame_pool.acquire(*frame_shape) if frame_shape else None
+            ret, frame = source.capture.read(buf) if buf is not None else source.capture.read()
+            if not ret:
+                if buf is not None:
+                    self.frame_pool.release(buf)
+                source.error = "Không thể đọc frame từ nguồn"
+                break
+            if frame is not buf:
+                if buf is not None:
+                    self.frame_pool.release(buf)
+                frame = self.frame_pool.adopt(frame)
+                frame_shape = (frame.shape, frame.dtype)
+            t_capture = time.perf_counter()
+            source.stats['capture'].add((t_capture - t0) * 1000.0)
+
+            frame_id += 1
+            self.frame_pool.retain(frame)
+            with source.frame_cond:
+                previous = source.frame
+                source.frame = (frame_id, t_capture, frame)
+                if previous is not None:
+                    self.frame_pool.release(previous[2])
+                source.frame_cond.notify_all()
+            self.inference_queue.put(index, (frame_id, t_capture, frame))
+
+        source.running = False
+        source.stopped_at = time.perf_counter()
+        with source.frame_cond:
+            source.frame_cond.notify_all()
+
+    def _inference_loop(self):
+        while self.running:
+            item = self.inference_queue.get(timeout=0.1)
+            if item is None:
+                continue
+            index, (frame_id, t_capture, frame) = item
+            source = self.sources[index]
+            if not source.running:
+                # Nguồn đã dừng (lỗi xử lý hoặc hết frame): bỏ frame còn trong hàng đợi
+                self.frame_pool.release(frame)
+                continue
+            t0 = time.perf_counter()
+            try:
+                results = self.process_fn(index, frame)
+            except Exception as e:
+                # Chỉ dừng nguồn bị lỗi, các camera khác tiếp tục chạy
+                source.error = str(e)
+                source.running = False
+                with source.frame_cond:
+                    source.frame_cond.notify_all()
+                continue
+            finally:
+                self.frame_pool.release(frame)
+            t1 = time.perf_counter()
+
+            source.stats['queue_wait'].add((t0 - t_capture) * 1000.0)
+            source.stats['inference'].add((t1 - t0) * 1000.0)
+            source.stats['end_to_end'].add((t1 - t_capture) * 1000.0)
+            with source.results_lock:
+                source.processed += 1
+                if frame_id > source.results_frame_id:
+                    source.results = results
+                    source.results_frame_id = frame_id
+            if self.on_results is not None:
+                self.on_results(index, results, (t1 - t0) * 1000.0)
+
+    def stats_summary(self):
+        """Thống kê theo nguồn: {name: {stage: {...}, 'capture_fps', 'processed_fps', 'put', 'dropped', 'error'}}"""
+        now = time.perf_counter()
+        summary = {}
+        for index, source in enumerate(self.sources):
+            elapsed = max((source.stopped_at or now) - (source.started_at or now), 1e-6)
+            stats = {name: s.summary() for name, s in source.stats.items()}
+            stats.update({
+                'capture_fps': source.stats['capture'].count / elapsed,
+                'processed_fps': source.processed / elapsed,
+                'put': self.inference_queue.put_counts[index],
+                'dropped': self.inference_queue.drop_counts[index],
+                'error': source.error,
+            })
+            summary[source.name] = stats
+        return summary
@@ -3,14 +3,16 @@ from config import (
     DEFAULT_THRESHOLD, DEFAULT_TOP_K, NO_FACE_MSG,
     EMPTY_GALLERY_MSG, UNKNOWN_LABEL
 )
+from face_core.search import create_search_backend
 
 class FaceRecognizer:
     """Nhận diện khuôn mặt"""
     
-    def __init__(self, detector, gallery_manager, threshold=DEFAULT_THRESHOLD):
+    def __init__(self, detector, gallery_manager, threshold=DEFAULT_THRESHOLD, search_backend=None):
         self.detector = detector
         self.gallery_manager = gallery_manager
         self.threshold = threshold
+        self.search_backend = search_backend or create_search_backend()
 
     def recognize(self, image, top_k=DEFAULT_TOP_K):
         """Nhận diện khuôn mặt từ ảnh"""
@@ -19,13 +21,53 @@ class FaceRecognizer:
         if embedding is None:
             return {"result": NO_FACE_MSG, "top_matches": []}
         
+        return self.recognize_batch(embedding[np.newaxis], top_k)[0]
+    
+    def recognize_batch(self, embeddings, top_k=DEFAULT_TOP_K):
+        """Nhận diện nhiều embedding (N, 512) cùng lúc, trả về list kết quả theo thứ tự đầu vào"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim == 1:
+            embeddings = embeddings[np.newaxis]
+        if len(embeddings) == 0:
+            return []
+        
+        # Một snapshot cho cả batch: gallery có thể được sửa từ thread khác trong lúc so khớp
+        index = self.gallery_manager.index.snapshot()
+        if not index.names:
+            return [{"result": EMPTY_GALLERY_MSG, "top_matches": []} for _ in range(len(embeddings))]
+        
         # So khớp với gallery
-        matches = self._match_with_gallery(embedding)
-        if not matches:
-            return {"result": EMPTY_GALLERY_MSG, "top_matches": []}
+        top_ids, top_scores = self._match_with_gallery(index, embeddings, top_k)
         
         # Trả về kết quả
-        return self._format_results(matches, top_k)
+        return [self._format_results(index.names, ids, scores) for ids, scores in zip(top_ids, top_scores)]
+    
+    def recognize_paths(self, paths, embedder=None, top_k=DEFAULT_TOP_K):
+        """Nhận diện mọi khuôn mặt trong nhiều file ảnh với một lần so khớp gallery
+
+        `embedder` (ProcessEmbedder) chạy detection/embedding trong pool process;
+        None thì dùng detector của process này. Trả về list
+        (path, [{'bbox', 'result'}], lý do bỏ qua hoặc None) theo thứ tự `paths`.
+        """
+        if embedder is not None:
+            extracted = list(embedder.embed_paths(paths))
+        else:
+            extracted = [self._extract_path(path) for path in paths]
+        
+        all_embeddings = [embeddings for _, _, embeddings, _ in extracted if len(embeddings)]
+        results = iter(self.recognize_batch(np.concatenate(all_embeddings), top_k) if all_embeddings else [])
+        return [
+            (path, [{'bbox': bbox, 'result': next(results)} for bbox in bboxes], reason)
+            for path, bboxes, _, reason in extracted
+        ]
+    
+    def _extract_path(self, path):
+        _, faces = self.detector.detect_file(path)
+        if faces is None:
+            return path, [], np.empty((0, 512), dtype=np.float32), 'decode_failed'
+        if not faces:
+            return path, [], np.empty((0, 512), dtype=np.float32), 'no_face'
+        return path, [face.bbox for face in faces], self.detector.get_face_embeddings(faces), None
     
     def _get_embedding(self, image):
         """Lấy embedding từ ảnh hoặc trả về nếu đã là embedding"""
@@ -34,14 +76,9 @@ class FaceRecognizer:
         return self.detector.get_face_embedding(image)
     
     #Cosine similarity
-    def _match_with_gallery(self, embedding):
-        """So khớp embedding với gallery"""
-        matches = []
-        for name, embeddings in self.gallery_manager.gallery.items():
-            scores = [np.dot(embedding, e) for e in embeddings]
-            best_score = max(scores) if scores else 0
-            matches.append((name, best_score))
-        return matches
+    def _match_with_gallery(self, index, embeddings, top_k):
+        """So khớp các embedding với snapshot `index` qua search backend, trả về top-k (ids, scores)"""
+        return self.search_backend.search(index, embeddings, top_k)
     
     '''#Euclidean distance
     def _match_with_gallery(self, embedding, use_euclid=False):
@@ -65,10 +102,10 @@ class FaceRecognizer:
             matches.append((name, best_score))
         return matches'''
     
-    def _format_results(self, matches, top_k):
-        """Format kết quả cuối cùng"""
-        matches.sort(key=lambda x: x[1], reverse=True)
-        top_matches = matches[:top_k]
+    def _format_results(self, names, top_ids, top_scores):
+        """Format kết quả cuối cùng (`names` của cùng snapshot đã dùng để so khớp)"""
+        # id -1: backend xấp xỉ không tìm đủ k người trong các cụm được quét
+        top_matches = [(names[i], float(score)) for i, score in zip(top_ids, top_scores) if i >= 0]
         best_match, best_score = top_matches[0]
         
         result = best_match if best_score >= self.threshold else UNKNOWN_LABEL
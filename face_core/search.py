@@ -0,0 +1,144 @@
+import threading
+import numpy as np
+from config import SEARCH_BACKEND, IVF_NLIST, IVF_NPROBE, IVF_MIN_GALLERY_SIZE
+
+
+def top_k_per_row(scores, top_k):
+    """Chỉ số top-k cột cho mỗi dòng score, đã sắp xếp giảm dần"""
+    k = max(1, min(top_k, scores.shape[1]))
+    if k < scores.shape[1]:
+        top_ids = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top_ids = np.broadcast_to(np.arange(k), (len(scores), k))
+    order = np.argsort(-np.take_along_axis(scores, top_ids, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(top_ids, order, axis=1)
+
+
+class ExactSearchBackend:
+    """Tìm kiếm chính xác: so khớp với toàn bộ ma trận gallery"""
+
+    def build(self, index):
+        """Không cần dựng cấu trúc phụ: quét trực tiếp `index.matrix`"""
+
+    def search(self, index, queries, top_k):
+        """Trả về (ids, scores) dạng (n_queries, k): top-k người và score cao nhất cho mỗi query"""
+        scores = index.best_scores(queries)
+        top_ids = top_k_per_row(scores, top_k)
+        return top_ids, np.take_along_axis(scores, top_ids, axis=1)
+
+
+class IVFSearchBackend:
+    """Tìm kiếm xấp xỉ kiểu IVF: k-means chia gallery thành `nlist` cụm,
+    mỗi query chỉ quét `nprobe` cụm gần nhất.
+
+    `nprobe` càng lớn thì recall càng cao nhưng càng chậm. Centroid được huấn
+    luyện lại khi gallery lớn gấp đôi so với lúc huấn luyện; các thay đổi nhỏ
+    hơn chỉ gán lại các dòng vào cụm (lười, ở lần search kế tiếp). Centroid và
+    danh sách đảo được thay cùng lúc theo version của index, nên nhiều thread
+    có thể search song song.
+    """
+
+    def __init__(self, nlist=IVF_NLIST, nprobe=IVF_NPROBE, min_size=IVF_MIN_GALLERY_SIZE, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_size = min_size
+        self.seed = seed
+        self.centroids = None
+        self._exact = ExactSearchBackend()
+        self._lock = threading.Lock()
+        # (version, centroids, starts, ends, list_matrix, list_labels) của lần dựng gần nhất
+        self._lists = None
+        self._trained_rows = 0
+
+    def search(self, index, queries, top_k):
+        """Trả về (ids, scores) dạng (n_queries, k) như ExactSearchBackend
+
+        Khi các cụm được quét chứa ít hơn k người, các cột còn thiếu có id -1
+        và score -inf.
+        """
+        # Gallery nhỏ: quét toàn bộ nhanh hơn và chính xác
+        if len(index.matrix) < self.min_size:
+            return self._exact.search(index, queries, top_k)
+        _, centroids, starts, ends, list_matrix, list_labels = self.build(index)
+
+        nprobe = max(1, min(self.nprobe, len(centroids)))
+        coarse = queries @ centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        k = max(1, min(top_k, len(index.names)))
+        all_ids = np.full((len(queries), k), -1, dtype=np.intp)
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, (query, lists) in enumerate(zip(queries, probes)):
+            rows = np.concatenate([np.arange(starts[l], ends[l]) for l in lists])
+            if len(rows) == 0:
+                all_ids[q], all_scores[q] = self._exact.search(index, query[np.newaxis], top_k)
+                continue
+
+            sims = list_matrix[rows] @ query
+            # Score cao nhất cho từng người trong các ứng viên
+            labels, inverse = np.unique(list_labels[rows], return_inverse=True)
+            best = np.full(len(labels), -np.inf, dtype=np.float32)
+            np.maximum.at(best, inverse, sims)
+
+            top = top_k_per_row(best[np.newaxis], top_k)[0]
+            all_ids[q, :len(top)] = labels[top]
+            all_scores[q, :len(top)] = best[top]
+        return all_ids, all_scores
+
+    def build(self, index):
+        """Huấn luyện centroid / dựng danh sách đảo cho `index` nếu nó đã thay đổi
+
+        `search` tự gọi khi cần; gọi trước để tách thời gian dựng khỏi lần search đầu.
+        Trả về bộ danh sách đảo tương ứng với đúng `index` (version) này.
+        """
+        lists = self._lists
+        if lists is not None and lists[0] == index.version:
+            return lists
+        with self._lock:
+            lists = self._lists
+            if lists is not None and lists[0] == index.version:
+                return lists
+            matrix = index.matrix
+            if self.centroids is None or len(matrix) > 2 * self._trained_rows:
+                self._train(matrix)
+            self._lists = lists = (index.version, self.centroids, *self._assign(index, self.centroids))
+            return lists
+
+    def _train(self, matrix):
+        """Huấn luyện centroid bằng MiniBatchKMeans trên một mẫu của gallery"""
+        from sklearn.cluster import MiniBatchKMeans
+
+        nlist = self.nlist or int(np.sqrt(len(matrix)))
+        nlist = max(1, min(nlist, len(matrix)))
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(len(matrix), nlist * 32)
+        sample = matrix[np.sort(rng.choice(len(matrix), sample_size, replace=False))]
+
+        kmeans = MiniBatchKMeans(n_clusters=nlist, random_state=self.seed, n_init=1,
+                                 batch_size=max(1024, nlist * 4), max_iter=20)
+        kmeans.fit(sample)
+        centroids = kmeans.cluster_centers_.astype(np.float32)
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+        self.centroids = centroids
+        self._trained_rows = len(matrix)
+
+    def _assign(self, index, centroids, chunk_size=65536):
+        """Gán mỗi embedding vào cụm gần nhất, trả về (starts, ends, list_matrix, list_labels)"""
+        matrix = index.matrix
+        assign = np.empty(len(matrix), dtype=np.int64)
+        for start in range(0, len(matrix), chunk_size):
+            chunk = matrix[start:start + chunk_size]
+            assign[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+
+        order = np.argsort(assign, kind='stable')
+        bounds = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+        return bounds[:-1], bounds[1:], matrix[order], index.row_labels()[order]
+
+
+def create_search_backend(kind=SEARCH_BACKEND, **kwargs):
+    """Tạo search backend theo tên ('exact' hoặc 'ivf')"""
+    if kind == 'exact':
+        return ExactSearchBackend()
+    if kind == 'ivf':
+        return IVFSearchBackend(**kwargs)
+    raise ValueError(f"Unknown search backend: {kind}")
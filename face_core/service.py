@@ -0,0 +1,217 @@
+import cv2
+import json
+import time
+import queue
+import threading
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import (
+    SERVE_HOST, SERVE_PORT, SERVE_MAX_BATCH_SIZE, SERVE_MAX_WAIT_MS,
+    SERVE_DECODE_WORKERS, SERVE_MAX_BODY_MB, SERVE_REQUEST_TIMEOUT, DEFAULT_TOP_K
+)
+from face_core.pipeline import StageStats
+
+
+class _Request:
+    """Một request nhận diện đang chờ trong service"""
+
+    __slots__ = ('image', 'future', 't_submit', 't_decoded')
+
+    def __init__(self, t_submit):
+        self.image = None
+        self.future = Future()
+        self.t_submit = t_submit
+        self.t_decoded = None
+
+
+class RecognitionService:
+    """Nhận diện ảnh đã mã hóa (jpg/png) với micro-batching động.
+
+    Ảnh được giải mã song song trong thread pool, rồi một thread inference gom
+    các request đang chờ thành batch (tối đa `max_batch_size`, chờ thêm tối đa
+    `max_wait_ms` sau request đầu tiên). Mỗi batch detect từng ảnh, chạy model
+    recognition một lần cho mọi khuôn mặt của batch và so khớp gallery một lần.
+    Dùng chung một FaceDetector/FaceRecognizer cho mọi request.
+    """
+
+    def __init__(self, detector, recognizer, max_batch_size=SERVE_MAX_BATCH_SIZE,
+                 max_wait_ms=SERVE_MAX_WAIT_MS, decode_workers=SERVE_DECODE_WORKERS, top_k=DEFAULT_TOP_K):
+        self.detector = detector
+        self.recognizer = recognizer
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.top_k = top_k
+        self.decoder = ThreadPoolExecutor(max_workers=max(1, decode_workers))
+        self.pending = queue.Queue()
+        self.stats = {
+            'decode': StageStats(),   # Giải mã ảnh
+            'queue': StageStats(),    # Từ lúc giải mã xong tới lúc batch bắt đầu chạy
+            'compute': StageStats(),  # Thời gian chạy batch chứa request
+            'total': StageStats(),
+            'batch_size': StageStats(),
+        }
+        self.running = True
+        self.thread = threading.Thread(target=self._batch_loop, name='recognition-batcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, data):
+        """Gửi ảnh đã mã hóa (bytes), trả về Future của dict kết quả"""
+        request = _Request(time.perf_counter())
+        self.decoder.submit(self._decode, request, data)
+        return request.future
+
+    def recognize(self, data, timeout=None):
+        """Gửi ảnh và chờ kết quả (dùng trong thread xử lý HTTP)"""
+        return self.submit(data).result(timeout)
+
+    def _decode(self, request, data):
+        try:
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        except cv2.error:
+            # Header hợp lệ nhưng nội dung hỏng / kích thước vượt CV_IO_MAX_IMAGE_PIXELS
+            image = None
+        except Exception as e:
+            # Lỗi trong thread pool giải mã sẽ bị nuốt: luôn trả lỗi về future của request
+            request.future.set_exception(e)
+            return
+        request.t_decoded = time.perf_counter()
+        self.stats['decode'].add((request.t_decoded - request.t_submit) * 1000.0)
+        if image is None:
+            request.future.set_result({'error': 'decode_failed'})
+            return
+        request.image = image
+        self.pending.put(request)
+
+    def _batch_loop(self):
+        while self.running:
+            try:
+                batch = [self.pending.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _run_batch(self, batch):
+        t0 = time.perf_counter()
+        boxes, crops, owners = [], [], []
+        for k, request in enumerate(batch):
+            model_image, faces = self.detector.detect_faces(request.image, embed=False)
+            request.image = None
+            boxes.append([face.bbox for face in faces or []])
+            for face in faces or []:
+                crops.append(self.detector.align_face(model_image, face))
+                owners.append(k)
+        embeddings = self.detector.embed_crops(crops)
+        results = iter(self.recognizer.recognize_batch(embeddings, self.top_k))
+        t1 = time.perf_counter()
+
+        compute_ms = (t1 - t0) * 1000.0
+        self.stats['batch_size'].add(len(batch))
+        for request, bboxes in zip(batch, boxes):
+            timing = {
+                'decode_ms': (request.t_decoded - request.t_submit) * 1000.0,
+                'queue_ms': (t0 - request.t_decoded) * 1000.0,
+                'compute_ms': compute_ms,
+                'total_ms': (t1 - request.t_submit) * 1000.0,
+            }
+            for stage in ('queue', 'compute', 'total'):
+                self.stats[stage].add(timing[f'{stage}_ms'])
+            faces = []
+            for bbox in bboxes:
+                result = next(results)
+                faces.append({
+                    'bbox': [round(float(v), 1) for v in bbox],
+                    'result': result['result'],
+                    'score': float(result.get('score', 0.0)),
+                    'top_matches': [[name, float(score)] for name, score in result['top_matches']],
+                })
+            request.future.set_result({'faces': faces, 'batch_size': len(batch), 'timing': timing})
+
+    def stats_summary(self):
+        """Bộ đếm theo stage: {stage: {'count', 'avg_ms', 'p50_ms', 'max_ms'}}"""
+        return {name: stats.summary() for name, stats in self.stats.items()}
+
+    def close(self):
+        self.running = False
+        self.decoder.shutdown()
+        self.thread.join(timeout=1.0)
+
+
+def _make_handler(service, max_body, timeout=SERVE_REQUEST_TIMEOUT):
+    class RecognitionHandler(BaseHTTPRequestHandler):
+        """POST /recognize (body là ảnh jpg/png), GET /stats, GET /health"""
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/recognize':
+                return self._send(404, {'error': 'not_found'})
+            length = int(self.headers.get('Content-Length') or 0)
+            if length <= 0:
+                return self._send(400, {'error': 'empty_body'})
+            if length > max_body:
+                return self._send(413, {'error': 'body_too_large'})
+            data = self.rfile.read(length)
+            try:
+                result = service.recognize(data, timeout=timeout)
+            except FutureTimeoutError:
+                return self._send(504, {'error': 'timeout'})
+            except Exception as e:
+                return self._send(500, {'error': str(e)})
+            self._send(400 if 'error' in result else 200, result)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                return self._send(200, service.stats_summary())
+            if self.path.rstrip('/') == '/health':
+                return self._send(200, {'status': 'ok'})
+            self._send(404, {'error': 'not_found'})
+
+        def _send(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return RecognitionHandler
+
+
+def serve(detector, recognizer, host=SERVE_HOST, port=SERVE_PORT, **service_options):
+    """Chạy HTTP server nhận diện tới khi Ctrl+C, in thống kê khi dừng"""
+    service = RecognitionService(detector, recognizer, **service_options)
+    server = ThreadingHTTPServer((host, port), _make_handler(service, int(SERVE_MAX_BODY_MB * 1024 * 1024)))
+    server.daemon_threads = True
+    print(f"🌐 [SERVE] Đang lắng nghe http://{host}:{port} (POST /recognize, GET /stats)")
+    print(f"📦 [SERVE] batch tối đa {service.max_batch_size}, chờ tối đa {service.max_wait * 1000:.0f} ms")
+    print("👆 Nhấn Ctrl+C để dừng")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n⏹️ Dừng bởi người dùng")
+    finally:
+        server.server_close()
+        service.close()
+        print("\n📊 Thống kê service:")
+        for stage, stats in service.stats_summary().items():
+            if stage == 'batch_size':
+                print(f"   - batch size: count={stats['count']}, avg={stats['avg_ms']:.1f}, max={stats['max_ms']:.0f}")
+                continue
+            print(f"   - {stage}: count={stats['count']}, avg={stats['avg_ms']:.1f} ms, "
+                  f"p50={stats['p50_ms']:.1f} ms, max={stats['max_ms']:.1f} ms")
@@ -0,0 +1,178 @@
+import threading
+import numpy as np
+from config import (
+    TRACK_IOU_THRESHOLD, TRACK_MAX_AGE, TRACK_REVALIDATE_INTERVAL,
+    TRACK_VOTE_DECAY, TRACK_COMMIT_SCORE, TRACK_COMMIT_HITS,
+    RECOGNITION_THRESHOLD, UNKNOWN_LABEL
+)
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU giữa hai tập bbox (x1, y1, x2, y2), trả về ma trận (len(a), len(b))"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)[:, np.newaxis]
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)[np.newaxis]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    return inter / np.maximum(area_a + area_b - inter, 1e-6)
+
+
+class IdentityVoter:
+    """Tích lũy score theo từng danh tính qua nhiều lần nhận diện của một track.
+
+    Mỗi lần nhận diện cập nhật EMA score của mọi ứng viên (ứng viên không có
+    trong top_matches được tính score 0). Danh tính được chốt (committed) khi
+    cùng một người dẫn đầu `commit_hits` lần liên tiếp với EMA >= `commit_score`.
+    """
+
+    def __init__(self, threshold=RECOGNITION_THRESHOLD, decay=TRACK_VOTE_DECAY,
+                 commit_score=TRACK_COMMIT_SCORE, commit_hits=TRACK_COMMIT_HITS):
+        self.threshold = threshold
+        self.decay = decay
+        self.commit_score = commit_score
+        self.commit_hits = commit_hits
+        self.scores = {}
+        self.observations = 0
+        self.leader = None
+        self.streak = 0
+        self.committed = False
+
+    def observe(self, result):
+        """Thêm một kết quả recognize, trả về kết quả đã bỏ phiếu (cùng dạng dict)"""
+        current = dict(result.get('top_matches', []))
+        for name in set(self.scores) | set(current):
+            self.scores[name] = self.decay * self.scores.get(name, 0.0) + (1 - self.decay) * current.get(name, 0.0)
+        self.observations += 1
+        if not self.scores:
+            return result
+
+        # Hiệu chỉnh bias của EMA ở những lần quan sát đầu (giá trị khởi tạo 0)
+        correction = 1 - self.decay ** self.observations
+        ranked = sorted(((score / correction, name) for name, score in self.scores.items()), reverse=True)
+        best_score, leader = ranked[0]
+        if best_score < self.threshold:
+            leader = UNKNOWN_LABEL
+
+        self.streak = self.streak + 1 if leader == self.leader else 1
+        self.leader = leader
+        self.committed = (leader != UNKNOWN_LABEL and self.streak >= self.commit_hits
+                          and best_score >= self.commit_score)
+        return {
+            "result": leader,
+            "score": best_score,
+            "top_matches": [(name, score) for score, name in ranked],
+            "committed": self.committed,
+        }
+
+
+class Track:
+    """Một khuôn mặt được theo dõi qua nhiều frame"""
+
+    def __init__(self, track_id, bbox, timestamp, voter=None):
+        self.track_id = track_id
+        self.bbox = np.asarray(bbox, dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)  # pixel/giây cho từng cạnh bbox
+        self.last_seen = timestamp
+        self.hits = 1
+        self.voter = voter or IdentityVoter()
+        self.result = None  # Kết quả đã bỏ phiếu (dict như FaceRecognizer, thêm 'committed')
+        self.last_recognized = None
+
+    def predict(self, timestamp):
+        """Vị trí bbox dự đoán tại thời điểm `timestamp` (chuyển động đều)"""
+        return self.bbox + self.velocity * (timestamp - self.last_seen)
+
+    def update(self, bbox, timestamp):
+        bbox = np.asarray(bbox, dtype=np.float32)
+        dt = timestamp - self.last_seen
+        if dt > 0:
+            # Làm mượt vận tốc để bbox dự đoán không bị giật
+            measured = (bbox - self.bbox) / dt
+            self.velocity = 0.5 * self.velocity + 0.5 * measured
+        self.bbox = bbox
+        self.last_seen = timestamp
+        self.hits += 1
+
+    def set_result(self, result, timestamp):
+        self.result = self.voter.observe(result)
+        self.last_recognized = timestamp
+
+
+class FaceTracker:
+    """Gán track ID cho các bbox từ detector bằng IoU với vị trí dự đoán.
+
+    Track chưa chốt danh tính được nhận diện ở mỗi lần detect và bỏ phiếu qua
+    IdentityVoter; track đã chốt chỉ được nhận diện lại khi quá thời gian xác
+    nhận lại. Giữa hai lần detect, bbox được nội suy theo vận tốc để overlay
+    không bị đứng hình.
+    """
+
+    def __init__(self, iou_threshold=TRACK_IOU_THRESHOLD, max_age=TRACK_MAX_AGE,
+                 revalidate_interval=TRACK_REVALIDATE_INTERVAL, threshold=RECOGNITION_THRESHOLD,
+                 vote_decay=TRACK_VOTE_DECAY, commit_score=TRACK_COMMIT_SCORE, commit_hits=TRACK_COMMIT_HITS):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.revalidate_interval = revalidate_interval
+        self.threshold = threshold
+        self.vote_decay = vote_decay
+        self.commit_score = commit_score
+        self.commit_hits = commit_hits
+        self.tracks = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+        # Bộ đếm: số lần phải nhận dạng lại và số lần dùng lại kết quả của track
+        self.recognitions = 0
+        self.reused = 0
+
+    def update(self, bboxes, timestamp):
+        """Ghép các bbox mới với track hiện có, trả về list track theo thứ tự bbox"""
+        bboxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 4)
+        with self._lock:
+            assigned = [None] * len(bboxes)
+            if self.tracks and len(bboxes):
+                predicted = [track.predict(timestamp) for track in self.tracks]
+                ious = iou_matrix(predicted, bboxes)
+                # Ghép tham lam theo IoU giảm dần
+                for flat in np.argsort(-ious, axis=None):
+                    t_idx, d_idx = np.unravel_index(flat, ious.shape)
+                    if ious[t_idx, d_idx] < self.iou_threshold:
+                        break
+                    track = self.tracks[t_idx]
+                    if assigned[d_idx] is not None or track.last_seen == timestamp:
+                        continue
+                    track.update(bboxes[d_idx], timestamp)
+                    assigned[d_idx] = track
+
+            for d_idx, bbox in enumerate(bboxes):
+                if assigned[d_idx] is None:
+                    voter = IdentityVoter(self.threshold, self.vote_decay, self.commit_score, self.commit_hits)
+                    track = Track(self._next_id, bbox, timestamp, voter)
+                    self._next_id += 1
+                    self.tracks.append(track)
+                    assigned[d_idx] = track
+
+            # Bỏ các track không được thấy lại quá lâu
+            self.tracks = [t for t in self.tracks if timestamp - t.last_seen <= self.max_age]
+            return assigned
+
+    def needs_recognition(self, track, timestamp):
+        """Track chưa chốt danh tính hoặc đã quá hạn xác nhận lại thì cần chạy model nhận dạng"""
+        with self._lock:
+            needed = (not track.voter.committed
+                      or timestamp - track.last_recognized >= self.revalidate_interval)
+            if needed:
+                self.recognitions += 1
+            else:
+                self.reused += 1
+            return needed
+
+    def set_result(self, track, result, timestamp):
+        with self._lock:
+            track.set_result(result, timestamp)
+
+    def snapshot(self, timestamp):
+        """Danh sách (track_id, bbox dự đoán, result) để vẽ tại thời điểm `timestamp`"""
+        with self._lock:
+            return [(t.track_id, t.predict(timestamp), t.result) for t in self.tracks]
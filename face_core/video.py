@@ -0,0 +1,165 @@
+import cv2
+import json
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from config import VIDEO_SAMPLE_FPS, VIDEO_BATCH_SIZE, VIDEO_PREFETCH, VIDEO_WORKERS
+from face_core.pipeline import FramePool
+
+_END = object()
+
+
+class VideoProcessor:
+    """Nhận dạng khuôn mặt trên file video đã ghi, nhanh hơn thời gian thực.
+
+    - Thread giải mã lấy mẫu `sample_fps` frame/giây: frame không được lấy mẫu
+      chỉ `cap.grab()` (không giải mã ảnh), frame được lấy mẫu đọc vào buffer
+      của FramePool và đưa vào hàng đợi giới hạn `prefetch`.
+    - Detect + căn chỉnh chạy song song bằng `workers` thread; buffer frame
+      quay về pool ngay sau khi căn chỉnh xong, nên số buffer chỉ phụ thuộc
+      `prefetch` + `workers`, không phụ thuộc `batch_size`.
+    - Crop của `batch_size` frame được gom lại để chạy model recognition và so
+      khớp gallery một lần cho cả batch.
+    - Mỗi khuôn mặt được ghi một dòng JSONL:
+      {"frame", "timestamp", "bbox", "identity", "score"}.
+    """
+
+    def __init__(self, detector, recognizer, sample_fps=VIDEO_SAMPLE_FPS, batch_size=VIDEO_BATCH_SIZE,
+                 prefetch=VIDEO_PREFETCH, workers=VIDEO_WORKERS):
+        self.detector = detector
+        self.recognizer = recognizer
+        self.sample_fps = sample_fps
+        self.batch_size = max(1, batch_size)
+        self.prefetch = max(1, prefetch)
+        self.workers = max(1, workers)
+        self.frame_pool = FramePool()
+        self._local = threading.local()
+
+    def process(self, path, output, progress=None):
+        """Xử lý `path`, ghi timeline JSONL vào `output`, trả về dict báo cáo
+
+        `progress(sampled_frames, timestamp)` (nếu có) được gọi sau mỗi batch.
+        """
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise IOError(f"Không thể mở video: {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, round(fps / self.sample_fps)) if self.sample_fps else 1
+
+        frames = queue.Queue(maxsize=self.prefetch)
+        self._stop = False
+        self._total_frames = 0
+        decoder = threading.Thread(target=self._decode_loop, args=(cap, fps, step, frames), daemon=True)
+        start = time.perf_counter()
+        decoder.start()
+
+        report = {'sampled_frames': 0, 'faces': 0, 'video_seconds': 0.0}
+        try:
+            with open(output, 'w', encoding='utf-8') as out, \
+                    ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pending = deque()  # (index, timestamp, future detect) theo thứ tự frame
+                batch = []         # (index, timestamp, bboxes, crops) chờ recognition
+                done = False
+                while not done:
+                    item = frames.get()
+                    if item is _END:
+                        done = True
+                    else:
+                        index, timestamp, frame = item
+                        pending.append((index, timestamp, executor.submit(self._detect, frame)))
+                    # Chỉ giữ `workers` frame đang detect: không lấy thêm frame (và buffer) khi worker còn bận
+                    while pending and (done or len(pending) > self.workers):
+                        index, timestamp, future = pending.popleft()
+                        batch.append((index, timestamp, *future.result()))
+                        if len(batch) >= self.batch_size or (done and not pending):
+                            report['faces'] += self._recognize_batch(batch, out)
+                            report['sampled_frames'] += len(batch)
+                            report['video_seconds'] = batch[-1][1]
+                            if progress is not None:
+                                progress(report['sampled_frames'], batch[-1][1])
+                            batch = []
+        finally:
+            self._stop = True
+            # Giải phóng thread giải mã nếu nó đang chờ hàng đợi đầy
+            while decoder.is_alive():
+                try:
+                    item = frames.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is not _END:
+                    self.frame_pool.release(item[2])
+            decoder.join()
+            cap.release()
+
+        elapsed = time.perf_counter() - start
+        report.update({
+            'total_frames': self._total_frames,
+            'seconds': elapsed,
+            'frames_per_s': report['sampled_frames'] / elapsed if elapsed > 0 else 0.0,
+            'decoded_frames_per_s': self._total_frames / elapsed if elapsed > 0 else 0.0,
+            'realtime_factor': report['video_seconds'] / elapsed if elapsed > 0 else 0.0,
+            'frame_buffers': self.frame_pool.allocated,
+        })
+        return report
+
+    def _decode_loop(self, cap, fps, step, frames):
+        """Thread giải mã: grab mọi frame, chỉ retrieve frame được lấy mẫu"""
+        index = 0
+        shape = None
+        while not self._stop:
+            if index % step:
+                if not cap.grab():
+                    break
+                index += 1
+                continue
+            buf = self.frame_pool.acquire(*shape) if shape else None
+            ret, frame = cap.read(buf) if buf is not None else cap.read()
+            if not ret:
+                if buf is not None:
+                    self.frame_pool.release(buf)
+                break
+            if frame is not buf:
+                if buf is not None:
+                    self.frame_pool.release(buf)
+                frame = self.frame_pool.adopt(frame)
+                shape = (frame.shape, frame.dtype)
+            frames.put((index, index / fps, frame))
+            index += 1
+        self._total_frames = index
+        frames.put(_END)
+
+    def _detect(self, frame):
+        """Chạy trong thread pool: detect và căn chỉnh các khuôn mặt của một frame
+
+        Buffer frame được trả về pool ngay khi có crop (crop là mảng riêng).
+        """
+        try:
+            model_image, faces = self.detector.detect_faces(frame, embed=False,
+                                                            out=getattr(self._local, 'image', None))
+            if model_image is not frame:
+                self._local.image = model_image
+            faces = faces or []
+            return [face.bbox for face in faces], [self.detector.align_face(model_image, face) for face in faces]
+        finally:
+            self.frame_pool.release(frame)
+
+    def _recognize_batch(self, batch, out):
+        """Embed + so khớp crop của cả batch một lần, ghi JSONL; trả về số khuôn mặt"""
+        crops = [crop for _, _, _, frame_crops in batch for crop in frame_crops]
+        embeddings = self.detector.embed_crops(crops)
+        results = iter(self.recognizer.recognize_batch(embeddings))
+        count = 0
+        for index, timestamp, bboxes, _ in batch:
+            for bbox in bboxes:
+                result = next(results)
+                out.write(json.dumps({
+                    'frame': index,
+                    'timestamp': round(timestamp, 3),
+                    'bbox': [round(float(v), 1) for v in bbox],
+                    'identity': result['result'],
+                    'score': round(float(result.get('score', 0.0)), 4),
+                }, ensure_ascii=False) + '\n')
+                count += 1
+        return count
@@ -0,0 +1,90 @@
+import cv2
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from config import WORKER_PROCESSES, WORKER_INTRA_OP_THREADS, ENROLL_BATCH_SIZE
+
+# FaceDetector riêng của worker process, tạo một lần trong initializer
+_WORKER_DETECTOR = None
+
+
+def _init_worker(config):
+    global _WORKER_DETECTOR
+    from face_core.detector import FaceDetector
+    _WORKER_DETECTOR = FaceDetector(**config)
+
+
+def _embed_paths(paths, best_only):
+    """Chạy trong worker: đọc ảnh, detect và embed theo batch.
+
+    Trả về list (bboxes (K, 4), embeddings (K, 512), lý do bỏ qua hoặc None)
+    theo thứ tự `paths`; ảnh đã giải mã không bao giờ rời khỏi worker.
+    """
+    detector = _WORKER_DETECTOR
+    bboxes = [np.empty((0, 4), dtype=np.float32)] * len(paths)
+    reasons = [None] * len(paths)
+    crops, owners = [], []
+    for i, path in enumerate(paths):
+        image = cv2.imread(path)
+        if image is None:
+            reasons[i] = 'decode_failed'
+            continue
+        model_image, faces = detector.detect_faces(image, embed=False)
+        if not faces:
+            reasons[i] = 'no_face'
+            continue
+        if best_only:
+            faces = [max(faces, key=lambda x: x.det_score)]
+        bboxes[i] = np.stack([face.bbox for face in faces]).astype(np.float32)
+        for face in faces:
+            crops.append(detector.align_face(model_image, face))
+            owners.append(i)
+
+    embeddings = detector.embed_crops(crops)
+    owners = np.asarray(owners, dtype=np.int64)
+    return [(bboxes[i], embeddings[owners == i], reasons[i]) for i in range(len(paths))]
+
+
+class ProcessEmbedder:
+    """Pool process cho detection/embedding hàng loạt trên CPU nhiều core.
+
+    Mỗi worker giữ FaceAnalysis riêng (load một lần khi khởi động) với
+    `intra_op_threads` thread ONNX Runtime, nhận danh sách đường dẫn ảnh và chỉ
+    trả về bbox + embedding. Tổng số core dùng ~ processes * intra_op_threads.
+    """
+
+    def __init__(self, detector_config, processes=WORKER_PROCESSES,
+                 intra_op_threads=WORKER_INTRA_OP_THREADS, chunk_size=ENROLL_BATCH_SIZE):
+        config = dict(detector_config)
+        if intra_op_threads:
+            config['session_options'] = dict(config.get('session_options') or {}, intra_op_threads=intra_op_threads)
+        self.processes = max(1, processes)
+        self.chunk_size = max(1, chunk_size)
+        # spawn: không fork process đang có thread của ONNX Runtime
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(config,),
+        )
+
+    def embed_paths(self, paths, best_only=False):
+        """Yield (path, bboxes, embeddings, lý do bỏ qua) theo thứ tự `paths`
+
+        best_only=True chỉ giữ khuôn mặt có det_score cao nhất mỗi ảnh (dùng khi enroll).
+        """
+        paths = list(paths)
+        chunks = [paths[i:i + self.chunk_size] for i in range(0, len(paths), self.chunk_size)]
+        results = self.executor.map(_embed_paths, chunks, [best_only] * len(chunks))
+        for chunk, chunk_results in zip(chunks, results):
+            for path, (bboxes, embeddings, reason) in zip(chunk, chunk_results):
+                yield path, bboxes, embeddings, reason
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
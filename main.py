@@ -7,7 +7,6 @@ Face Recognition System - Main Application
 import os
 import sys
 import argparse
-import cv2
 import time
 import numpy as np
 from pathlib import Path
@@ -15,7 +14,12 @@ from pathlib import Path
 from face_core.detector import FaceDetector
 from face_core.gallery import FaceGalleryManager
 from face_core.recognizer import FaceRecognizer
-from utils.image_utils import load_image_from_url
+from face_core.enrollment import BulkEnroller, IMAGE_EXTENSIONS
+from face_core.workers import ProcessEmbedder
+from face_core.service import serve
+from face_core.video import VideoProcessor
+from config import WORKER_PROCESSES, SERVE_HOST, SERVE_PORT, VIDEO_SAMPLE_FPS
+from utils.image_utils import load_bytes_from_url
 from utils.visualization import show_image
 
 # ===== CONSTANTS =====
@@ -124,6 +128,7 @@ class FaceRecognitionApp:
         print("6. 🗑️  Xóa người khỏi gallery")
         print("7. 🔄 Tìm và xóa duplicate")
         print("8. 📊 Thống kê gallery")
+        print("9. 📂 Enroll hàng loạt từ thư mục")
         print("0. ❌ Thoát")
         print("="*50)
     
@@ -157,7 +162,7 @@ class FaceRecognitionApp:
         
         try:
             from demos.add_person_camera import smart_add_person_camera
-            result = smart_add_person_camera()
+            result = smart_add_person_camera(self.detector, self.gallery_manager)
             
             # Reload gallery sau khi thêm người qua camera
             self._reload_gallery()
@@ -171,7 +176,7 @@ class FaceRecognitionApp:
         """Reload gallery từ file để đồng bộ với các thay đổi"""
         try:
             old_gallery = dict(self.gallery_manager.gallery)
-            self.gallery_manager.gallery = self.gallery_manager._load_gallery()
+            self.gallery_manager.reload_gallery()
             
             # Check for changes
             new_counts = self.gallery_manager.get_person_count()
@@ -204,13 +209,14 @@ class FaceRecognitionApp:
             print("❌ Đường dẫn không được để trống!")
             return
         
-        # Load image
+        # Load image (bytes/đường dẫn đi qua cache embedding: ảnh đã gửi không chạy lại model)
         if source.startswith(("http://", "https://")):
             print("🌐 Đang tải ảnh từ URL...")
-            image = load_image_from_url(source)
-            if image is None:
+            image_data = load_bytes_from_url(source)
+            if not image_data:
                 print("❌ [NETWORK] Không thể tải ảnh từ URL")
                 return
+            success, msg = self.gallery_manager.add_person(name, image_data=image_data)
         else:
             # Chuẩn hóa đường dẫn
             normalized_path = normalize_path(source)
@@ -238,14 +244,8 @@ class FaceRecognitionApp:
             if file_info:
                 print(f"📊 File: {file_info['name']} ({file_info['size_mb']:.2f} MB)")
             
-            # Đọc ảnh
-            image = cv2.imread(normalized_path)
-            if image is None:
-                print("❌ [FILE] Không thể đọc file ảnh! File có thể bị hỏng.")
-                return
+            success, msg = self.gallery_manager.add_person(name, image_path=normalized_path)
         
-        # Add to gallery
-        success, msg = self.gallery_manager.add_person(name, image=image)
         if success:
             print(f"✅ {msg}")
         else:
@@ -261,11 +261,22 @@ class FaceRecognitionApp:
             return
         try:
             from demos.webcam_realtime_demo import webcam_realtime_demo
-            webcam_realtime_demo()
+            webcam_realtime_demo(self.detector, self.gallery_manager)
         except Exception as e:
             print(f"❌ [CAMERA] Lỗi khi chạy nhận dạng realtime: {e}")
             print("🔧 Hãy thử: pip install opencv-contrib-python")
     
+    def multi_camera_recognition(self, sources):
+        """Nhận dạng realtime trên nhiều camera/URL/file dùng chung một bản model"""
+        print("\n🎥 NHẬN DẠNG REALTIME NHIỀU NGUỒN")
+        print("-" * 30)
+        
+        if not self.gallery_manager.gallery:
+            print("⚠️  Gallery trống! Hãy thêm người trước.")
+            return
+        from demos.multi_camera_demo import multi_camera_demo
+        multi_camera_demo(sources, self.detector, self.gallery_manager, self.recognizer)
+    
     def recognize_from_image(self):
         """Nhận dạng từ ảnh"""
         print("\n🔍 NHẬN DẠNG TỪ ẢNH")
@@ -299,6 +310,54 @@ class FaceRecognitionApp:
         except Exception as e:
             print(f"❌ [RECOGNITION] Lỗi khi nhận dạng: {e}")
     
+    def recognize_folder(self, folder):
+        """Nhận dạng hàng loạt mọi ảnh trong một thư mục"""
+        paths = sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                       if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS)
+        if not paths:
+            print(f"❌ [FILE] Không có ảnh nào trong {folder}")
+            return
+        
+        start = time.time()
+        if WORKER_PROCESSES > 0:
+            with ProcessEmbedder(self.detector.config) as embedder:
+                results = self.recognizer.recognize_paths(paths, embedder)
+        else:
+            results = self.recognizer.recognize_paths(paths)
+        elapsed = time.time() - start
+        
+        for path, faces, reason in results:
+            if reason:
+                print(f"⚠️  {os.path.basename(path)}: {reason}")
+                continue
+            labels = ", ".join(f"{face['result']['result']} ({face['result'].get('score', 0):.3f})" for face in faces)
+            print(f"👤 {os.path.basename(path)}: {labels}")
+        print(f"\n⏱️  {len(paths)} ảnh trong {elapsed:.1f}s ({len(paths) / max(elapsed, 1e-6):.1f} ảnh/s)")
+    
+    def process_video(self, path, output=None, sample_fps=VIDEO_SAMPLE_FPS):
+        """Nhận dạng trên file video, ghi timeline JSONL (timestamp, bbox, identity, score)"""
+        output = output or os.path.splitext(path)[0] + "_timeline.jsonl"
+        print(f"\n🎬 Xử lý video: {path} ({sample_fps or 'mọi'} frame/giây)")
+        
+        reported = [0]
+        
+        def progress(frames, timestamp):
+            if frames - reported[0] >= 200:
+                reported[0] = frames
+                print(f"   ⏳ {frames} frame, {timestamp:.1f}s video")
+        
+        processor = VideoProcessor(self.detector, self.recognizer, sample_fps=sample_fps)
+        try:
+            report = processor.process(path, output, progress=progress)
+        except IOError as e:
+            print(f"❌ [VIDEO] {e}")
+            return
+        
+        print(f"\n✅ {report['faces']} khuôn mặt trong {report['sampled_frames']}/{report['total_frames']} frame "
+              f"-> {output}")
+        print(f"⏱️  {report['seconds']:.1f}s: {report['frames_per_s']:.1f} frame xử lý/s, "
+              f"{report['decoded_frames_per_s']:.1f} frame video/s ({report['realtime_factor']:.1f}x thời gian thực)")
+    
     def show_gallery_list(self):
         """Hiển thị danh sách người trong gallery"""
         print("\n👥 DANH SÁCH GALLERY")
@@ -367,6 +426,13 @@ class FaceRecognitionApp:
         print("🔍 Đang tìm kiếm duplicate...")
         duplicates = self.gallery_manager.find_duplicates(threshold=DUPLICATE_THRESHOLD)
         
+        # Embedding gần trùng nhưng khác tên: chỉ cảnh báo, không tự xóa
+        cross_duplicates = self.gallery_manager.find_cross_duplicates(threshold=DUPLICATE_THRESHOLD)
+        if cross_duplicates:
+            print(f"⚠️  Có {len(cross_duplicates)} cặp ảnh gần trùng giữa hai người khác nhau (có thể nhầm nhãn):")
+            for name_a, i, name_b, j, similarity in cross_duplicates:
+                print(f"   {name_a}[{i}] ~ {name_b}[{j}]: {similarity:.3f}")
+        
         if not duplicates:
             print("✅ Không tìm thấy duplicate nào!")
             return
@@ -406,6 +472,35 @@ class FaceRecognitionApp:
         
         print(f"\n🎉 Hoàn thành! Đã xóa {total_removed} ảnh duplicate")
     
+    def bulk_enroll(self, root=None):
+        """Enroll hàng loạt từ thư mục <root>/<person>/*.jpg"""
+        print("\n📂 ENROLL HÀNG LOẠT TỪ THƯ MỤC")
+        print("-" * 30)
+        
+        if root is None:
+            root = normalize_path(input("Nhập đường dẫn thư mục (mỗi người một thư mục con): "))
+        if not root or not os.path.isdir(root):
+            print(f"❌ [FILE] Thư mục không tồn tại: {root}")
+            return
+        
+        def progress(done, total):
+            if done % 500 == 0 or done == total:
+                print(f"   ⏳ {done}/{total} ảnh")
+        
+        enroller = BulkEnroller(self.detector, self.gallery_manager)
+        report = enroller.enroll_folder(root, progress=progress)
+        
+        print(f"\n✅ Đã enroll {report['enrolled']}/{report['images']} ảnh cho {report['people']} người")
+        print(f"⏱️  {report['seconds']:.1f}s ({report['images_per_s']:.1f} ảnh/s)")
+        if report['skipped']:
+            print("⚠️  Bỏ qua:")
+            for reason, count in report['skipped'].items():
+                print(f"   - {reason}: {count}")
+            for path, reason in report['skipped_files'][:20]:
+                print(f"     {reason}: {path}")
+            if len(report['skipped_files']) > 20:
+                print(f"     ... và {len(report['skipped_files']) - 20} file khác")
+    
     def show_statistics(self):
         """Hiển thị thống kê gallery"""
         print("\n📊 THỐNG KÊ GALLERY")
@@ -435,6 +530,12 @@ class FaceRecognitionApp:
         duplicates = self.gallery_manager.find_duplicates(threshold=DUPLICATE_THRESHOLD)
         dup_count = sum(len(dup_list) for dup_list in duplicates.values())
         print(f"🔄 Duplicate pairs:   {dup_count}")
+        
+        cache = self.detector.embedding_cache
+        if cache is not None:
+            stats = cache.summary()
+            print(f"🗃️  Cache embedding:   {stats['entries']} ảnh, hit {stats['hits']}/{stats['hits'] + stats['misses']} "
+                  f"({stats['hit_rate']:.0%}), evicted {stats['evictions']}")
     
     def interactive_menu(self):
         """Menu tương tác chính"""
@@ -443,7 +544,7 @@ class FaceRecognitionApp:
         while True:
             try:
                 self._show_menu()
-                choice = input("\n👆 Chọn chức năng (0-8): ").strip()
+                choice = input("\n👆 Chọn chức năng (0-9): ").strip()
 
                 if choice == "1":
                     self.add_person_via_camera()
@@ -461,11 +562,13 @@ class FaceRecognitionApp:
                     self.find_and_remove_duplicates()
                 elif choice == "8":
                     self.show_statistics()
+                elif choice == "9":
+                    self.bulk_enroll()
                 elif choice == "0":
                     print("\n👋 Cảm ơn bạn đã sử dụng Face Recognition System!")
                     break
                 else:
-                    print("❌ Lựa chọn không hợp lệ! Vui lòng chọn từ 0-8")
+                    print("❌ Lựa chọn không hợp lệ! Vui lòng chọn từ 0-9")
 
                 # Hiển thị trạng thái sau mỗi thao tác
                 if choice in ["1", "2", "6", "7"]:
@@ -485,10 +588,20 @@ def main():
     """Entry point chính với command line arguments"""
     parser = argparse.ArgumentParser(description='Face Recognition System')
     parser.add_argument('--mode', type=str, default='menu',
-                        choices=['menu', 'webcam', 'image'],
-                        help='Mode to run: menu (interactive), webcam (realtime), image (demo)')
+                        choices=['menu', 'webcam', 'multicam', 'image', 'video', 'enroll', 'serve'],
+                        help='Mode to run: menu (interactive), webcam (realtime), multicam (several sources), '
+                             'image (demo), video (recorded file), enroll (bulk folder), serve (HTTP recognition service)')
     parser.add_argument('--input', type=str, default=None,
-                        help='Path to input image file (for image mode)')
+                        help='Path to input image file or folder (image mode), video file (video mode) '
+                             'or <root>/<person>/ folder (enroll mode)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Timeline JSONL path (video mode, default <input>_timeline.jsonl)')
+    parser.add_argument('--sample-fps', type=float, default=VIDEO_SAMPLE_FPS,
+                        help='Frames sampled per second of video (video mode, 0 = every frame)')
+    parser.add_argument('--sources', type=str, nargs='+', default=['0'],
+                        help='Camera indices, stream URLs or video files (multicam mode)')
+    parser.add_argument('--host', type=str, default=SERVE_HOST, help='Listen address (serve mode)')
+    parser.add_argument('--port', type=int, default=SERVE_PORT, help='Listen port (serve mode)')
     
     args = parser.parse_args()
     
@@ -499,6 +612,8 @@ def main():
             app.interactive_menu()
         elif args.mode == 'webcam':
             app.realtime_recognition()
+        elif args.mode == 'multicam':
+            app.multi_camera_recognition(args.sources)
         elif args.mode == 'image':
             if args.input:
                 # Quick image recognition với path normalization
@@ -508,11 +623,26 @@ def main():
                     if normalized_input != args.input:
                         print(f"📁 Đã thử chuẩn hóa thành: {normalized_input}")
                     return
+                if os.path.isdir(normalized_input):
+                    app.recognize_folder(normalized_input)
+                    return
 
                 from demos.image_demo import recognize_from_source
                 recognize_from_source(normalized_input, app.detector, app.recognizer)
             else:
                 app.recognize_from_image()
+        elif args.mode == 'video':
+            video_path = normalize_path(args.input) if args.input else None
+            if not video_path or not os.path.isfile(video_path):
+                print(f"❌ [FILE] File video không tồn tại: {args.input}")
+                return
+            app.process_video(video_path, args.output, args.sample_fps)
+        elif args.mode == 'enroll':
+            app.bulk_enroll(normalize_path(args.input) if args.input else None)
+            app.gallery_manager.close()
+        elif args.mode == 'serve':
+            serve(app.detector, app.recognizer, host=args.host, port=args.port)
+            app.gallery_manager.close()
         else:
             print(f"❌ [MODE] Unknown mode: {args.mode}")
 
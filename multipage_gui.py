@@ -14,6 +14,7 @@ import sys
 from face_core.detector import FaceDetector
 from face_core.gallery import FaceGalleryManager
 from face_core.recognizer import FaceRecognizer
+from face_core.enrollment import BulkEnroller, scan_enroll_folder
 from demos.image_demo import recognize_from_source
 from demos.add_person_camera import smart_add_person_camera
 from demos.webcam_realtime_demo import webcam_realtime_demo
@@ -420,6 +421,7 @@ class MultiPageFaceRecognitionApp:
         actions = [
             ("👤 Add Person (Image)", self.add_person_image, "#2fa572"),
             ("🤖 Add Person (Camera)", self.add_person_camera, "#ff6b35"),
+            ("📂 Enroll Folder", self.enroll_folder, "#3b8ed0"),
             ("🔄 Initialize Sample", self.init_sample_gallery, "#5c6c7c"),
             ("❌ Remove Person", self.remove_person, "#e74c3c")
         ]
@@ -672,7 +674,11 @@ class MultiPageFaceRecognitionApp:
     def start_webcam(self):
         """Khởi động webcam"""
         try:
-            threading.Thread(target=webcam_realtime_demo).start()
+            threading.Thread(target=webcam_realtime_demo, kwargs={
+                'detector': self.detector,
+                'gallery_manager': self.gallery_manager,
+                'recognizer': self.recognizer,
+            }).start()
             messagebox.showinfo("Webcam", "Webcam window opened separately")
         except Exception as e:
             messagebox.showerror("Error", f"Cannot start webcam: {e}")
@@ -710,7 +716,8 @@ class MultiPageFaceRecognitionApp:
     def _add_person_camera_thread(self):
         """Background runner for smart_add_person_camera that refreshes gallery after finish"""
         try:
-            summary = smart_add_person_camera()
+            summary = smart_add_person_camera(detector=self.detector, gallery_manager=self.gallery_manager,
+                                              recognizer=self.recognizer)
             if isinstance(summary, dict):
                 cc = summary.get('capture_count', 0)
                 ug = len(summary.get('unknown_groups', []))
@@ -802,13 +809,12 @@ class MultiPageFaceRecognitionApp:
                                 return
                             added = 0
                             for img in group.get('images', []):
-                                success, msg = self.gallery_manager.add_person(name, image=img)
+                                success, msg = self.gallery_manager.add_person(name, image=img, color_order='rgb')
                                 if success:
                                     added += 1
                             status_label.configure(text=f"Đã thêm {added} ảnh cho {name}", text_color="#2fa572")
                             try:
-                                self.gallery_manager = FaceGalleryManager(self.detector)
-                                self.recognizer = FaceRecognizer(self.detector, self.gallery_manager)
+                                self.gallery_manager.reload_gallery()
                             except Exception:
                                 pass
                         return save_one
@@ -829,13 +835,12 @@ class MultiPageFaceRecognitionApp:
                         continue
                     added = 0
                     for img in grp.get('images', []):
-                        success, msg = self.gallery_manager.add_person(name, image=img)
+                        success, msg = self.gallery_manager.add_person(name, image=img, color_order='rgb')
                         if success:
                             added += 1
                     status_lbl.configure(text=f"Đã thêm {added} ảnh cho {name}", text_color="#2fa572")
                 try:
-                    self.gallery_manager = FaceGalleryManager(self.detector)
-                    self.recognizer = FaceRecognizer(self.detector, self.gallery_manager)
+                    self.gallery_manager.reload_gallery()
                 except Exception:
                     pass
                 try:
@@ -856,18 +861,27 @@ class MultiPageFaceRecognitionApp:
         result = messagebox.askyesno("Confirm", "Initialize sample gallery?")
         if result:
             try:
-                self.init_sample_gallery_local()
+                if self.init_sample_gallery_local():
+                    return  # Enroll chạy nền, báo cáo hiển thị khi xong
                 messagebox.showinfo("Success", "Sample gallery initialized")
                 self.refresh_gallery_view()
             except Exception as e:
                 messagebox.showerror("Error", f"Cannot initialize gallery: {e}")
     
     def init_sample_gallery_local(self):
-        """Initialize sample gallery với sample images"""
+        """Initialize sample gallery với sample images
+
+        Trả về True nếu đã bắt đầu enroll thư mục mẫu ở nền.
+        """
         # Tạo sample data directory nếu chưa có
         sample_dir = "sample_images"
         if not os.path.exists(sample_dir):
             os.makedirs(sample_dir)
+        
+        # Đã có ảnh theo từng người -> enroll luôn cả thư mục
+        if scan_enroll_folder(sample_dir):
+            self._start_bulk_enroll(sample_dir)
+            return True
             
         # Thông báo cho user thêm images vào folder
         messagebox.showinfo(
@@ -878,6 +892,40 @@ class MultiPageFaceRecognitionApp:
             "- sample_images/person2/image2.jpg\n\n"
             "Sample gallery structure created!"
         )
+        return False
+    
+    def enroll_folder(self):
+        """Enroll hàng loạt từ thư mục <root>/<person>/*.jpg (chạy nền)"""
+        root = filedialog.askdirectory(title="Select folder (one subfolder per person)")
+        if not root:
+            return
+        self._start_bulk_enroll(root)
+    
+    def _start_bulk_enroll(self, root):
+        """Enroll `root` trong thread nền, báo cáo/lỗi được hiển thị trên main thread của Tk"""
+        def worker():
+            try:
+                report = self._run_bulk_enroll(root)
+                self.root.after(0, lambda: (self._show_enroll_report(report), self.refresh_gallery_view()))
+            except Exception as e:
+                # `e` bị xóa khi ra khỏi khối except: giữ message cho callback
+                msg = str(e)
+                self.root.after(0, lambda msg=msg: messagebox.showerror("Error", f"Cannot enroll folder: {msg}"))
+        
+        threading.Thread(target=worker, daemon=True).start()
+    
+    def _run_bulk_enroll(self, root):
+        enroller = BulkEnroller(self.detector, self.gallery_manager)
+        return enroller.enroll_folder(root)
+    
+    def _show_enroll_report(self, report):
+        lines = [
+            f"Enrolled {report['enrolled']}/{report['images']} images for {report['people']} people",
+            f"{report['seconds']:.1f}s ({report['images_per_s']:.1f} images/s)",
+        ]
+        for reason, count in report['skipped'].items():
+            lines.append(f"Skipped ({reason}): {count}")
+        messagebox.showinfo("Bulk Enroll", "\n".join(lines))
     
     def remove_person(self):
         """Xóa người"""
@@ -902,10 +950,8 @@ class MultiPageFaceRecognitionApp:
         
         # Reload gallery manager from disk to ensure fresh data
         try:
-            # Recreate gallery manager so it reloads saved data
-            self.gallery_manager = FaceGalleryManager(self.detector)
-            # Recreate recognizer so it picks up updated gallery embeddings
-            self.recognizer = FaceRecognizer(self.detector, self.gallery_manager)
+            # Reload in place: recognizer and webcam threads share this manager
+            self.gallery_manager.reload_gallery()
         except Exception:
             pass
 
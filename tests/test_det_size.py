@@ -0,0 +1,58 @@
+import numpy as np
+from face_core.det_size import DetSizeSelector
+
+FRAME = (480, 640, 3)
+
+
+class StubFace:
+    def __init__(self, side):
+        self.bbox = np.array([10, 10, 10 + side, 10 + side * 1.2], dtype=np.float32)
+
+
+def step(selector, *sides):
+    """Một frame: chọn kích thước rồi ghi nhận các khuôn mặt detect được"""
+    size = selector.select(FRAME)[0]
+    selector.observe([StubFace(side) for side in sides])
+    return size
+
+
+def test_fixed_mode():
+    selector = DetSizeSelector(mode=480, choices=(320, 480, 640))
+    assert [step(selector, 5) for _ in range(3)] == [480] * 3
+    assert selector.summary() == {480: 3}
+
+
+def test_auto_picks_smallest_size_that_keeps_faces_visible():
+    selector = DetSizeSelector(mode='auto', choices=(640, 320, 480), min_face_pixels=20, window=1,
+                               full_sweep_interval=0)
+    # Chưa thấy khuôn mặt nào: dùng kích thước lớn nhất
+    assert step(selector) == 640
+    assert step(selector, 100) == 640
+    # Mặt 100 px -> 50 px ở 320; mặt 30 px cần 480 (22.5 px); mặt 20 px cần 640
+    assert step(selector, 30, 100) == 320
+    assert step(selector, 20) == 480
+    assert step(selector, 5) == 640
+    # Mặt quá nhỏ cho mọi kích thước: vẫn dùng lớn nhất
+    assert step(selector) == 640
+
+
+def test_window_holds_larger_size_until_small_face_expires():
+    selector = DetSizeSelector(mode='auto', choices=(320, 480, 640), min_face_pixels=20, window=3,
+                               full_sweep_interval=0)
+    step(selector, 100)
+    assert step(selector, 30) == 320
+    # Khuôn mặt nhỏ còn trong cửa sổ 3 lần detect: không quay lại 320 ngay
+    sizes = [step(selector, 100) for _ in range(4)]
+    assert sizes == [480, 480, 480, 320]
+    # Frame không có mặt không xóa khuôn mặt còn trong cửa sổ
+    step(selector, 30)
+    assert [step(selector) for _ in range(4)] == [480, 480, 480, 640]
+
+
+def test_full_sweep_interval():
+    selector = DetSizeSelector(mode='auto', choices=(320, 480, 640), min_face_pixels=20, window=1,
+                               full_sweep_interval=4)
+    sizes = [step(selector, 100) for _ in range(9)]
+    # Lần đầu chưa có khuôn mặt, sau đó cứ 4 lần detect quét một lần ở 640
+    assert sizes == [640, 320, 320, 640, 320, 320, 320, 640, 320]
+    assert selector.summary() == {320: 6, 640: 3}
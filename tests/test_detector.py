@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("insightface")
+import face_core.detector as detector_module
+from face_core.detector import FaceDetector
+
+BBOX = np.array([[4.0, 6.0, 36.0, 44.0, 0.99]], dtype=np.float32)
+KPS = np.array([[[12, 20], [28, 20], [20, 28], [14, 36], [26, 36]]], dtype=np.float32)
+EMBEDDING = np.arange(512, dtype=np.float32)
+
+
+class StubDetModel:
+    """Model detection giả: ghi lại ảnh nhận được, trả về một bbox cố định"""
+
+    def __init__(self):
+        self.images = []
+        self.input_sizes = []
+
+    def detect(self, image, input_size=None, max_num=0, metric='default'):
+        self.images.append(image)
+        self.input_sizes.append(input_size)
+        return BBOX.copy(), KPS.copy()
+
+
+class StubRecModel:
+    def __init__(self):
+        self.images = []
+
+    def get(self, image, face):
+        self.images.append(image)
+        face.embedding = EMBEDDING.copy()
+        return face.embedding
+
+
+class StubFaceAnalysis:
+    def __init__(self):
+        self.det_model = StubDetModel()
+        self.models = {'detection': self.det_model, 'recognition': StubRecModel()}
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    app = StubFaceAnalysis()
+    monkeypatch.setattr(detector_module, 'get_face_analysis', lambda *args, **kwargs: app)
+    detector = FaceDetector()
+    detector.use_cache = False
+    return detector
+
+
+@pytest.fixture
+def cvt_calls(monkeypatch):
+    """Đếm số lần chuyển màu trong detector"""
+    calls = []
+    original = cv2.cvtColor
+
+    def counting_cvt(*args, **kwargs):
+        calls.append(args[1])
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(detector_module.cv2, 'cvtColor', counting_cvt)
+    return calls
+
+
+def bgr_image():
+    image = np.zeros((48, 40, 3), dtype=np.uint8)
+    image[..., 0], image[..., 1], image[..., 2] = 10, 20, 30  # B, G, R
+    return image
+
+
+def model_channels(detector):
+    received = detector.detector.det_model.images[-1]
+    return received[0, 0].tolist()
+
+
+def assert_faces_unchanged(faces):
+    assert len(faces) == 1
+    np.testing.assert_array_equal(faces[0].bbox, BBOX[0, :4])
+    np.testing.assert_array_equal(faces[0].kps, KPS[0])
+    np.testing.assert_array_equal(faces[0].embedding, EMBEDDING)
+
+
+@pytest.mark.parametrize('model_order, expected', [('rgb', [30, 20, 10]), ('bgr', [10, 20, 30])])
+def test_bgr_input(detector, cvt_calls, monkeypatch, model_order, expected):
+    monkeypatch.setattr(detector_module, 'MODEL_COLOR_ORDER', model_order)
+    image = bgr_image()
+    model_image, faces = detector.detect_faces(image)
+
+    assert model_channels(detector) == expected
+    assert len(cvt_calls) == (1 if model_order == 'rgb' else 0)
+    # Model recognition nhận cùng ảnh với model detection
+    assert detector.detector.models['recognition'].images[-1] is model_image
+    assert image[0, 0].tolist() == [10, 20, 30]  # Ảnh của caller không bị sửa
+    assert_faces_unchanged(faces)
+
+
+@pytest.mark.parametrize('model_order, expected', [('rgb', [30, 20, 10]), ('bgr', [10, 20, 30])])
+def test_rgb_flagged_input(detector, cvt_calls, monkeypatch, model_order, expected):
+    monkeypatch.setattr(detector_module, 'MODEL_COLOR_ORDER', model_order)
+    rgb = np.ascontiguousarray(bgr_image()[..., ::-1])
+    model_image, faces = detector.detect_faces(rgb, color_order='rgb')
+
+    assert model_channels(detector) == expected
+    assert len(cvt_calls) == (0 if model_order == 'rgb' else 1)
+    if model_order == 'rgb':
+        assert model_image is rgb
+    assert_faces_unchanged(faces)
+
+
+def test_bgr_and_rgb_input_give_same_result(detector, monkeypatch):
+    monkeypatch.setattr(detector_module, 'MODEL_COLOR_ORDER', 'rgb')
+    image = bgr_image()
+    _, faces_bgr = detector.detect_faces(image)
+    _, faces_rgb = detector.detect_faces(np.ascontiguousarray(image[..., ::-1]), color_order='rgb')
+    first, second = detector.detector.det_model.images[-2:]
+    np.testing.assert_array_equal(first, second)
+    np.testing.assert_array_equal(faces_bgr[0].embedding, faces_rgb[0].embedding)
+
+
+def test_return_rgb_and_out_buffer(detector, cvt_calls, monkeypatch):
+    monkeypatch.setattr(detector_module, 'MODEL_COLOR_ORDER', 'rgb')
+    image = bgr_image()
+    out = np.empty_like(image)
+    model_image, _ = detector.detect_faces(image, out=out)
+    assert model_image is out
+    # Model đã nhận RGB: ảnh hiển thị là chính ảnh đó, không chuyển màu lần hai
+    display, _ = detector.detect_faces(image, return_rgb=True, out=out)
+    assert display[0, 0].tolist() == [30, 20, 10]
+    assert len(cvt_calls) == 2
+
+
+def test_roi_fallback_uses_requested_det_size(detector):
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    det_model = detector.detector.det_model
+    # ROI nhỏ: detect trên mosaic ở kích thước của mosaic
+    detector.detect_faces(image, embed=False, det_size=(320, 320), rois=[[300, 200, 340, 250]])
+    assert det_model.images[-1].shape[:2] != image.shape[:2]
+    assert 'detection_roi' in detector.module_times
+    # ROI phủ gần hết frame: detect toàn frame với det_size được truyền vào
+    detector.detect_faces(image, embed=False, det_size=(320, 320), rois=[[50, 50, 600, 450]])
+    assert det_model.images[-1].shape[:2] == image.shape[:2]
+    assert det_model.input_sizes[-1] == (320, 320)
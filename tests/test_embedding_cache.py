@@ -0,0 +1,52 @@
+import numpy as np
+from face_core.embedding_cache import EmbeddingCache, EMBEDDING_DIM
+
+
+def face_result(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.random((count, 4), dtype=np.float32), rng.random(count, dtype=np.float32),
+            rng.random((count, 5, 2), dtype=np.float32), rng.random((count, EMBEDDING_DIM), dtype=np.float32))
+
+
+def test_put_get_round_trip(tmp_path):
+    cache = EmbeddingCache('model-a', path=str(tmp_path / 'cache.sqlite'))
+    key = EmbeddingCache.content_key(b'image bytes')
+    assert cache.get(key) is None
+    stored = face_result(2)
+    cache.put(key, *stored)
+    for expected, loaded in zip(stored, cache.get(key)):
+        np.testing.assert_array_equal(loaded, expected)
+
+    # Ảnh không có khuôn mặt cũng được cache
+    empty = EmbeddingCache.content_key(b'no face')
+    cache.put(empty, np.empty((0, 4)), np.empty(0), None, np.empty((0, EMBEDDING_DIM)))
+    bboxes, _, kps, embeddings = cache.get(empty)
+    assert len(bboxes) == 0 and kps is None and embeddings.shape == (0, EMBEDDING_DIM)
+    assert cache.summary()['hits'] == 2 and cache.summary()['misses'] == 1
+    cache.close()
+
+
+def test_signature_change_invalidates(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    cache = EmbeddingCache('model-a', path=path)
+    cache.put('k', *face_result(1))
+    cache.close()
+
+    cache = EmbeddingCache('model-a', path=path)
+    assert cache.invalidated == 0 and cache.get('k') is not None
+    cache.close()
+    cache = EmbeddingCache('model-b', path=path)
+    assert cache.invalidated == 1 and cache.get('k') is None
+    cache.close()
+
+
+def test_lru_eviction(tmp_path):
+    cache = EmbeddingCache('model-a', path=str(tmp_path / 'cache.sqlite'), max_entries=2)
+    cache.put('a', *face_result(1))
+    cache.put('b', *face_result(1))
+    cache.get('a')
+    cache.put('c', *face_result(1))
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.summary()['entries'] == 2 and cache.summary()['evictions'] == 1
+    cache.close()
@@ -0,0 +1,89 @@
+import os
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+from face_core.enrollment import BulkEnroller, scan_enroll_folder
+from face_core.gallery import FaceGalleryManager
+
+DIM = 512
+
+
+class StubFace:
+    def __init__(self, value, det_score):
+        self.value = value
+        self.det_score = det_score
+
+
+class StubDetector:
+    """Ảnh có giá trị pixel v: v = 0 không có mặt, còn lại có hai mặt (mặt rõ hơn mang giá trị v)"""
+
+    def __init__(self):
+        self.embed_batches = []
+
+    def detect_faces(self, image, embed=False):
+        value = int(image[0, 0, 0])
+        if value == 0:
+            return image, []
+        return image, [StubFace(255 - value, 0.3), StubFace(value, 0.9)]
+
+    def align_face(self, model_image, face):
+        return face.value
+
+    def embed_crops(self, crops):
+        self.embed_batches.append(len(crops))
+        # Embedding one-hot theo giá trị ảnh: cùng giá trị = trùng lặp
+        return np.eye(DIM, dtype=np.float32)[list(crops)]
+
+
+def write_image(path, value):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    cv2.imwrite(str(path), np.full((8, 8, 3), value, dtype=np.uint8))
+
+
+def test_scan_layout_and_skip_rules(tmp_path):
+    write_image(tmp_path / 'bob' / 'b.png', 1)
+    write_image(tmp_path / 'alice' / 'B.JPG', 1)
+    write_image(tmp_path / 'alice' / 'a.jpeg', 1)
+    (tmp_path / 'alice' / 'notes.txt').write_text('x')
+    (tmp_path / 'alice' / 'noext').write_bytes(b'x')
+    # Ảnh ở gốc và trong thư mục con lồng nhau không thuộc người nào
+    write_image(tmp_path / 'root.png', 1)
+    write_image(tmp_path / 'alice' / 'nested' / 'c.png', 1)
+    (tmp_path / 'empty').mkdir()
+
+    items = scan_enroll_folder(str(tmp_path))
+    assert items == [(person, os.path.join(str(tmp_path), person, name))
+                     for person, name in [('alice', 'B.JPG'), ('alice', 'a.jpeg'), ('bob', 'b.png')]]
+
+
+@pytest.mark.parametrize('workers, batch_size', [(1, 1), (3, 2), (8, 32)])
+def test_enroll_folder_report(tmp_path, workers, batch_size):
+    root = tmp_path / 'faces'
+    write_image(root / 'alice' / '1.png', 10)
+    write_image(root / 'alice' / '2.png', 10)  # trùng ảnh 1
+    write_image(root / 'alice' / '3.png', 20)
+    write_image(root / 'bob' / '1.png', 30)
+    write_image(root / 'bob' / '2.png', 0)  # không có mặt
+    (root / 'bob' / '3.jpg').write_bytes(b'not an image')
+    write_image(root / 'carol' / '1.png', 0)
+
+    detector = StubDetector()
+    manager = FaceGalleryManager(detector, str(tmp_path / 'gallery'), journal=False)
+    enroller = BulkEnroller(detector, manager, workers=workers, batch_size=batch_size, processes=0)
+    progress = []
+    report = enroller.enroll_folder(str(root), progress=lambda done, total: progress.append((done, total)))
+
+    assert progress == [(done, 7) for done in range(1, 8)]
+    assert (report['images'], report['people'], report['enrolled']) == (7, 2, 3)
+    assert report['skipped'] == {'decode_failed': 1, 'no_face': 2, 'duplicate': 1}
+    assert sorted(report['skipped_files']) == sorted([
+        (str(root / 'bob' / '3.jpg'), 'decode_failed'),
+        (str(root / 'bob' / '2.png'), 'no_face'),
+        (str(root / 'carol' / '1.png'), 'no_face'),
+    ])
+    # Mỗi batch recognition tối đa batch_size khuôn mặt, chỉ mặt có det_score cao nhất
+    assert sum(detector.embed_batches) == 4
+    assert max(detector.embed_batches) <= batch_size
+    assert manager.get_person_count() == {'alice': 2, 'bob': 1}
+    assert np.argmax(manager.gallery['bob'][0]) == 30
@@ -0,0 +1,208 @@
+import numpy as np
+import pytest
+from face_core.gallery import FaceGalleryManager
+
+DIM = 512
+
+
+def unit_vectors(count, seed=0):
+    rows = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+class StubDetector:
+    """Detector giả: "ảnh" truyền vào chính là embedding cần trả về"""
+
+    def get_face_embedding(self, image, color_order='bgr', face=None):
+        return None if image is None else np.asarray(image, dtype=np.float32)
+
+
+@pytest.fixture
+def open_manager(tmp_path):
+    """Mở FaceGalleryManager trên cùng một thư mục store; đóng hết khi kết thúc test"""
+    managers = []
+
+    def factory(**kwargs):
+        manager = FaceGalleryManager(StubDetector(), str(tmp_path / 'gallery'), **kwargs)
+        managers.append(manager)
+        return manager
+
+    yield factory
+    for manager in managers:
+        manager.close()
+
+
+def assert_same_gallery(actual, expected):
+    assert list(actual) == list(expected)
+    for name in expected:
+        np.testing.assert_array_equal(actual[name], expected[name])
+
+
+def populate(manager):
+    alice, bob = unit_vectors(3), unit_vectors(2, 1)
+    assert manager.add_embeddings('alice', alice[:2])[0]
+    assert manager.add_person('bob', image=bob[0])[0]
+    assert manager.add_person('alice', image=alice[2])[0]
+    assert manager.add_embeddings('bob', bob[1:])[0]
+    assert manager.add_embeddings('carol', unit_vectors(1, 2))[0]
+    assert manager.remove_duplicate('alice', 0)[0]
+    assert manager.remove_person('carol')[0]
+    return {'alice': alice[1:], 'bob': bob}
+
+
+def test_journal_replay_on_reopen(open_manager):
+    manager = open_manager()
+    expected = populate(manager)
+    assert manager._dirty
+    assert_same_gallery(manager.gallery, expected)
+    # Instance khác mở trước khi compact: snapshot chưa có, trạng thái dựng lại từ journal
+    assert not manager.store.exists()
+    assert_same_gallery(open_manager().gallery, expected)
+
+
+def test_close_compacts_and_reopen_is_equal(open_manager):
+    manager = open_manager()
+    expected = populate(manager)
+    manager.close()
+    assert not manager._dirty
+    assert manager.store.exists()
+    # Journal đã được gộp: chỉ còn thế hệ mới (rỗng)
+    assert list(manager.journal.records(manager.store.journal_generation())) == []
+    assert_same_gallery(open_manager().gallery, expected)
+
+
+def test_crash_between_rotate_and_write_keeps_changes(open_manager, monkeypatch):
+    manager = open_manager()
+    expected = populate(manager)
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(manager.store, 'write', crash)
+    with pytest.raises(OSError):
+        manager.compact()
+    # Journal đã xoay nhưng snapshot chưa ghi: cờ vẫn bật để lần compact sau thử lại
+    assert manager._dirty
+    assert len(manager.journal.generations()) == 2
+    assert_same_gallery(open_manager().gallery, expected)
+
+    monkeypatch.undo()
+    manager.close()
+    assert not manager._dirty
+    assert_same_gallery(open_manager().gallery, expected)
+
+
+def clustered(count, seed):
+    """Embedding quanh 3 tâm chung cho mọi người: có cặp gần trùng trong và giữa các người"""
+    centers = unit_vectors(3)
+    rows = centers[np.arange(count) % 3] + 0.15 * unit_vectors(count, seed)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+@pytest.fixture
+def clustered_manager(open_manager):
+    manager = open_manager(journal=False)
+    groups = {'alice': clustered(7, 1), 'bob': clustered(5, 2), 'carol': clustered(1, 3)}
+    # Threshold > 1: giữ mọi embedding để kiểm tra riêng phần tìm trùng
+    manager.add_embeddings_many(groups, similarity_threshold=2.0)
+    return manager, groups
+
+
+@pytest.mark.parametrize('chunk_size', [None, 2, 3, 64])
+def test_find_duplicates_matches_naive_loop(clustered_manager, chunk_size):
+    manager, groups = clustered_manager
+    expected = {}
+    for name, block in groups.items():
+        pairs = [(i, j, float(block[i] @ block[j]))
+                 for i in range(len(block)) for j in range(i + 1, len(block))
+                 if block[i] @ block[j] >= 0.9]
+        if pairs:
+            expected[name] = pairs
+    assert expected
+    found = manager.find_duplicates(threshold=0.9, chunk_size=chunk_size)
+    assert list(found) == list(expected)
+    for name, pairs in expected.items():
+        assert [(i, j) for i, j, _ in found[name]] == [(i, j) for i, j, _ in pairs]
+        np.testing.assert_allclose([s for *_, s in found[name]], [s for *_, s in pairs], rtol=1e-5)
+
+
+@pytest.mark.parametrize('chunk_size', [None, 2, 5, 64])
+def test_find_cross_duplicates_matches_naive_loop(clustered_manager, chunk_size):
+    manager, groups = clustered_manager
+    rows = [(name, i, embedding) for name, block in groups.items() for i, embedding in enumerate(block)]
+    expected = [(a, i, b, j, float(x @ y))
+                for k, (a, i, x) in enumerate(rows) for b, j, y in rows[k + 1:]
+                if a != b and x @ y >= 0.9]
+    assert expected
+    found = manager.find_cross_duplicates(threshold=0.9, chunk_size=chunk_size)
+    assert [pair[:4] for pair in found] == [pair[:4] for pair in expected]
+    np.testing.assert_allclose([pair[4] for pair in found], [pair[4] for pair in expected], rtol=1e-5)
+
+
+def test_duplicate_threshold_is_inclusive(open_manager):
+    manager = open_manager(journal=False)
+    block = np.zeros((3, DIM), dtype=np.float32)
+    block[0, 0] = 1.0
+    block[1, [0, 1]] = [0.6, 0.8]
+    block[2, [0, 2]] = [0.6, 0.8]
+    # alice 0-1 và alice 0 - bob 0 có similarity đúng bằng threshold
+    manager.add_embeddings_many({'alice': block[[0, 2]], 'bob': block[1:2]}, similarity_threshold=2.0)
+    threshold = float(block[0] @ block[1])
+    assert manager.find_duplicates(threshold=threshold) == {'alice': [(0, 1, threshold)]}
+    assert manager.find_cross_duplicates(threshold=threshold) == [('alice', 0, 'bob', 0, threshold)]
+    assert manager.find_cross_duplicates(threshold=np.nextafter(threshold, 1.0)) == []
+
+
+def near(embedding, seed, noise=0.05):
+    """Embedding gần trùng (similarity ~0.999 với `embedding`)"""
+    row = embedding + noise * unit_vectors(1, seed)[0]
+    return row / np.linalg.norm(row)
+
+
+def test_add_embeddings_rejects_near_duplicate_of_stored(open_manager):
+    manager = open_manager()
+    stored = unit_vectors(2)
+    assert manager.add_embeddings('alice', stored)[0]
+    fresh = unit_vectors(1, 1)[0]
+    success, _ = manager.add_embeddings('alice', [near(stored[1], 5), fresh], similarity_threshold=0.9)
+    assert success
+    np.testing.assert_array_equal(manager.gallery['alice'], np.vstack([stored, fresh]))
+    # Chỉ còn ảnh trùng: không ghi gì
+    success, _ = manager.add_embeddings('alice', near(stored[0], 6), similarity_threshold=0.9)
+    assert not success and len(manager.gallery['alice']) == 3
+    # Ngưỡng chỉ áp dụng trong cùng một người
+    assert manager.add_embeddings('bob', near(stored[0], 6), similarity_threshold=0.9)[0]
+
+
+def test_add_embeddings_drops_duplicates_within_batch(open_manager):
+    manager = open_manager()
+    a, b = unit_vectors(2)
+    batch = np.vstack([a, near(a, 1), b, near(a, 2), near(b, 3)])
+    manager.add_embeddings('alice', batch, similarity_threshold=0.9)
+    # Giữ ảnh đầu tiên của mỗi nhóm trùng, giống thêm lần lượt từng ảnh
+    np.testing.assert_array_equal(manager.gallery['alice'], batch[[0, 2]])
+    assert manager._dedup_mask('bob', batch, 0.9).tolist() == [True, False, True, False, False]
+    assert manager._dedup_mask('alice', batch, 0.9).tolist() == [False] * 5
+
+
+def test_add_embeddings_many_matches_sequential_adds(open_manager, tmp_path):
+    manager = open_manager()
+    a, b, c = unit_vectors(3)
+    assert manager.add_embeddings('alice', a)[0]
+    groups = {
+        'alice': np.vstack([near(a, 1), b]),
+        'bob': np.vstack([b, near(b, 2), c]),
+        'carol': near(c, 3),
+        'dave': np.vstack([near(a, 4), near(a, 5)]),
+    }
+    report = manager.add_embeddings_many(groups, similarity_threshold=0.9)
+    assert report == {'alice': (1, 1), 'bob': (2, 1), 'carol': (1, 0), 'dave': (1, 1)}
+
+    sequential = FaceGalleryManager(StubDetector(), str(tmp_path / 'sequential'), journal=False)
+    sequential.add_embeddings('alice', a)
+    for name, embeddings in groups.items():
+        sequential.add_embeddings(name, embeddings, similarity_threshold=0.9)
+    assert_same_gallery(manager.gallery, sequential.gallery)
+    # Một lần append journal cho cả batch, replay lại đúng trạng thái
+    assert_same_gallery(open_manager().gallery, sequential.gallery)
+    assert manager.add_embeddings_many({'alice': a}, similarity_threshold=0.9) == {'alice': (0, 1)}
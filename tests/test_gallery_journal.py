@@ -0,0 +1,150 @@
+import os
+import multiprocessing
+import numpy as np
+import pytest
+from face_core.gallery_journal import GalleryJournal, apply_records, fcntl
+
+DIM = 8
+
+
+def embeddings(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+
+def test_append_records_round_trip(tmp_path):
+    journal = GalleryJournal(str(tmp_path))
+    added = embeddings(3)
+    journal.append('add', 'alice', embeddings=added)
+    journal.append_many([('remove_embedding', 'alice', None, 1), ('remove_person', 'bob', None, None)])
+
+    records = list(journal.records())
+    assert [r['op'] for r in records] == ['add', 'remove_embedding', 'remove_person']
+    np.testing.assert_array_equal(records[0]['embeddings'], added)
+    assert records[1]['index'] == 1
+    assert 'embeddings' not in records[2]
+
+
+def test_apply_records_replays_on_gallery():
+    gallery = {'alice': embeddings(2), 'bob': embeddings(1, 1)}
+    extra = embeddings(2, 2)
+    applied = apply_records(gallery, [
+        {'op': 'add', 'name': 'alice', 'embeddings': extra},
+        {'op': 'remove_embedding', 'name': 'alice', 'index': 0},
+        {'op': 'remove_embedding', 'name': 'alice', 'index': 99},
+        {'op': 'remove_person', 'name': 'bob'},
+        {'op': 'add', 'name': 'carol', 'embeddings': extra[:1]},
+    ])
+    assert applied == 5
+    assert sorted(gallery) == ['alice', 'carol']
+    assert len(gallery['alice']) == 3
+    np.testing.assert_array_equal(np.asarray(gallery['alice'][1:]), extra)
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    journal = GalleryJournal(str(tmp_path))
+    journal.append('add', 'alice', embeddings=embeddings(1))
+    path = journal._file(journal.generations()[-1])
+    valid_size = os.path.getsize(path)
+    # Crash giữa lúc ghi record thứ hai: chỉ một phần record nằm trên đĩa
+    journal.append('add', 'bob', embeddings=embeddings(1, 1))
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - 5)
+
+    assert [r['name'] for r in journal.records()] == ['alice']
+    assert os.path.getsize(path) == valid_size
+    journal.append('add', 'carol', embeddings=embeddings(1, 2))
+    assert [r['name'] for r in journal.records()] == ['alice', 'carol']
+
+
+def test_crc_mismatch_stops_replay(tmp_path):
+    journal = GalleryJournal(str(tmp_path))
+    journal.append('add', 'alice', embeddings=embeddings(1))
+    journal.rotate()
+    journal.append('add', 'bob', embeddings=embeddings(1, 1))
+    path = journal._file(journal.generations()[0])
+    with open(path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+
+    # Record hỏng của thế hệ cũ bị bỏ qua (không cắt file), thế hệ sau vẫn được đọc
+    assert [r['name'] for r in journal.records()] == ['bob']
+
+
+def test_rotate_and_remove_before(tmp_path):
+    journal = GalleryJournal(str(tmp_path))
+    journal.append('add', 'alice', embeddings=embeddings(1))
+    generation = journal.rotate()
+    journal.append('add', 'bob', embeddings=embeddings(1, 1))
+    assert journal.generations() == [0, generation]
+    assert [r['name'] for r in journal.records(stop_generation=generation)] == ['alice']
+    assert [r['name'] for r in journal.records(generation)] == ['bob']
+
+    journal.remove_before(generation)
+    assert journal.generations() == [generation]
+    assert [r['name'] for r in journal.records()] == ['bob']
+
+
+def test_instances_share_locks(tmp_path):
+    first, second = GalleryJournal(str(tmp_path)), GalleryJournal(str(tmp_path))
+    assert first.write_lock is second.write_lock
+    assert first.compaction_lock is second.compaction_lock
+    # compaction_lock là reentrant (compact gọi remove_before khi đang giữ lock)
+    with first.compaction_lock:
+        first.remove_before(0)
+
+
+def _append_worker(path, worker, count):
+    journal = GalleryJournal(path)
+    for i in range(count):
+        journal.append('add', f'worker_{worker}', embeddings=np.full((1, DIM), i, dtype=np.float32))
+        if worker == 0 and i % 10 == 0:
+            journal.rotate()
+
+
+@pytest.mark.skipif(fcntl is None, reason="cần fcntl.flock")
+def test_concurrent_processes_append_without_corruption(tmp_path):
+    path = str(tmp_path)
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_append_worker, args=(path, w, 40)) for w in range(4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    records = list(GalleryJournal(path).records())
+    assert len(records) == 4 * 40
+    for w in range(4):
+        values = [int(r['embeddings'][0, 0]) for r in records if r['name'] == f'worker_{w}']
+        assert values == list(range(40))
+
+
+def _hold_write_lock(path, locked, release):
+    journal = GalleryJournal(path)
+    with journal.write_lock:
+        locked.set()
+        release.wait(30)
+
+
+@pytest.mark.skipif(fcntl is None, reason="cần fcntl.flock")
+def test_write_lock_excludes_other_processes(tmp_path):
+    path = str(tmp_path)
+    context = multiprocessing.get_context('spawn')
+    locked, release = context.Event(), context.Event()
+    holder = context.Process(target=_hold_write_lock, args=(path, locked, release))
+    holder.start()
+    try:
+        assert locked.wait(30)
+        with open(os.path.join(path, 'journal.lock'), 'a+b') as f:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    finally:
+        release.set()
+        holder.join(timeout=30)
+    assert holder.exitcode == 0
+    # Process giữ lock đã thoát: lấy lại được ngay
+    journal = GalleryJournal(path)
+    with journal.write_lock:
+        journal.append('add', 'alice', embeddings=embeddings(1))
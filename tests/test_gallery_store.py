@@ -0,0 +1,74 @@
+import os
+import numpy as np
+from face_core.gallery_store import GalleryStore, NPY_HEADER_SIZE
+
+DIM = 8
+
+
+def random_embeddings(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+
+def test_write_load_round_trip(tmp_path):
+    store = GalleryStore(str(tmp_path / 'gallery'))
+    assert not store.exists()
+    embeddings = random_embeddings(5)
+    store.write(['alice', 'bob'], embeddings, [0, 0, 0, 1, 1], journal_generation=3)
+
+    names, loaded, labels = store.load()
+    assert names == ['alice', 'bob']
+    np.testing.assert_array_equal(loaded, embeddings)
+    assert labels.tolist() == [0, 0, 0, 1, 1]
+    assert isinstance(loaded, np.memmap)
+    assert store.journal_generation() == 3
+    # File .npy vẫn đọc được bằng numpy thông thường
+    np.testing.assert_array_equal(np.load(store._file(store._read_meta(), 'embeddings')), embeddings)
+
+
+def test_append_existing_and_new_person(tmp_path):
+    store = GalleryStore(str(tmp_path / 'gallery'))
+    first, second, third = random_embeddings(2, 1), random_embeddings(1, 2), random_embeddings(3, 3)
+    store.append('alice', first)
+    store.append('bob', second)
+    store.append('alice', third)
+
+    names, loaded, labels = store.load()
+    assert names == ['alice', 'bob']
+    np.testing.assert_array_equal(loaded, np.concatenate([first, second, third]))
+    assert labels.tolist() == [0, 0, 1, 0, 0, 0]
+
+
+def test_partial_append_is_ignored_and_overwritten(tmp_path):
+    store = GalleryStore(str(tmp_path / 'gallery'))
+    embeddings = random_embeddings(2)
+    store.append('alice', embeddings)
+    path = store._file(store._read_meta(), 'embeddings')
+    # Crash giữa chừng: dữ liệu đã ghi vào file nhưng meta chưa cập nhật
+    with open(path, 'ab') as f:
+        f.write(b'\xff' * (DIM * 4 + 3))
+    assert len(store.load()[1]) == 2
+
+    extra = random_embeddings(1, 5)
+    store.append('bob', extra)
+    names, loaded, labels = store.load()
+    np.testing.assert_array_equal(loaded, np.concatenate([embeddings, extra]))
+    assert os.path.getsize(path) == NPY_HEADER_SIZE + 3 * DIM * 4
+
+
+def test_rewrite_switches_generation_and_removes_old_files(tmp_path):
+    store = GalleryStore(str(tmp_path / 'gallery'))
+    store.write(['alice'], random_embeddings(3), [0, 0, 0])
+    store.write(['bob'], random_embeddings(1, 1), [0])
+
+    meta = store._read_meta()
+    assert meta['generation'] == 1
+    assert sorted(f for f in os.listdir(store.path) if f.endswith('.npy')) == ['embeddings.1.npy', 'labels.1.npy']
+    names, loaded, _ = store.load()
+    assert names == ['bob'] and len(loaded) == 1
+
+
+def test_empty_store(tmp_path):
+    store = GalleryStore(str(tmp_path / 'gallery'))
+    store.write([], np.empty((0, DIM), dtype=np.float32), [])
+    names, loaded, labels = store.load()
+    assert names == [] and loaded.shape == (0, DIM) and len(labels) == 0
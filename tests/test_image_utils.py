@@ -0,0 +1,121 @@
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("requests")
+from utils.image_utils import load_bytes_from_url, load_image_from_url, load_images_from_urls
+
+
+def encode_png(value, size=16):
+    ok, data = cv2.imencode('.png', np.full((size, size, 3), value, dtype=np.uint8))
+    assert ok
+    return data.tobytes()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """/img/<v>?delay=<s>, /chunked/<v>, /drip, /big, /big-chunked"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        parts = path.strip('/').split('/')
+        if parts[0] == 'img':
+            if query.startswith('delay='):
+                time.sleep(float(query[len('delay='):]))
+            return self._send(encode_png(int(parts[1])))
+        if parts[0] == 'chunked':
+            return self._send_chunked(encode_png(int(parts[1]), size=300), piece=1000)
+        if parts[0] == 'drip':
+            # Gửi từng byte, mỗi lần cách nhau ngắn hơn read timeout
+            self.send_response(200)
+            self.send_header('Content-Length', '1000')
+            self.end_headers()
+            try:
+                for _ in range(1000):
+                    self.wfile.write(b'x')
+                    self.wfile.flush()
+                    time.sleep(0.05)
+            except OSError:
+                pass
+            return
+        if parts[0] == 'big':
+            return self._send(b'x' * 4096)
+        if parts[0] == 'big-chunked':
+            return self._send_chunked(b'x' * 4096, piece=512)
+        self.send_error(404)
+
+    def _send(self, body):
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunked(self, body, piece):
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for start in range(0, len(body), piece):
+                data = body[start:start + piece]
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ImageHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_and_decode(server_url):
+    data = load_bytes_from_url(f"{server_url}/img/7")
+    assert bytes(data) == encode_png(7)
+    image = load_image_from_url(f"{server_url}/img/7")
+    assert image.shape == (16, 16, 3) and (image == 7).all()
+
+
+def test_chunked_response_without_content_length(server_url):
+    data = load_bytes_from_url(f"{server_url}/chunked/9")
+    assert bytes(data) == encode_png(9, size=300)
+
+
+def test_oversize_is_rejected(server_url):
+    assert load_bytes_from_url(f"{server_url}/big", max_bytes=1024) is None
+    assert load_bytes_from_url(f"{server_url}/big-chunked", max_bytes=1024) is None
+    assert len(load_bytes_from_url(f"{server_url}/big", max_bytes=4096)) == 4096
+
+
+def test_slow_drip_hits_total_deadline(server_url):
+    t0 = time.monotonic()
+    # Mỗi byte tới trước read timeout, chỉ deadline tổng dừng được lần tải
+    assert load_bytes_from_url(f"{server_url}/drip", timeout=(1.0, 1.0), total_timeout=0.5) is None
+    assert time.monotonic() - t0 < 2.0
+
+
+def test_parallel_results_keep_input_order(server_url):
+    values = [10, 20, 30, 40, 50, 60]
+    # URL đầu chậm nhất: hoàn thành sau các URL khác nhưng vẫn đứng đầu kết quả
+    urls = [f"{server_url}/img/{v}?delay={0.05 * (len(values) - i)}" for i, v in enumerate(values)]
+    urls.insert(3, f"{server_url}/missing")
+    images = load_images_from_urls(urls, max_parallel=4)
+    assert images[3] is None
+    del images[3]
+    assert [int(image[0, 0, 0]) for image in images] == values
+    raw = load_images_from_urls(urls[:2], decode=False)
+    assert [bytes(data) for data in raw] == [encode_png(10), encode_png(20)]
+    assert load_images_from_urls([]) == []
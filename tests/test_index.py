@@ -0,0 +1,165 @@
+import numpy as np
+from face_core.index import GalleryIndex, similar_pairs
+
+DIM = 16
+
+
+def unit_vectors(count, seed=0):
+    rows = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def rebuilt(gallery):
+    index = GalleryIndex(DIM)
+    index.rebuild(gallery)
+    return index
+
+
+def assert_matches_rebuild(index, gallery, queries):
+    """Index cập nhật tăng dần phải giống hệt index dựng lại từ dict gallery"""
+    fresh = rebuilt(gallery)
+    assert index.names == fresh.names
+    np.testing.assert_array_equal(index.matrix, fresh.matrix)
+    np.testing.assert_array_equal(index.counts, fresh.counts)
+    np.testing.assert_array_equal(index.offsets, fresh.offsets)
+    np.testing.assert_array_equal(index.row_labels(), fresh.row_labels())
+    np.testing.assert_array_equal(index.best_scores(queries), fresh.best_scores(queries))
+    for name, block in index.as_dict().items():
+        np.testing.assert_array_equal(block, np.asarray(gallery[name]).reshape(-1, DIM))
+
+
+def test_add_to_existing_person_keeps_blocks_contiguous():
+    index = GalleryIndex(DIM)
+    queries = unit_vectors(5, 9)
+    a, b, c = unit_vectors(3, 1), unit_vectors(2, 2), unit_vectors(2, 3)
+    index.add('alice', a[:2])
+    index.add('bob', b)
+    index.add('carol', c[0])
+    # alice không nằm cuối ma trận: dòng mới được chèn vào giữa (np.insert)
+    index.add('alice', a[2])
+    index.add('carol', c[1:])
+    assert_matches_rebuild(index, {'alice': a, 'bob': b, 'carol': c}, queries)
+    assert index.offsets.tolist() == [0, 3, 5]
+
+
+def test_remove_person_and_embedding():
+    a, b, c = unit_vectors(3, 1), unit_vectors(2, 2), unit_vectors(1, 3)
+    queries = unit_vectors(5, 9)
+    index = rebuilt({'alice': a, 'bob': b, 'carol': c})
+    index.remove_embedding('alice', 1)
+    assert_matches_rebuild(index, {'alice': a[[0, 2]], 'bob': b, 'carol': c}, queries)
+    index.remove_person('bob')
+    assert_matches_rebuild(index, {'alice': a[[0, 2]], 'carol': c}, queries)
+
+
+def test_removing_last_embedding_keeps_person_with_zero_score():
+    a, b, c = unit_vectors(2, 1), unit_vectors(1, 2), unit_vectors(2, 3)
+    queries = unit_vectors(5, 9)
+    index = rebuilt({'alice': a, 'bob': b, 'carol': c})
+    index.remove_embedding('bob', 0)
+    assert index.counts.tolist() == [2, 0, 2]
+    # Block rỗng ở giữa: reduceat không được lấy nhầm dòng của carol cho bob
+    scores = index.best_scores(queries)
+    assert (scores[:, 1] == 0).all()
+    np.testing.assert_allclose(scores[:, 2], (queries @ c.T).max(axis=1), rtol=1e-6)
+    assert_matches_rebuild(index, {'alice': a, 'bob': b[:0], 'carol': c}, queries)
+    # Người cuối cùng cũng hết embedding
+    index.remove_embedding('carol', 0)
+    index.remove_embedding('carol', 0)
+    assert_matches_rebuild(index, {'alice': a, 'bob': b[:0], 'carol': c[:0]}, queries)
+    assert index.best_scores(queries[0]).shape == (3,)
+
+
+def test_version_bumps_only_on_change():
+    index = GalleryIndex(DIM)
+    versions = [index.version]
+    index.add('alice', unit_vectors(2))
+    versions.append(index.version)
+    index.add('alice', unit_vectors(1, 1))
+    versions.append(index.version)
+    index.remove_embedding('alice', 0)
+    versions.append(index.version)
+    index.remove_person('alice')
+    versions.append(index.version)
+    assert versions == sorted(set(versions))
+
+    # Xóa người / embedding không tồn tại không đổi index
+    index.remove_person('nobody')
+    index.remove_embedding('nobody', 0)
+    index.add('bob', unit_vectors(1, 2))
+    version = index.version
+    index.remove_embedding('bob', 5)
+    assert index.version == version
+
+
+def naive_pairs(matrix, threshold, labels=None):
+    pairs = []
+    for i in range(len(matrix)):
+        for j in range(i + 1, len(matrix)):
+            if labels is not None and labels[i] == labels[j]:
+                continue
+            similarity = float(matrix[i] @ matrix[j])
+            if similarity >= threshold:
+                pairs.append((i, j, similarity))
+    return pairs
+
+
+def clustered(count, seed=0):
+    """Các dòng gom thành vài cụm để có đủ cặp gần trùng"""
+    centers = unit_vectors(4, seed)
+    rows = centers[np.arange(count) % 4] + 0.2 * unit_vectors(count, seed + 1)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+def as_pairs(result):
+    rows_i, rows_j, sims = result
+    return list(zip(rows_i.tolist(), rows_j.tolist(), sims.tolist()))
+
+
+def assert_same_pairs(actual, expected):
+    assert [(i, j) for i, j, _ in actual] == [(i, j) for i, j, _ in expected]
+    np.testing.assert_allclose([s for *_, s in actual], [s for *_, s in expected], rtol=1e-5)
+
+
+def test_similar_pairs_matches_naive_loop():
+    matrix = clustered(23)
+    labels = np.arange(23) % 3
+    expected = naive_pairs(matrix, 0.9)
+    assert expected and naive_pairs(matrix, 0.9, labels) != expected
+    # n = 23 không chia hết cho chunk_size: khối cuối ngắn hơn
+    for chunk_size in (None, 1, 4, 7, 23, 100):
+        assert_same_pairs(as_pairs(similar_pairs(matrix, 0.9, chunk_size)), expected)
+        assert_same_pairs(as_pairs(similar_pairs(matrix, 0.9, chunk_size, labels=labels)),
+                          naive_pairs(matrix, 0.9, labels))
+
+
+def test_similar_pairs_threshold_is_inclusive():
+    matrix = np.zeros((3, DIM), dtype=np.float32)
+    matrix[:, 0] = 1.0
+    matrix[2] = [0.5] * 4 + [0.0] * (DIM - 4)
+    threshold = float(matrix[0] @ matrix[2])
+    for chunk_size in (None, 2):
+        pairs = as_pairs(similar_pairs(matrix, threshold, chunk_size))
+        assert [(i, j) for i, j, _ in pairs] == [(0, 1), (0, 2), (1, 2)]
+        assert pairs[1][2] == threshold
+    empty = similar_pairs(np.empty((0, DIM), dtype=np.float32), 0.5, 4)
+    assert all(len(part) == 0 for part in empty)
+
+
+def test_snapshot_is_isolated_from_later_changes():
+    a, b = unit_vectors(2, 1), unit_vectors(2, 2)
+    queries = unit_vectors(3, 9)
+    index = rebuilt({'alice': a, 'bob': b})
+    snapshot = index.snapshot()
+    expected = snapshot.best_scores(queries)
+
+    # Các thay đổi tạo mảng mới: snapshot cũ vẫn nhất quán (không sửa counts / names tại chỗ)
+    index.add('alice', unit_vectors(1, 3))
+    index.remove_embedding('bob', 0)
+    index.add('carol', unit_vectors(1, 4))
+    index.remove_person('alice')
+    assert snapshot.names == ['alice', 'bob']
+    assert snapshot.counts.tolist() == [2, 2] and snapshot.offsets.tolist() == [0, 2]
+    np.testing.assert_array_equal(snapshot.best_scores(queries), expected)
+    assert_matches_rebuild(snapshot, {'alice': a, 'bob': b}, queries)
+    assert index.names == ['bob', 'carol'] and snapshot.version != index.version
@@ -0,0 +1,104 @@
+import threading
+import pytest
+
+onnxruntime = pytest.importorskip("onnxruntime")
+pytest.importorskip("insightface")
+import face_core.model_registry as registry
+
+
+class StubSession:
+    def __init__(self, providers):
+        self.providers = providers
+
+    def get_providers(self):
+        return self.providers
+
+
+class StubModel:
+    def __init__(self, providers):
+        self.session = StubSession(providers)
+
+
+class StubFaceAnalysis:
+    """FaceAnalysis giả: đếm số lần load model và ghi lại tham số prepare"""
+
+    created = []
+
+    def __init__(self, name, allowed_modules=None, providers=None):
+        self.name, self.allowed_modules, self.providers = name, allowed_modules, providers
+        self.models = {'detection': StubModel(providers), 'recognition': StubModel(providers)}
+        StubFaceAnalysis.created.append(self)
+
+    def prepare(self, ctx_id, det_size):
+        self.ctx_id, self.det_size = ctx_id, det_size
+
+
+@pytest.fixture
+def registry_stub(monkeypatch):
+    """Cache rỗng, FaceAnalysis giả, chỉ có CPU; trả về list các lần tạo lại session"""
+    recreated = []
+    StubFaceAnalysis.created = []
+    monkeypatch.setattr(registry, '_MODELS', {})
+    monkeypatch.setattr(registry, 'FaceAnalysis', StubFaceAnalysis)
+    monkeypatch.setattr(registry, '_recreate_sessions', lambda app, settings, providers: recreated.append(settings))
+    monkeypatch.setattr(onnxruntime, 'get_available_providers', lambda: ['CPUExecutionProvider'])
+    return recreated
+
+
+def test_equal_keys_share_instance(registry_stub):
+    first = registry.get_face_analysis('buffalo_l', 0, (640, 640), ['recognition', 'detection'])
+    # Cùng cấu hình (list / tuple, thứ tự module khác nhau) -> cùng instance, không load lại
+    second = registry.get_face_analysis('buffalo_l', 0, [640, 640], ('detection', 'recognition'),
+                                        session_options={'intra_op_threads': 0})
+    assert first is second
+    assert len(StubFaceAnalysis.created) == 1
+    # Chỉ có CPU: insightface được prepare với ctx_id -1
+    assert first.providers == ['CPUExecutionProvider'] and first.ctx_id == -1
+    assert registry_stub == []
+
+
+def test_different_settings_create_new_instance(registry_stub):
+    base = registry.get_face_analysis('buffalo_l', 0, (640, 640))
+    smaller = registry.get_face_analysis('buffalo_l', 0, (320, 320))
+    threaded = registry.get_face_analysis('buffalo_l', 0, (640, 640), session_options={'intra_op_threads': 2})
+    modules = registry.get_face_analysis('buffalo_l', 0, (640, 640), ['detection'])
+    assert len({id(base), id(smaller), id(threaded), id(modules)}) == 4
+    assert smaller.det_size == (320, 320)
+    # Chỉ instance có cấu hình khác mặc định của ORT mới tạo lại session
+    assert [settings['intra_op_threads'] for settings in registry_stub] == [2]
+    assert registry.get_face_analysis('buffalo_l', 0, (640, 640), session_options={'intra_op_threads': 2}) is threaded
+
+    registry.clear_models()
+    assert registry.get_face_analysis('buffalo_l', 0, (640, 640)) is not base
+
+
+def test_concurrent_first_calls_load_once(registry_stub):
+    start = threading.Barrier(4)
+    apps = []
+
+    def load():
+        start.wait()
+        apps.append(registry.get_face_analysis('buffalo_l', 0, (640, 640)))
+
+    threads = [threading.Thread(target=load) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(StubFaceAnalysis.created) == 1
+    assert all(app is apps[0] for app in apps)
+
+
+@pytest.mark.parametrize('available, providers, ctx_id, expected', [
+    (['CPUExecutionProvider'], None, 0, ['CPUExecutionProvider']),
+    (['CUDAExecutionProvider', 'CPUExecutionProvider'], None, 0, ['CUDAExecutionProvider', 'CPUExecutionProvider']),
+    (['CUDAExecutionProvider', 'CPUExecutionProvider'], None, -1, ['CPUExecutionProvider']),
+    # Provider không có trên máy bị bỏ qua, CPU luôn đứng cuối làm dự phòng
+    (['CPUExecutionProvider'], ['TensorrtExecutionProvider', 'CUDAExecutionProvider'], 0, ['CPUExecutionProvider']),
+    (['OpenVINOExecutionProvider', 'CPUExecutionProvider'], ['OpenVINOExecutionProvider'], -1,
+     ['OpenVINOExecutionProvider', 'CPUExecutionProvider']),
+    (['CPUExecutionProvider'], ['CPUExecutionProvider'], 0, ['CPUExecutionProvider']),
+])
+def test_resolve_providers(monkeypatch, available, providers, ctx_id, expected):
+    monkeypatch.setattr(onnxruntime, 'get_available_providers', lambda: list(available))
+    assert registry._resolve_providers(providers, ctx_id) == expected
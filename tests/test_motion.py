@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+from face_core.motion import MotionGate
+
+
+def still_frame():
+    return np.full((240, 320, 3), 100, dtype=np.uint8)
+
+
+def moved_frame():
+    frame = still_frame()
+    frame[60:180, 80:240] = 220
+    return frame
+
+
+def test_invalid_method():
+    with pytest.raises(ValueError):
+        MotionGate(method='optical_flow')
+
+
+def test_diff_skips_still_scene_and_forces_refresh():
+    gate = MotionGate(method='diff', downscale_width=80, max_skip=2.0)
+    still = still_frame()
+    # Frame đầu tiên luôn chạy detection (chưa có frame tham chiếu)
+    decisions = [gate.check(still, t) for t in (0.0, 0.5, 1.0, 1.5, 2.0, 2.5)]
+    assert decisions == [True, False, False, False, True, False]
+    assert gate.summary() == {'motion': 1, 'forced': 1, 'skipped': 4, 'skip_ratio': 4 / 6}
+
+    # Còn track đang sống: vẫn detect dù cảnh đứng yên
+    assert gate.check(still, 2.6, active=True)
+    assert gate.check(moved_frame(), 2.7)
+    # Tham chiếu là frame của lần detect gần nhất: đứng yên ở cảnh mới thì bỏ qua
+    assert not gate.check(moved_frame(), 2.8)
+    assert gate.check(still, 2.9)
+    summary = gate.summary()
+    assert (summary['motion'], summary['forced'], summary['skipped']) == (3, 2, 5)
+
+
+def test_small_change_below_min_area_is_ignored():
+    gate = MotionGate(method='diff', downscale_width=80, min_area=0.05, max_skip=10.0)
+    assert gate.check(still_frame(), 0.0)
+    speck = still_frame()
+    speck[:8, :8] = 255
+    assert not gate.check(speck, 0.1)
+    assert gate.check(moved_frame(), 0.2)
+
+
+def test_resolution_change_resets_reference():
+    gate = MotionGate(method='diff', downscale_width=80, max_skip=10.0)
+    assert gate.check(still_frame(), 0.0)
+    assert not gate.check(still_frame(), 0.1)
+    assert gate.check(np.full((480, 320, 3), 100, dtype=np.uint8), 0.2)
+    assert gate.summary()['motion'] == 2
+
+
+def test_mog2_counts():
+    gate = MotionGate(method='mog2', downscale_width=80, max_skip=100.0)
+    still = still_frame()
+    decisions = [gate.check(still, t * 0.1) for t in range(30)]
+    # MOG2 học nền sau vài frame, sau đó cảnh đứng yên bị bỏ qua
+    assert decisions[0] and not any(decisions[10:])
+    assert gate.check(moved_frame(), 3.0)
+    summary = gate.summary()
+    assert summary['motion'] + summary['forced'] + summary['skipped'] == 31
+    assert summary['skipped'] >= 20
@@ -0,0 +1,200 @@
+import time
+import threading
+import numpy as np
+from face_core.pipeline import FramePool, LatestFrameQueue, RealtimePipeline, MultiSourcePipeline, RoundRobinQueue
+
+
+class FakeCapture:
+    """Capture giả: sinh frame (4, 4, 3) có giá trị = số thứ tự frame"""
+
+    def __init__(self, frames=None, interval=0.002):
+        self.frames = frames
+        self.interval = interval
+        self.count = 0
+
+    def read(self, image=None):
+        if self.frames is not None and self.count >= self.frames:
+            return False, None
+        time.sleep(self.interval)
+        self.count += 1
+        frame = image if image is not None else np.empty((4, 4, 3), dtype=np.uint8)
+        frame[:] = self.count % 256
+        return True, frame
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+def test_frame_pool_reuses_buffer_after_last_release():
+    pool = FramePool()
+    buf = pool.acquire((4, 4, 3), np.uint8)
+    pool.retain(buf)
+    pool.release(buf)
+    # Còn một tham chiếu: buffer chưa quay về pool
+    other = pool.acquire((4, 4, 3), np.uint8)
+    assert other is not buf
+    pool.release(buf)
+    assert pool.acquire((4, 4, 3), np.uint8) is buf
+    assert pool.allocated == 2
+
+
+def test_frame_pool_matches_shape_and_dtype():
+    pool = FramePool()
+    buf = pool.acquire((4, 4, 3), np.uint8)
+    pool.release(buf)
+    assert pool.acquire((8, 8, 3), np.uint8) is not buf
+    assert pool.acquire((4, 4, 3), np.float32) is not buf
+    assert pool.acquire((4, 4, 3), np.uint8) is buf
+    adopted = pool.adopt(np.zeros((2, 2), dtype=np.uint8))
+    pool.release(adopted)
+    assert pool.acquire((2, 2), np.uint8) is adopted
+    assert pool.allocated == 4
+
+
+def test_realtime_pipeline_steady_state_reuses_frame_buffers():
+    pipeline = RealtimePipeline(FakeCapture(frames=200, interval=0.0005), lambda frame: None, workers=2)
+    pipeline.start()
+    assert wait_until(lambda: not pipeline.running)
+    pipeline.stop()
+    # Buffer chỉ được giữ bởi capture, slot render, hàng đợi và worker: không cấp phát theo frame
+    assert pipeline.frame_pool.allocated <= 6
+    # Sau khi dừng chỉ còn slot render và có thể một frame trong hàng đợi
+    assert len(pipeline.frame_pool._refs) <= 2
+
+
+def test_latest_frame_queue_keeps_newest():
+    dropped = []
+    queue = LatestFrameQueue(on_drop=dropped.append)
+    for item in ('f1', 'f2', 'f3'):
+        queue.put(item)
+    assert queue.depth() == 1
+    assert queue.get(timeout=0) == 'f3'
+    assert dropped == ['f1', 'f2']
+    assert (queue.put_count, queue.drop_count) == (3, 2)
+    assert queue.get(timeout=0) is None
+
+
+def test_latest_frame_queue_close_unblocks_get():
+    queue = LatestFrameQueue()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(queue.get(timeout=5.0)))
+    thread.start()
+    queue.close()
+    thread.join(timeout=1.0)
+    assert not thread.is_alive()
+    assert result == [None]
+
+
+def test_realtime_pipeline_drops_stale_frames_for_slow_inference():
+    seen = []
+
+    def process_fn(frame):
+        seen.append(int(frame[0, 0, 0]))
+        time.sleep(0.02)
+        return seen[-1]
+
+    pipeline = RealtimePipeline(FakeCapture(interval=0.001), process_fn)
+    pipeline.start()
+    try:
+        assert wait_until(lambda: len(seen) >= 5)
+        packet = pipeline.next_frame(timeout=1.0)
+        assert packet is not None
+        frame_id, frame, results = packet
+        out = np.zeros_like(frame)
+        assert pipeline.next_frame(frame_id - 1, timeout=1.0, out=out)[1] is out
+    finally:
+        pipeline.stop()
+
+    # Inference chậm hơn capture: frame cũ bị bỏ, không xếp hàng
+    summary = pipeline.stats_summary()
+    assert summary['inference_queue']['dropped'] > 0
+    assert summary['inference_queue']['depth'] <= 1
+    assert summary['inference']['count'] == len(seen)
+
+
+def test_realtime_pipeline_stops_on_capture_end():
+    pipeline = RealtimePipeline(FakeCapture(frames=3), lambda frame: None)
+    pipeline.start()
+    assert wait_until(lambda: not pipeline.running)
+    pipeline.stop()
+    assert pipeline.error is not None
+
+
+def test_round_robin_queue_alternates_sources():
+    queue = RoundRobinQueue(3)
+    queue.put(0, 'a0')
+    queue.put(2, 'c0')
+    queue.put(1, 'b0')
+    assert [queue.get(timeout=0) for _ in range(3)] == [(0, 'a0'), (1, 'b0'), (2, 'c0')]
+    assert queue.get(timeout=0) is None
+
+
+def test_round_robin_queue_drops_oldest_per_source():
+    dropped = []
+    queue = RoundRobinQueue(2, on_drop=dropped.append)
+    queue.put(0, 'a0')
+    queue.put(0, 'a1')
+    queue.put(1, 'b0')
+    assert dropped == ['a0']
+    assert queue.put_counts == [2, 1]
+    assert queue.drop_counts == [1, 0]
+    assert queue.depth() == 2
+    assert queue.get(timeout=0) == (0, 'a1')
+    # Sau nguồn 0, nguồn 1 được phục vụ kể cả khi nguồn 0 lại có frame mới
+    queue.put(0, 'a2')
+    assert queue.get(timeout=0) == (1, 'b0')
+    assert queue.get(timeout=0) == (0, 'a2')
+
+
+def test_round_robin_queue_close_unblocks_get():
+    queue = RoundRobinQueue(1)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(queue.get(timeout=5.0)))
+    thread.start()
+    queue.close()
+    thread.join(timeout=1.0)
+    assert not thread.is_alive()
+    assert result == [None]
+
+
+def test_multi_source_error_stops_only_failing_source():
+    processed = [0, 0]
+
+    def process_fn(index, frame):
+        if index == 1:
+            raise RuntimeError("model lỗi")
+        processed[index] += 1
+        return [int(frame[0, 0, 0])]
+
+    pipeline = MultiSourcePipeline([FakeCapture(), FakeCapture()], process_fn, workers=2, names=['cam0', 'cam1'])
+    pipeline.start()
+    try:
+        assert wait_until(lambda: not pipeline.sources[1].running)
+        count = processed[0]
+        assert wait_until(lambda: processed[0] > count + 3)
+        assert pipeline.active
+        assert pipeline.sources[0].running
+    finally:
+        pipeline.stop()
+
+    summary = pipeline.stats_summary()
+    assert summary['cam1']['error'] == "model lỗi"
+    assert summary['cam0']['error'] is None
+    assert summary['cam0']['processed_fps'] > 0
+
+
+def test_multi_source_releases_frame_buffers():
+    pipeline = MultiSourcePipeline([FakeCapture(frames=50), FakeCapture(frames=50)],
+                                   lambda index, frame: [], workers=1)
+    pipeline.start()
+    assert wait_until(lambda: not pipeline.active)
+    pipeline.stop()
+    # Chỉ còn frame mới nhất cho render của mỗi nguồn giữ tham chiếu
+    assert len(pipeline.frame_pool._refs) <= 2
+    assert pipeline.frame_pool.allocated < 50
@@ -0,0 +1,122 @@
+import threading
+import numpy as np
+import pytest
+from config import EMPTY_GALLERY_MSG, UNKNOWN_LABEL
+from face_core.index import GalleryIndex
+from face_core.recognizer import FaceRecognizer
+from face_core.search import ExactSearchBackend, IVFSearchBackend
+
+DIM = 32
+
+
+def unit_vectors(count, seed=0):
+    rows = np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+    return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+
+class StubGallery:
+    """Gallery manager tối giản: recognizer chỉ đọc `index`"""
+
+    def __init__(self, gallery):
+        self.index = GalleryIndex(DIM)
+        self.index.rebuild(gallery)
+
+
+def make_recognizer(people=12, per_person=3, search_backend=None, threshold=0.5):
+    centers = unit_vectors(people)
+    gallery = {}
+    for p, center in enumerate(centers):
+        rows = center + 0.1 * unit_vectors(per_person, 100 + p)
+        gallery[f"person_{p}"] = rows / np.linalg.norm(rows, axis=1, keepdims=True)
+    recognizer = FaceRecognizer(None, StubGallery(gallery), threshold=threshold, search_backend=search_backend)
+    return recognizer, centers
+
+
+def assert_same_results(batch, single):
+    assert len(batch) == len(single)
+    for a, b in zip(batch, single):
+        assert a['result'] == b['result']
+        assert [name for name, _ in a['top_matches']] == [name for name, _ in b['top_matches']]
+        np.testing.assert_allclose([s for _, s in a['top_matches']], [s for _, s in b['top_matches']], rtol=1e-5)
+        if 'score' in b:
+            assert a['score'] == pytest.approx(b['score'], rel=1e-5)
+
+
+@pytest.mark.parametrize('search_backend', [ExactSearchBackend(), IVFSearchBackend(nlist=4, nprobe=1, min_size=0)])
+def test_batch_matches_single(search_backend):
+    recognizer, centers = make_recognizer(search_backend=search_backend)
+    # Nửa đầu gần người trong gallery, nửa sau là người lạ
+    queries = np.vstack([centers[:6] + 0.05 * unit_vectors(6, 50), unit_vectors(6, 60)])
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    batch = recognizer.recognize_batch(queries, top_k=3)
+    assert_same_results(batch, [recognizer.recognize(q, top_k=3) for q in queries])
+    assert [r['result'] for r in batch[:6]] == [f"person_{p}" for p in range(6)]
+    assert recognizer.recognize_batch(queries[:0]) == []
+
+
+def test_all_unknown():
+    recognizer, _ = make_recognizer(threshold=0.9)
+    queries = unit_vectors(4, 70)
+    batch = recognizer.recognize_batch(queries)
+    assert [r['result'] for r in batch] == [UNKNOWN_LABEL] * 4
+    # Top match vẫn được trả về để hiển thị dù dưới ngưỡng
+    assert all(len(r['top_matches']) == 3 and r['score'] < 0.9 for r in batch)
+    assert_same_results(batch, [recognizer.recognize(q) for q in queries])
+
+
+def test_empty_gallery():
+    recognizer = FaceRecognizer(None, StubGallery({}))
+    queries = unit_vectors(3)
+    expected = {'result': EMPTY_GALLERY_MSG, 'top_matches': []}
+    assert recognizer.recognize_batch(queries) == [expected] * 3
+    assert recognizer.recognize(queries[0]) == expected
+
+
+class PaddedBackend:
+    """Backend trả về top-k có cột đệm id -1 / score -inf như IVF khi thiếu ứng viên"""
+
+    def search(self, index, queries, top_k):
+        ids = np.full((len(queries), top_k), -1, dtype=np.intp)
+        scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+        ids[:, 0], scores[:, 0] = 1, 0.8
+        return ids, scores
+
+
+def test_format_results_drops_padding():
+    recognizer, _ = make_recognizer(search_backend=PaddedBackend())
+    result = recognizer.recognize_batch(unit_vectors(2), top_k=3)
+    expected = {'result': 'person_1', 'score': pytest.approx(0.8), 'top_matches': [('person_1', pytest.approx(0.8))]}
+    assert result == [expected] * 2
+
+
+@pytest.mark.parametrize('search_backend', [ExactSearchBackend(), IVFSearchBackend(nlist=4, nprobe=4, min_size=0)])
+def test_recognize_while_gallery_changes(search_backend):
+    """Thread khác thêm / xóa embedding: kết quả luôn khớp tên với đúng dòng của ma trận"""
+    recognizer, centers = make_recognizer(search_backend=search_backend)
+    index = recognizer.gallery_manager.index
+    queries = centers[[3, 7, 11]]
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        rng = np.random.default_rng(0)
+        try:
+            while not stop.is_set():
+                # Thêm / xóa ở người đứng trước làm dịch offset của mọi người phía sau
+                index.add('person_0', unit_vectors(1, int(rng.integers(1000)))[0])
+                index.add('temp', unit_vectors(2, int(rng.integers(1000))))
+                index.remove_embedding('person_0', 3)
+                index.remove_person('temp')
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    try:
+        for _ in range(300):
+            results = recognizer.recognize_batch(queries, top_k=2)
+            assert [r['result'] for r in results] == ['person_3', 'person_7', 'person_11']
+    finally:
+        stop.set()
+        thread.join()
+    assert errors == []
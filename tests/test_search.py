@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from face_core.index import GalleryIndex
+from face_core.search import ExactSearchBackend, IVFSearchBackend, create_search_backend, top_k_per_row
+
+DIM = 32
+
+
+def make_index(people=200, per_person=4, noise=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((people, DIM)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    matrix = np.repeat(centers, per_person, axis=0)
+    matrix += noise * rng.standard_normal(matrix.shape).astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    index = GalleryIndex(DIM)
+    index.set_arrays([f"person_{i}" for i in range(people)], matrix, [per_person] * people)
+    return index, centers
+
+
+def make_queries(centers, count, seed=1):
+    rng = np.random.default_rng(seed)
+    truth = rng.integers(0, len(centers), count)
+    queries = centers[truth] + 0.05 * rng.standard_normal((count, DIM)).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True), truth
+
+
+def test_top_k_per_row_sorted_descending():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [0.4, 0.3, 0.2, 0.1]], dtype=np.float32)
+    assert top_k_per_row(scores, 2).tolist() == [[1, 3], [0, 1]]
+    assert top_k_per_row(scores, 10).tolist() == [[1, 3, 2, 0], [0, 1, 2, 3]]
+
+
+def test_exact_search_matches_brute_force():
+    index, centers = make_index()
+    queries, truth = make_queries(centers, 20)
+    ids, scores = ExactSearchBackend().search(index, queries, 3)
+    assert ids.shape == scores.shape == (20, 3)
+    assert (ids[:, 0] == truth).all()
+    expected = index.best_scores(queries)
+    np.testing.assert_allclose(scores, np.take_along_axis(expected, ids, axis=1))
+    assert (np.diff(scores, axis=1) <= 0).all()
+
+
+def test_create_search_backend():
+    assert isinstance(create_search_backend('exact'), ExactSearchBackend)
+    assert isinstance(create_search_backend('ivf', nprobe=2), IVFSearchBackend)
+    with pytest.raises(ValueError):
+        create_search_backend('faiss')
+
+
+def test_ivf_small_gallery_uses_exact():
+    index, centers = make_index(people=10)
+    queries, _ = make_queries(centers, 5)
+    ivf = IVFSearchBackend(min_size=1000)
+    ids, scores = ivf.search(index, queries, 3)
+    exact_ids, exact_scores = ExactSearchBackend().search(index, queries, 3)
+    np.testing.assert_array_equal(ids, exact_ids)
+    assert ivf.centroids is None
+
+
+def test_ivf_recall_against_exact():
+    pytest.importorskip("sklearn")
+    index, centers = make_index()
+    queries, _ = make_queries(centers, 100)
+    exact_ids, exact_scores = ExactSearchBackend().search(index, queries, 5)
+
+    ivf = IVFSearchBackend(nlist=16, nprobe=16, min_size=0)
+    ivf.build(index)
+    ids, scores = ivf.search(index, queries, 5)
+    assert isinstance(ids, np.ndarray) and isinstance(scores, np.ndarray)
+    assert ids.shape == scores.shape == (100, 5)
+    # Quét mọi cụm: kết quả trùng với tìm kiếm chính xác
+    np.testing.assert_array_equal(ids, exact_ids)
+    np.testing.assert_allclose(scores, exact_scores, rtol=1e-5)
+
+    ivf.nprobe = 4
+    ids, _ = ivf.search(index, queries, 1)
+    assert np.mean(ids[:, 0] == exact_ids[:, 0]) >= 0.9
+
+
+def test_ivf_pads_when_probed_lists_have_few_people():
+    pytest.importorskip("sklearn")
+    index, centers = make_index(people=50)
+    queries, _ = make_queries(centers, 10)
+    ivf = IVFSearchBackend(nlist=25, nprobe=1, min_size=0)
+    ids, scores = ivf.search(index, queries, 50)
+    assert ids.shape == scores.shape == (10, 50)
+    padded = ids < 0
+    assert padded.any()
+    assert np.isneginf(scores[padded]).all()
+    assert (ids[~padded] < 50).all()
+
+
+def test_ivf_rebuilds_when_index_changes():
+    pytest.importorskip("sklearn")
+    index, centers = make_index(people=50)
+    ivf = IVFSearchBackend(nlist=8, nprobe=8, min_size=0)
+    ivf.build(index)
+    centroids = ivf.centroids
+
+    # Thêm người mới: chỉ gán lại danh sách đảo, không huấn luyện lại centroid
+    new_center = np.zeros(DIM, dtype=np.float32)
+    new_center[0] = 1.0
+    index.add("new_person", new_center)
+    ids, _ = ivf.search(index, new_center[np.newaxis], 1)
+    assert index.names[ids[0, 0]] == "new_person"
+    assert ivf.centroids is centroids
@@ -0,0 +1,171 @@
+import json
+import zlib
+import struct
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+from face_core.service import RecognitionService, _make_handler
+
+
+class StubFace:
+    def __init__(self, bbox):
+        self.bbox = np.asarray(bbox, dtype=np.float32)
+
+
+class StubDetector:
+    """Ảnh có giá trị pixel v chứa v khuôn mặt; crop mang giá trị v để kiểm tra ghép kết quả"""
+
+    def __init__(self):
+        self.embed_batches = []
+
+    def detect_faces(self, image, embed=False):
+        value = int(image[0, 0, 0])
+        return image, [StubFace([i, value, i + 10, value + 10]) for i in range(value)]
+
+    def align_face(self, model_image, face):
+        return np.full((4, 4, 3), face.bbox[1], dtype=np.float32)
+
+    def embed_crops(self, crops):
+        self.embed_batches.append(len(crops))
+        return np.array([[crop[0, 0, 0]] for crop in crops], dtype=np.float32).reshape(-1, 1)
+
+
+class StubRecognizer:
+    def __init__(self):
+        self.calls = 0
+
+    def recognize_batch(self, embeddings, top_k=3):
+        self.calls += 1
+        return [{'result': f"person_{int(e[0])}", 'score': 0.9, 'top_matches': [(f"person_{int(e[0])}", 0.9)]}
+                for e in embeddings]
+
+
+def encode(value):
+    ok, data = cv2.imencode('.png', np.full((8, 8, 3), value, dtype=np.uint8))
+    return data.tobytes()
+
+
+def test_concurrent_requests_are_batched():
+    detector, recognizer = StubDetector(), StubRecognizer()
+    service = RecognitionService(detector, recognizer, max_batch_size=8, max_wait_ms=200, decode_workers=4)
+    try:
+        values = [1, 2, 3, 0, 2, 1]
+        start = threading.Barrier(len(values))
+        results = [None] * len(values)
+
+        def client(k):
+            start.wait()
+            results[k] = service.recognize(encode(values[k]), timeout=10)
+
+        threads = [threading.Thread(target=client, args=(k,)) for k in range(len(values))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        service.close()
+
+    # Mỗi request nhận đúng các khuôn mặt của ảnh mình
+    for value, result in zip(values, results):
+        assert [face['result'] for face in result['faces']] == [f"person_{value}"] * value
+        assert [face['bbox'][1] for face in result['faces']] == [float(value)] * value
+        assert set(result['timing']) == {'decode_ms', 'queue_ms', 'compute_ms', 'total_ms'}
+    # Ít lần chạy model hơn số request: các request được gom batch
+    assert recognizer.calls < len(values)
+    assert max(result['batch_size'] for result in results) > 1
+    assert service.stats_summary()['batch_size']['count'] == recognizer.calls
+
+
+def test_batch_size_is_capped():
+    detector, recognizer = StubDetector(), StubRecognizer()
+    service = RecognitionService(detector, recognizer, max_batch_size=2, max_wait_ms=200, decode_workers=4)
+    try:
+        futures = [service.submit(encode(1)) for _ in range(6)]
+        results = [future.result(timeout=10) for future in futures]
+    finally:
+        service.close()
+    assert all(result['batch_size'] <= 2 for result in results)
+    assert recognizer.calls >= 3
+
+
+def test_decode_failure_does_not_block_batch():
+    service = RecognitionService(StubDetector(), StubRecognizer(), max_wait_ms=10)
+    try:
+        bad = service.submit(b'not an image')
+        good = service.submit(encode(2))
+        assert bad.result(timeout=10) == {'error': 'decode_failed'}
+        assert len(good.result(timeout=10)['faces']) == 2
+    finally:
+        service.close()
+
+
+def oversized_png(width=100000, height=100000):
+    """PNG có header hợp lệ khai báo kích thước vượt CV_IO_MAX_IMAGE_PIXELS (cv2.imdecode raise)"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(b'\0' * 16)) + chunk(b'IEND', b''))
+
+
+def test_decoder_exception_fails_request():
+    service = RecognitionService(StubDetector(), StubRecognizer(), max_wait_ms=10)
+    try:
+        assert service.recognize(oversized_png(), timeout=10) == {'error': 'decode_failed'}
+    finally:
+        service.close()
+
+
+class BlockingDetector(StubDetector):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def detect_faces(self, image, embed=False):
+        self.release.wait(10)
+        return super().detect_faces(image, embed)
+
+
+def post(url, data):
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/octet-stream'})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.fixture
+def http_service():
+    """(url, detector): HTTP server của service trên cổng ngẫu nhiên, timeout request 0.5 giây"""
+    detector = BlockingDetector()
+    service = RecognitionService(detector, StubRecognizer(), max_wait_ms=10)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(service, 1024 * 1024, timeout=0.5))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/recognize", detector
+    detector.release.set()
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def test_http_malformed_image_returns_error(http_service):
+    url, detector = http_service
+    detector.release.set()
+    status, body = post(url, oversized_png())
+    assert status in (400, 500)
+    assert 'error' in body
+    status, body = post(url, encode(1))
+    assert status == 200 and len(body['faces']) == 1
+
+
+def test_http_request_timeout_returns_504(http_service):
+    url, _ = http_service
+    status, body = post(url, encode(1))
+    assert (status, body) == (504, {'error': 'timeout'})
@@ -0,0 +1,95 @@
+import numpy as np
+from face_core.tracker import FaceTracker, IdentityVoter, iou_matrix
+from config import UNKNOWN_LABEL
+
+
+def test_iou_matrix():
+    boxes = [[0, 0, 10, 10], [5, 0, 15, 10]]
+    ious = iou_matrix(boxes, [[0, 0, 10, 10], [20, 20, 30, 30]])
+    assert ious.shape == (2, 2)
+    np.testing.assert_allclose(ious[:, 0], [1.0, 50 / 150], rtol=1e-6)
+    assert (ious[:, 1] == 0).all()
+    assert iou_matrix([], [[0, 0, 1, 1]]).shape == (0, 1)
+
+
+def test_tracks_keep_ids_across_frames():
+    tracker = FaceTracker()
+    first = tracker.update([[0, 0, 50, 50], [200, 0, 250, 50]], 0.0)
+    # Thứ tự bbox đổi và hai khuôn mặt dịch chuyển nhẹ
+    second = tracker.update([[205, 2, 255, 52], [3, 1, 53, 51]], 0.1)
+    assert [t.track_id for t in first] == [1, 2]
+    assert [t.track_id for t in second] == [2, 1]
+    third = tracker.update([[400, 400, 450, 450]], 0.2)
+    assert third[0].track_id == 3
+    assert len(tracker.tracks) == 3
+
+
+def test_track_expires_after_max_age():
+    tracker = FaceTracker(max_age=0.5)
+    tracker.update([[0, 0, 50, 50]], 0.0)
+    tracker.update([], 0.4)
+    assert len(tracker.tracks) == 1
+    tracker.update([], 0.6)
+    assert tracker.tracks == []
+    # Khuôn mặt xuất hiện lại sau khi track hết hạn nhận ID mới
+    assert tracker.update([[0, 0, 50, 50]], 0.7)[0].track_id == 2
+
+
+def test_snapshot_predicts_motion():
+    tracker = FaceTracker()
+    tracker.update([[0, 0, 50, 50]], 0.0)
+    tracker.update([[10, 0, 60, 50]], 0.1)
+    (_, bbox, result), = tracker.snapshot(0.2)
+    assert result is None
+    # Vận tốc được làm mượt (0.5 * 100 px/s): bbox tiếp tục dịch sang phải
+    assert bbox[0] > 10 and bbox[2] > 60
+    assert tracker.update([[20, 0, 70, 50]], 0.2)[0].track_id == 1
+
+
+def test_committed_track_reuses_result_until_revalidation():
+    tracker = FaceTracker(revalidate_interval=5.0, commit_hits=2, commit_score=0.6, vote_decay=0.0)
+    result = {'result': 'alice', 'score': 0.9, 'top_matches': [('alice', 0.9)]}
+    timestamp = 0.0
+    track, = tracker.update([[0, 0, 50, 50]], timestamp)
+    while tracker.needs_recognition(track, timestamp):
+        tracker.set_result(track, result, timestamp)
+        timestamp += 0.1
+        tracker.update([[0, 0, 50, 50]], timestamp)
+    assert track.result['committed']
+    assert tracker.recognitions == 2 and tracker.reused == 1
+    assert not tracker.needs_recognition(track, timestamp + 4.0)
+    assert tracker.needs_recognition(track, track.last_recognized + 5.0)
+
+
+def result_for(*matches):
+    return {'result': matches[0][0], 'score': matches[0][1], 'top_matches': list(matches)}
+
+
+def test_voter_commits_after_consecutive_leads():
+    voter = IdentityVoter(threshold=0.5, decay=0.6, commit_score=0.6, commit_hits=3)
+    votes = [voter.observe(result_for(('alice', 0.8), ('bob', 0.3))) for _ in range(3)]
+    assert [v['committed'] for v in votes] == [False, False, True]
+    assert votes[-1]['result'] == 'alice'
+    # Hiệu chỉnh bias: score ổn định không bị kéo về 0 ở những lần đầu
+    assert abs(votes[0]['score'] - 0.8) < 1e-6
+    assert [name for name, _ in votes[-1]['top_matches']] == ['alice', 'bob']
+
+
+def test_voter_smooths_single_outlier():
+    voter = IdentityVoter(threshold=0.5, decay=0.6, commit_score=0.6, commit_hits=3)
+    for _ in range(4):
+        voter.observe(result_for(('alice', 0.8), ('bob', 0.3)))
+    # Một frame nhận nhầm sang bob không đổi danh tính của track
+    vote = voter.observe(result_for(('bob', 0.7), ('alice', 0.4)))
+    assert vote['result'] == 'alice' and vote['committed']
+    # Nhận nhầm liên tiếp thì danh tính mới thắng
+    for _ in range(3):
+        vote = voter.observe(result_for(('bob', 0.9), ('alice', 0.2)))
+    assert vote['result'] == 'bob'
+
+
+def test_voter_below_threshold_is_unknown():
+    voter = IdentityVoter(threshold=0.5, decay=0.6, commit_score=0.6, commit_hits=1)
+    vote = voter.observe(result_for(('alice', 0.4)))
+    assert vote['result'] == UNKNOWN_LABEL and not vote['committed']
+    assert voter.observe({'result': 'Empty gallery', 'top_matches': []})['result'] == UNKNOWN_LABEL
@@ -0,0 +1,157 @@
+import json
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+import face_core.video as video_module
+from face_core.video import VideoProcessor
+
+SHAPE = (24, 32, 3)
+
+
+class FakeCapture:
+    """Giả lập cv2.VideoCapture của một file video: frame thứ i có giá trị pixel i % 256
+
+    read(image) ghi vào buffer được truyền vào nếu đúng shape, giống OpenCV.
+    """
+
+    videos = {}
+
+    def __init__(self, path):
+        self.frames, self.fps = self.videos.get(path, (0, 0))
+        self.opened = path in self.videos
+        self.position = 0
+        self.grabs = 0
+        self.reads = 0
+        self.read_buffers = set()
+        FakeCapture.last = self
+
+    def isOpened(self):
+        return self.opened
+
+    def get(self, prop):
+        return self.fps if prop == cv2.CAP_PROP_FPS else 0
+
+    def grab(self):
+        if self.position >= self.frames:
+            return False
+        self.position += 1
+        self.grabs += 1
+        return True
+
+    def read(self, image=None):
+        if self.position >= self.frames:
+            return False, None
+        if image is None or image.shape != SHAPE:
+            image = np.empty(SHAPE, dtype=np.uint8)
+        image.fill(self.position % 256)
+        self.read_buffers.add(id(image))
+        self.position += 1
+        self.reads += 1
+        return True, image
+
+    def release(self):
+        self.opened = False
+
+
+class StubFace:
+    def __init__(self, value):
+        self.bbox = np.array([value, 0, value + 10, 10], dtype=np.float32)
+
+
+class StubDetector:
+    """Frame có giá trị chẵn chứa một khuôn mặt; crop và embedding mang giá trị của frame"""
+
+    def __init__(self):
+        self.embed_batches = []
+
+    def detect_faces(self, image, embed=True, out=None):
+        value = int(image[0, 0, 0])
+        return image, [StubFace(value)] if value % 2 == 0 else []
+
+    def align_face(self, model_image, face):
+        # Crop phải được lấy trước khi frame quay về pool
+        return int(model_image[0, 0, 0])
+
+    def embed_crops(self, crops):
+        self.embed_batches.append(len(crops))
+        return np.array(crops, dtype=np.float32).reshape(-1, 1)
+
+
+class StubRecognizer:
+    def recognize_batch(self, embeddings):
+        return [{'result': f"person_{int(e[0])}", 'score': 0.5 + e[0] / 1000} for e in embeddings]
+
+
+@pytest.fixture
+def fake_video(monkeypatch):
+    """Đăng ký video giả: fake_video(frames, fps) -> path"""
+    FakeCapture.videos = {}
+    monkeypatch.setattr(video_module.cv2, 'VideoCapture', FakeCapture)
+
+    def register(frames, fps):
+        path = f"video_{len(FakeCapture.videos)}.mp4"
+        FakeCapture.videos[path] = (frames, fps)
+        return path
+
+    return register
+
+
+def read_jsonl(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_sampling_stride_and_jsonl(fake_video, tmp_path):
+    path = fake_video(40, 30.0)
+    detector = StubDetector()
+    processor = VideoProcessor(detector, StubRecognizer(), sample_fps=5, batch_size=3, prefetch=2, workers=2)
+    progress = []
+    output = tmp_path / 'timeline.jsonl'
+    report = processor.process(path, str(output), progress=lambda frames, ts: progress.append((frames, ts)))
+
+    # 30 fps lấy mẫu 5 fps: mỗi 6 frame giải mã một frame, các frame khác chỉ grab
+    sampled = list(range(0, 40, 6))
+    capture = FakeCapture.last
+    assert (capture.reads, capture.grabs) == (len(sampled), 40 - len(sampled))
+    assert not capture.opened
+    assert read_jsonl(output) == [
+        {'frame': i, 'timestamp': round(i / 30.0, 3), 'bbox': [float(i), 0.0, float(i + 10), 10.0],
+         'identity': f"person_{i}", 'score': round(0.5 + i / 1000, 4)}
+        for i in sampled
+    ]
+    assert report['sampled_frames'] == len(sampled) and report['faces'] == len(sampled)
+    assert report['total_frames'] == 40
+    assert report['video_seconds'] == pytest.approx(36 / 30.0)
+    assert [frames for frames, _ in progress] == [3, 6, 7]
+    assert sum(detector.embed_batches) == len(sampled)
+
+
+def test_every_frame_without_sampling(fake_video, tmp_path):
+    # sample_fps=0: giải mã mọi frame; FPS không đọc được thì coi là 30
+    path = fake_video(11, 0)
+    output = tmp_path / 'timeline.jsonl'
+    report = VideoProcessor(StubDetector(), StubRecognizer(), sample_fps=0, batch_size=4).process(path, str(output))
+    records = read_jsonl(output)
+    assert [r['frame'] for r in records] == [0, 2, 4, 6, 8, 10]
+    assert records[1]['timestamp'] == round(2 / 30.0, 3)
+    assert (report['sampled_frames'], report['faces'], report['total_frames']) == (11, 6, 11)
+    assert FakeCapture.last.grabs == 0
+
+
+@pytest.mark.parametrize('batch_size', [4, 16])
+def test_frame_buffers_are_reused(fake_video, tmp_path, batch_size):
+    path = fake_video(60, 30.0)
+    processor = VideoProcessor(StubDetector(), StubRecognizer(), sample_fps=0, batch_size=batch_size,
+                               prefetch=2, workers=2)
+    report = processor.process(path, str(tmp_path / 'timeline.jsonl'))
+    assert report['sampled_frames'] == report['faces'] * 2 == 60
+    # Buffer về pool ngay sau detect: chỉ frame trong hàng đợi (prefetch), đang detect (workers + 1)
+    # và frame thread giải mã đang giữ, không phụ thuộc batch_size hay độ dài video
+    assert report['frame_buffers'] <= 2 + 3 + 1
+    assert len(FakeCapture.last.read_buffers) == report['frame_buffers']
+
+
+def test_unopened_video_raises(fake_video, tmp_path):
+    with pytest.raises(IOError):
+        VideoProcessor(StubDetector(), StubRecognizer()).process('missing.mp4', str(tmp_path / 'out.jsonl'))
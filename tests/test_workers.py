@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+import face_core.workers as workers_module
+from concurrent.futures import ThreadPoolExecutor
+from config import UNKNOWN_LABEL
+from face_core.index import GalleryIndex
+from face_core.recognizer import FaceRecognizer
+from face_core.workers import ProcessEmbedder, _embed_paths
+
+DIM = 512
+
+
+class StubFace:
+    def __init__(self, value, k):
+        self.bbox = np.array([k, value, k + 10, value + 10], dtype=np.float32)
+        self.det_score = 0.5 + 0.1 * k
+        self.key = value * 4 + k
+        self.embedding = None
+
+
+class StubDetector:
+    """Ảnh có giá trị pixel v chứa v khuôn mặt; embedding one-hot theo (v, thứ tự mặt)"""
+
+    def __init__(self):
+        self.embed_batches = []
+
+    def detect_faces(self, image, embed=True):
+        value = int(image[0, 0, 0])
+        faces = [StubFace(value, k) for k in range(value)]
+        if embed:
+            for face, embedding in zip(faces, self.embed_crops([face.key for face in faces])):
+                face.embedding = embedding
+        return image, faces
+
+    def detect_file(self, path):
+        image = cv2.imread(path)
+        return (None, None) if image is None else self.detect_faces(image)
+
+    def align_face(self, model_image, face):
+        return face.key
+
+    def embed_crops(self, crops):
+        self.embed_batches.append(len(crops))
+        return np.eye(DIM, dtype=np.float32)[list(crops)]
+
+    def get_face_embeddings(self, faces):
+        return np.stack([face.embedding for face in faces])
+
+
+class StubGallery:
+    def __init__(self, gallery):
+        self.index = GalleryIndex(DIM)
+        self.index.rebuild(gallery)
+
+
+@pytest.fixture
+def image_paths(tmp_path):
+    """Ảnh có 2, 0, 1, 3 khuôn mặt, xen một file hỏng"""
+    paths = []
+    for i, value in enumerate([2, 0, 1, None, 3]):
+        path = tmp_path / f"{i}.png"
+        if value is None:
+            path.write_bytes(b'broken')
+        else:
+            cv2.imwrite(str(path), np.full((8, 8, 3), value, dtype=np.uint8))
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def worker_detector(monkeypatch):
+    detector = StubDetector()
+    monkeypatch.setattr(workers_module, '_WORKER_DETECTOR', detector)
+    return detector
+
+
+def test_embed_paths_in_worker(worker_detector, image_paths):
+    results = _embed_paths(image_paths, best_only=False)
+    assert [reason for _, _, reason in results] == [None, 'no_face', None, 'decode_failed', None]
+    assert [len(bboxes) for bboxes, _, _ in results] == [2, 0, 1, 0, 3]
+    # Mỗi ảnh nhận đúng embedding của khuôn mặt của mình; một batch recognition cho cả chunk
+    for (bboxes, embeddings, _), value in zip(results, [2, 0, 1, 0, 3]):
+        assert embeddings.shape == (len(bboxes), DIM)
+        assert np.argmax(embeddings, axis=1).tolist() == [value * 4 + k for k in range(len(bboxes))]
+    assert worker_detector.embed_batches == [6]
+
+    best = _embed_paths(image_paths, best_only=True)
+    assert [len(embeddings) for _, embeddings, _ in best] == [1, 0, 1, 0, 1]
+    assert np.argmax(best[4][1]) == 3 * 4 + 2
+
+
+def test_session_options_include_intra_op_threads():
+    embedder = ProcessEmbedder({'session_options': {'inter_op_threads': 1}}, processes=2, intra_op_threads=3)
+    try:
+        assert embedder.executor._initargs == ({'session_options': {'inter_op_threads': 1, 'intra_op_threads': 3}},)
+        assert embedder.processes == 2
+    finally:
+        embedder.close()
+
+
+def thread_embedder(chunk_size):
+    """ProcessEmbedder chạy _embed_paths trong thread (dùng detector giả của module)"""
+    embedder = ProcessEmbedder({}, processes=1, chunk_size=chunk_size)
+    embedder.executor.shutdown()
+    embedder.executor = ThreadPoolExecutor(max_workers=2)
+    return embedder
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 32])
+def test_embedder_keeps_path_order(worker_detector, image_paths, chunk_size):
+    with thread_embedder(chunk_size) as embedder:
+        results = list(embedder.embed_paths(image_paths))
+    assert [path for path, _, _, _ in results] == image_paths
+    expected = _embed_paths(image_paths, best_only=False)
+    for (_, bboxes, embeddings, reason), (exp_bboxes, exp_embeddings, exp_reason) in zip(results, expected):
+        assert reason == exp_reason
+        np.testing.assert_array_equal(bboxes, exp_bboxes)
+        np.testing.assert_array_equal(embeddings, exp_embeddings)
+    assert len(worker_detector.embed_batches) == -(-len(image_paths) // chunk_size) + 1
+
+
+def test_recognize_paths_with_and_without_embedder(worker_detector, image_paths):
+    one_hot = np.eye(DIM, dtype=np.float32)
+    recognizer = FaceRecognizer(worker_detector, StubGallery({'two': one_hot[[8, 9]], 'three': one_hot[[12]]}),
+                                threshold=0.5)
+    local = recognizer.recognize_paths(image_paths)
+    with thread_embedder(2) as embedder:
+        pooled = recognizer.recognize_paths(image_paths, embedder=embedder)
+
+    assert [reason for _, _, reason in local] == [None, 'no_face', None, 'decode_failed', None]
+    assert [[face['result']['result'] for face in faces] for _, faces, _ in local] == [
+        ['two', 'two'], [], [UNKNOWN_LABEL], [], ['three', UNKNOWN_LABEL, UNKNOWN_LABEL],
+    ]
+    assert [path for path, _, _ in pooled] == image_paths
+    for (_, faces, reason), (_, pooled_faces, pooled_reason) in zip(local, pooled):
+        assert reason == pooled_reason
+        assert [f['result'] for f in faces] == [f['result'] for f in pooled_faces]
+        for face, pooled_face in zip(faces, pooled_faces):
+            np.testing.assert_array_equal(face['bbox'], pooled_face['bbox'])
@@ -1,21 +1,98 @@
 import cv2
+import time
+import threading
 import numpy as np
 import requests
-from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from config import (
+    URL_CONNECT_TIMEOUT, URL_READ_TIMEOUT, URL_TOTAL_TIMEOUT, URL_MAX_BYTES, URL_MAX_PARALLEL
+)
 
-def load_image_from_url(url):
-    """Tải ảnh từ URL"""
+_CHUNK_SIZE = 64 * 1024
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """requests.Session dùng chung (giữ kết nối keep-alive, pool URL_MAX_PARALLEL kết nối mỗi host)"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=URL_MAX_PARALLEL, pool_maxsize=URL_MAX_PARALLEL)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def _iter_body(response):
+    """Các đoạn body ngay khi nhận được (read1 của urllib3 >= 2), không chờ đủ một chunk"""
+    read1 = getattr(response.raw, 'read1', None)
+    if read1 is None:
+        yield from response.iter_content(chunk_size=_CHUNK_SIZE)
+        return
+    while True:
+        chunk = read1(_CHUNK_SIZE, decode_content=True)
+        if not chunk:
+            return
+        yield chunk
+
+def load_bytes_from_url(url, timeout=(URL_CONNECT_TIMEOUT, URL_READ_TIMEOUT), max_bytes=URL_MAX_BYTES,
+                        total_timeout=URL_TOTAL_TIMEOUT):
+    """Tải nội dung ảnh đã mã hóa từ URL, trả về memoryview hoặc None nếu lỗi
+
+    Dữ liệu được đọc theo luồng vào một buffer cấp phát trước (theo
+    Content-Length nếu có); ảnh lớn hơn `max_bytes` bị từ chối ngay khi biết.
+    `timeout` chỉ giới hạn từng lần nhận dữ liệu, nên cả lần tải còn bị giới
+    hạn bởi `total_timeout` giây (server gửi nhỏ giọt không giữ được worker).
+    """
+    deadline = time.monotonic() + total_timeout
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        
-        img_array = np.frombuffer(response.content, np.uint8)
-        img = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-        return img
+        with get_session().get(url, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            length = int(response.headers.get('Content-Length') or 0)
+            if length > max_bytes:
+                raise ValueError(f"ảnh quá lớn ({length / 1e6:.1f} MB > {max_bytes / 1e6:.1f} MB)")
+            buffer = bytearray(length or _CHUNK_SIZE * 4)
+            size = 0
+            for chunk in _iter_body(response):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"tải quá {total_timeout} giây")
+                end = size + len(chunk)
+                if end > max_bytes:
+                    raise ValueError(f"ảnh quá lớn (> {max_bytes / 1e6:.1f} MB)")
+                if end > len(buffer):
+                    # Không có (hoặc sai) Content-Length: tăng gấp đôi buffer
+                    buffer.extend(bytes(max(end, 2 * len(buffer)) - len(buffer)))
+                buffer[size:end] = chunk
+                size = end
+            return memoryview(buffer)[:size]
     except Exception as e:
         print(f"Lỗi khi tải ảnh từ URL: {str(e)}")
         return None
 
+def decode_image(data):
+    """Giải mã ảnh (bytes/memoryview) sang BGR, None nếu rỗng hoặc lỗi"""
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+def load_image_from_url(url):
+    """Tải ảnh từ URL"""
+    return decode_image(load_bytes_from_url(url))
+
+def load_images_from_urls(urls, max_parallel=URL_MAX_PARALLEL, decode=True):
+    """Tải nhiều URL song song (tối đa `max_parallel` request cùng lúc)
+
+    Trả về list theo thứ tự `urls`: ảnh BGR (hoặc bytes nếu decode=False), None nếu lỗi.
+    """
+    urls = list(urls)
+    if not urls:
+        return []
+    load = load_image_from_url if decode else load_bytes_from_url
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(urls)))) as executor:
+        return list(executor.map(load, urls))
+
 def resize_image(image, max_size=800):
     """Thay đổi kích thước ảnh giữ tỷ lệ"""
     h, w = image.shape[:2]